@@ -1,9 +1,23 @@
 # -*- coding: utf-8 -*-
+import threading
+import time
+import uuid
 import streamlit as st
-import tempfile
-from pathlib import Path
+from io import BytesIO
+import numpy as np
 import pandas as pd
-from detector_core import detect_from_filelike
+from detector_core import (MAX_DIAS, MIN_SIM_IMPORTE, MIN_SIM_PRODUCTOS, PUNTAJE_MAX_DIAS, PUNTAJE_MIN_SIM_IMPORTE,
+                           PUNTAJE_MIN_SIM_PRODUCTOS, DetectorStats, detect_scored_frames_from_filelike,
+                           filtrar_pares, frame_to_csv)
+from detector_cache import ResultCache, content_key
+from detector_jobs import CANCELADO, LISTO, Trabajos
+
+CACHE_MAX_ENTRADAS = 16
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+FILAS_POR_PAGINA = 500  # tablas más largas se muestran paginadas
+VISTAS_POR_RESULTADO = 8  # combinaciones de umbrales con tablas armadas que se guardan por resultado
+TRABAJOS_SIMULTANEOS = 2  # detecciones en segundo plano a la vez (todas las sesiones)
+CONSULTA_SEGUNDOS = 0.5  # cada cuánto se refresca el progreso de una detección en curso
 
 FUTURISTIC_CSS = """
 <style>
@@ -61,19 +75,28 @@ with colC:
 with colD:
     st.info('Tip: Se detecta separador ; , o tab (como TextToColumns) y se ignoran encabezados antes de F.Pedido.')
 
+# Umbrales de similares: los pares se puntúan una vez con las cotas PUNTAJE_*; mover los
+# sliders solo vuelve a filtrar esa tabla
+colU1, colU2, colU3 = st.columns(3)
+with colU1:
+    max_dias = st.slider('Máx. días entre entregas', 0, PUNTAJE_MAX_DIAS, MAX_DIAS)
+with colU2:
+    min_sim_importe = st.slider('Similitud mínima de importe', PUNTAJE_MIN_SIM_IMPORTE, 1.0, MIN_SIM_IMPORTE, 0.005)
+with colU3:
+    min_sim_productos = st.slider('Similitud mínima de productos', PUNTAJE_MIN_SIM_PRODUCTOS, 1.0, MIN_SIM_PRODUCTOS, 0.01)
+
+
+# Las fechas llegan como datetime64: mostrarlas sin hora
+_COLS_FECHA = {c: st.column_config.DateColumn(c, format='YYYY-MM-DD') for c in ('Entrega', 'Entrega_1', 'Entrega_2')}
+
 
 def _normalize_client_series(s: pd.Series) -> pd.Series:
     # deja solo dígitos y quita espacios/caracteres raros
-    s = s.fillna('').astype(str).str.strip()
-    return s.apply(lambda v: ''.join([c for c in v if c.isdigit()]))
+    return s.fillna('').astype(str).str.replace(r'\D+', '', regex=True)
 
 
-def _apply_filters(df: pd.DataFrame) -> pd.DataFrame:
-    if df.empty:
-        return df
-    if solo_alta and 'prioridad' in df.columns:
-        df = df[df['prioridad'].astype(str).str.upper() == 'ALTA']
-    return df
+def _es_alta(df: pd.DataFrame) -> pd.Series:
+    return df['prioridad'].astype(str).str.upper().eq('ALTA')
 
 
 def _split_clients(text: str):
@@ -92,6 +115,10 @@ def _split_clients(text: str):
     return uniq
 
 
+def _prioridad_max(alta: pd.Series) -> np.ndarray:
+    return np.where(alta.to_numpy(dtype=bool), 'ALTA', 'MEDIA')
+
+
 def _suppress_repeated(df: pd.DataFrame, col: str) -> pd.DataFrame:
     """Vista DETALLE: muestra el valor de 'col' solo en la primera fila del bloque.
     Importante: requiere que el DF esté ordenado por esa columna.
@@ -104,136 +131,316 @@ def _suppress_repeated(df: pd.DataFrame, col: str) -> pd.DataFrame:
     return out
 
 
-if not uploaded:
-    st.warning('Subí un CSV para empezar.')
-    st.stop()
+def _detalle(df: pd.DataFrame) -> dict:
+    """Vista DETALLE ya ordenada y sin repetir Client: {solo_alta: df}."""
+    orden = df.sort_values(['prioridad','Client'], ascending=[False, True])
+    return {False: _suppress_repeated(orden, 'Client'), True: _suppress_repeated(orden[_es_alta(orden)], 'Client')}
+
+
+def _agrupada(df: pd.DataFrame) -> pd.DataFrame:
+    """Similares agrupados: 1 fila por Client con pares, prioridad máxima y un par de ejemplo."""
+    g = df.assign(alta=_es_alta(df)).groupby('Client', dropna=False)
+    out = g.agg(
+        pares=('Client','size'),
+        prioridad_max=('alta','max'),
+        ejemplo_pedido_1=('Pedido_1','first'),
+        ejemplo_pedido_2=('Pedido_2','first'),
+    ).reset_index()
+    out['prioridad_max'] = _prioridad_max(out['prioridad_max'])
+    out[['ejemplo_pedido_1','ejemplo_pedido_2']] = out[['ejemplo_pedido_1','ejemplo_pedido_2']].fillna('')
+    return out.sort_values(['prioridad_max','pares','Client'], ascending=[False,False,True])
+
+
+def _clientes_unicos(frames) -> pd.DataFrame:
+    """1 fila por Client (ya normalizado) con la primera Razon social no vacía, casos y prioridad máxima."""
+    frames = [df[['Client','Razon social','prioridad']] for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=['Client','razon_social','casos','prioridad_max'])
+    df = pd.concat(frames, ignore_index=True)
+    razon = df['Razon social'].astype(str).str.strip()
+    df = pd.DataFrame({'Client': df['Client'], 'razon_social': razon.mask(razon.isin(['', 'nan'])),
+                       'alta': _es_alta(df)})
+    out = df.groupby('Client', dropna=False).agg(
+        razon_social=('razon_social','first'),
+        casos=('Client','size'),
+        prioridad_max=('alta','max'),
+    ).reset_index()
+    out['razon_social'] = out['razon_social'].fillna('')
+    out['prioridad_max'] = _prioridad_max(out['prioridad_max'])
+    return out.sort_values(['prioridad_max','casos','Client'], ascending=[False,False,True])
+
+
+def _armar_vistas(df_exact: pd.DataFrame, df_sim: pd.DataFrame) -> dict:
+    """Todas las tablas derivadas, una vez por resultado; los widgets solo eligen cuál mostrar."""
+    alta_exact, alta_sim = _es_alta(df_exact), _es_alta(df_sim)
+    sim = {False: df_sim, True: df_sim[alta_sim]}
+    exact = {False: df_exact, True: df_exact[alta_exact]}
+    return {
+        'alta_exact': int(alta_exact.sum()),
+        'alta_sim': int(alta_sim.sum()),
+        'sim_detalle': _detalle(df_sim),
+        'sim_agrupada': {a: _agrupada(sim[a]) for a in (False, True)},
+        'exact_detalle': _detalle(df_exact),
+        # (solo_alta, incluir_exactos) -> clientes únicos
+        'clientes': {(a, e): _clientes_unicos([sim[a], exact[a]] if e else [sim[a]])
+                     for a in (False, True) for e in (False, True)},
+    }
+
+
+def _frames_nbytes(obj, vistos=None) -> int:
+    """Bytes de los DataFrames de obj (un DataFrame o dicts anidados, como las vistas), sin repetir."""
+    vistos = set() if vistos is None else vistos
+    if isinstance(obj, dict):
+        return sum(_frames_nbytes(v, vistos) for v in obj.values())
+    if not isinstance(obj, pd.DataFrame) or id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+    return int(obj.memory_usage(deep=True).sum())
+
+
+def _csv_nbytes(d: dict) -> int:
+    return sum(len(v) for k, v in d.items() if k.startswith('csv_'))
+
+
+def _result_nbytes(res: dict) -> int:
+    # Tablas medidas una vez al armarlas (el resultado y cada vista) + los CSV ya generados
+    with res['lock']:
+        vistas = list(res['vistas'].values())
+        return res['nbytes'] + _csv_nbytes(res) + sum(v['nbytes'] + _csv_nbytes(v) for v in vistas)
+
+
+def _tabla(df: pd.DataFrame, key: str, **kwargs):
+    """st.dataframe paginado: al navegador solo viaja la página elegida."""
+    n = len(df)
+    if n > FILAS_POR_PAGINA:
+        paginas = -(-n // FILAS_POR_PAGINA)
+        pagina = st.number_input(f'Página (de {paginas} · {n:,} filas)', min_value=1, max_value=paginas, value=1,
+                                 key=f'pagina_{key}_{n}')
+        df = df.iloc[(pagina - 1) * FILAS_POR_PAGINA:pagina * FILAS_POR_PAGINA]
+    st.dataframe(df, use_container_width=True, hide_index=True, **kwargs)
+
+
+@st.cache_resource
+def _result_cache() -> ResultCache:
+    # Una sola instancia por proceso: la comparten todas las sesiones
+    return ResultCache(CACHE_MAX_ENTRADAS, CACHE_MAX_BYTES, sizeof=_result_nbytes)
+
+
+@st.cache_resource
+def _trabajos() -> Trabajos:
+    # Compartido entre sesiones: el mismo archivo subido dos veces usa el mismo trabajo
+    return Trabajos(TRABAJOS_SIMULTANEOS)
+
+
+def _run_detection(data: bytes, stats: DetectorStats | None = None) -> dict:
+    # Resultados en memoria (sin CSV temporales); el CSV se arma solo para descargar.
+    # Huella y firma completa se calculan una vez: la casilla solo muestra u oculta la columna
+    stats = stats or DetectorStats()
+    raw_exact, raw_pares = detect_scored_frames_from_filelike(BytesIO(data), stats=stats, firma_completa=True)
+
+    # Vista: Client normalizado en una copia liviana (las demás columnas se comparten)
+    df_exact, df_pares = raw_exact.copy(deep=False), raw_pares.copy(deep=False)
+    for df in (df_exact, df_pares):
+        df['Client'] = _normalize_client_series(df['Client'])
+
+    res = {'df_exact': df_exact, 'df_pares': df_pares, 'raw_exact': raw_exact, 'raw_pares': raw_pares,
+           'vistas': {}, 'stats': stats.to_dict()}
+    # El resultado lo comparten todas las sesiones: vistas y CSV se agregan con el lock tomado
+    res.update(nbytes=_frames_nbytes(res), lock=threading.Lock())
+    return res
+
+
+def _vistas(res: dict, umbrales: tuple) -> dict:
+    """Tablas derivadas para unos umbrales: se arman la primera vez y quedan en el resultado."""
+    with res['lock']:
+        vistas = res['vistas']
+        if umbrales not in vistas:
+            df_sim = filtrar_pares(res['df_pares'], *umbrales)
+            v = _armar_vistas(res['df_exact'], df_sim)
+            v.update(df_sim=df_sim, raw_sim=filtrar_pares(res['raw_pares'], *umbrales))
+            v['nbytes'] = _frames_nbytes(v)
+            while len(vistas) >= VISTAS_POR_RESULTADO:
+                vistas.pop(next(iter(vistas)))
+            vistas[umbrales] = v
+        return vistas[umbrales]
+
+
+def _csv_bytes(res: dict, fuente: dict, name: str, firma: bool = True) -> bytes:
+    """CSV original (como write_csv) generado la primera vez que se pide y guardado en fuente.
+
+    fuente: el resultado res o una de sus vistas. firma=False: sin firma_productos (como
+    run_detector por defecto).
+    """
+    key = 'csv_' + name if firma else f'csv_{name}_sin_firma'
+    with res['lock']:
+        if key not in fuente:
+            df = fuente['raw_' + name]
+            fuente[key] = frame_to_csv(df if firma else df.drop(columns='firma_productos'))
+        return fuente[key]
 
-with tempfile.TemporaryDirectory() as td:
-    out_exact, out_sim = detect_from_filelike(uploaded, td)
-    out_exact, out_sim = Path(out_exact), Path(out_sim)
-
-    df_exact = pd.read_csv(out_exact, dtype=str) if out_exact.exists() else pd.DataFrame()
-    df_sim = pd.read_csv(out_sim, dtype=str) if out_sim.exists() else pd.DataFrame()
-
-    for df in (df_exact, df_sim):
-        if not df.empty:
-            if 'prioridad' in df.columns:
-                df['prioridad'] = df['prioridad'].astype(str).str.upper()
-            if 'Client' in df.columns:
-                df['Client'] = _normalize_client_series(df['Client'])
-
-    df_exact_f = _apply_filters(df_exact)
-    df_sim_f = _apply_filters(df_sim)
-
-    alta_exact = int((df_exact.get('prioridad','') == 'ALTA').sum()) if not df_exact.empty else 0
-    alta_sim = int((df_sim.get('prioridad','') == 'ALTA').sum()) if not df_sim.empty else 0
-
-    # Clientes únicos
-    frames=[]
-    if not df_sim_f.empty:
-        frames.append(df_sim_f[['Client','Razon social','prioridad']].copy())
-    if incluir_exactos_clientes and not df_exact_f.empty:
-        frames.append(df_exact_f[['Client','Razon social','prioridad']].copy())
-
-    if frames:
-        df_clients = pd.concat(frames, ignore_index=True)
-        df_clients['Client'] = _normalize_client_series(df_clients['Client'])
-        df_clients['prioridad'] = df_clients['prioridad'].astype(str).str.upper()
-        df_clients['Razon social'] = df_clients.get('Razon social','').astype(str).str.strip()
-        df_clients['prio_rank'] = df_clients['prioridad'].apply(lambda p: 2 if str(p).upper()=='ALTA' else 1)
-        g = df_clients.groupby('Client', dropna=False)
-        df_clients_sum = g.agg(
-            razon_social=('Razon social', lambda x: next((v for v in x if v and v!='nan'), '')),
-            casos=('Client','size'),
-            prioridad_max=('prio_rank','max')
-        ).reset_index()
-        df_clients_sum['prioridad_max'] = df_clients_sum['prioridad_max'].map({2:'ALTA',1:'MEDIA'}).fillna('MEDIA')
-        df_clients_sum = df_clients_sum.sort_values(['prioridad_max','casos','Client'], ascending=[False,False,True])
-    else:
-        df_clients_sum = pd.DataFrame(columns=['Client','razon_social','casos','prioridad_max'])
 
-    m1,m2,m3,m4,m5 = st.columns(5)
-    m1.metric('EXACTOS', str(len(df_exact)))
-    m2.metric('SIMILARES', str(len(df_sim)))
-    m3.metric('ALTA (exactos)', str(alta_exact))
-    m4.metric('ALTA (similares)', str(alta_sim))
-    m5.metric('Clientes únicos', str(len(df_clients_sum)))
+def _soltar_trabajo(sesion: str, clave=None):
+    """Deja de esperar la detección anotada en la sesión si es de otro archivo (o ya no hay archivo).
 
-    st.markdown('---')
+    Si ninguna otra sesión la espera, se cancela (ver Trabajos.soltar).
+    """
+    previa = st.session_state.get('trabajo')
+    if previa is None or previa == clave:
+        return
+    del st.session_state['trabajo']
+    trabajo = _trabajos().obtener(previa)
+    if trabajo is not None:
+        _trabajos().soltar(trabajo, sesion)
+
+
+def _columnas_exactos(df: pd.DataFrame) -> list:
+    """Columnas visibles de los exactos: firma_productos solo con 'Mostrar firma_productos completa'."""
+    return [c for c in df.columns if mostrar_firma or c != 'firma_productos']
 
-    tab1,tab2,tab3,tab4 = st.tabs(['🟡 Similares', '✅ Exactos', '🧾 Clientes únicos', '📨 Preventivos'])
 
-    with tab1:
-        st.subheader('🟡 Duplicados similares')
-        vista = st.radio('Vista', ['Detalle (sin repetir Client)', 'Agrupada por cliente (1 fila por Client)'], horizontal=True)
+# Id de esta sesión para los trabajos compartidos: una sesión que cancela o cambia de archivo
+# solo corta la detección si ninguna otra la está esperando
+sesion = st.session_state.setdefault('sesion', uuid.uuid4().hex)
 
-        if df_sim_f.empty:
-            st.info('No hay similares con los criterios actuales.')
+if not uploaded:
+    _soltar_trabajo(sesion)
+    st.warning('Subí un CSV para empezar.')
+    st.stop()
+
+# Resultado cacheado por contenido + config: las tablas derivadas vienen armadas y los
+# widgets solo eligen cuál mostrar
+data = uploaded.getvalue()
+clave = content_key(data)
+_soltar_trabajo(sesion, clave)
+res = _result_cache().get(clave)
+if res is not None:
+    st.session_state.pop('trabajo', None)
+else:
+    # La detección corre en segundo plano; mientras tanto se muestra el avance y se vuelve a consultar
+    if st.session_state.get('cancelado') == clave:
+        st.warning('Detección cancelada.')
+        if st.button('Volver a detectar'):
+            del st.session_state['cancelado']
+            st.rerun()
+        st.stop()
+    trabajo = _trabajos().lanzar(clave, lambda stats: _run_detection(data, stats), sesion=sesion)
+    st.session_state['trabajo'] = clave
+    if not trabajo.terminado:
+        p = trabajo.progreso
+        avance = p.clientes / p.clientes_total if p.etapa == 'similar' and p.clientes_total else 0.0
+        st.progress(min(avance, 1.0), text=f"Detectando… etapa {p.etapa or 'inicio'} · {p.lineas:,} líneas leídas · "
+                                           f"clientes {p.clientes:,}/{p.clientes_total:,} · {p.pares:,} pares · "
+                                           f"{trabajo.segundos:.0f}s")
+        if st.button('Cancelar detección'):
+            _trabajos().soltar(trabajo, sesion)
+            del st.session_state['trabajo']
+            st.session_state['cancelado'] = clave
+            st.rerun()
+        time.sleep(CONSULTA_SEGUNDOS)
+        st.rerun()
+    del st.session_state['trabajo']
+    if trabajo.estado == LISTO:
+        res = trabajo.resultado()
+        _result_cache().put(clave, res)
+        _trabajos().olvidar(trabajo)
+    elif trabajo.estado == CANCELADO:
+        st.session_state['cancelado'] = clave
+        st.rerun()
+    else:
+        st.error(f'Error al procesar el archivo: {trabajo.error}')
+        st.stop()
+vistas = _vistas(res, (max_dias, min_sim_importe, min_sim_productos))
+df_clients_sum = vistas['clientes'][(solo_alta, incluir_exactos_clientes)]
+
+m1,m2,m3,m4,m5 = st.columns(5)
+m1.metric('EXACTOS', str(len(res['df_exact'])))
+m2.metric('SIMILARES', str(len(vistas['df_sim'])))
+m3.metric('ALTA (exactos)', str(vistas['alta_exact']))
+m4.metric('ALTA (similares)', str(vistas['alta_sim']))
+m5.metric('Clientes únicos', str(len(df_clients_sum)))
+
+with st.expander('🔧 Diagnóstico'):
+    stats = res['stats']
+    st.caption(f"Motor: {stats['engine']} · tiempos de la corrida que generó el resultado (los reusos del caché no recalculan)")
+    st.dataframe(pd.DataFrame([stats['seconds']]), use_container_width=True, hide_index=True)
+    d1,d2,d3,d4 = st.columns(4)
+    d1.metric('Filas leídas', f"{stats['rows_read']:,}")
+    d2.metric('Descartadas (Sts)', f"{stats['rows_skipped_estado']:,}")
+    d3.metric('Descartadas (sin Client/Pedido)', f"{stats['rows_skipped_sin_clave']:,}")
+    d4.metric('Pedidos', f"{stats['orders']:,}")
+    p1,p2,p3,p4 = st.columns(4)
+    p1.metric('Pares en ventana', f"{stats['window_pairs']:,}")
+    p2.metric('Podados por importe', f"{stats['pairs_pruned_importe']:,}")
+    p3.metric('Cálculos de coseno', f"{stats['cosine_calls']:,}")
+    p4.metric('Pares puntuados', f"{stats['pairs_emitted']:,}")
+    st.caption(f'Pares puntuados con cotas sueltas ({PUNTAJE_MAX_DIAS} días, importe ≥ {PUNTAJE_MIN_SIM_IMPORTE}, '
+               f'productos ≥ {PUNTAJE_MIN_SIM_PRODUCTOS}); los sliders filtran sobre esos pares.')
+    st.caption(f'Clientes más caros (pares en la ventana de {PUNTAJE_MAX_DIAS} días)')
+    st.dataframe(pd.DataFrame(stats['top_clients']), use_container_width=True, hide_index=True)
+
+st.markdown('---')
+
+tab1,tab2,tab3,tab4 = st.tabs(['🟡 Similares', '✅ Exactos', '🧾 Clientes únicos', '📨 Preventivos'])
+
+with tab1:
+    st.subheader('🟡 Duplicados similares')
+    vista = st.radio('Vista', ['Detalle (sin repetir Client)', 'Agrupada por cliente (1 fila por Client)'], horizontal=True)
+
+    df_detail = vistas['sim_detalle'][solo_alta]
+    if df_detail.empty:
+        st.info('No hay similares con los criterios actuales.')
+    else:
+        if vista.startswith('Detalle'):
+            _tabla(df_detail, 'sim_detalle', column_config=_COLS_FECHA)
         else:
-            if vista.startswith('Detalle'):
-                df_detail = df_sim_f.sort_values(['prioridad','Client'], ascending=[False, True]) if 'prioridad' in df_sim_f.columns else df_sim_f.sort_values(['Client'])
-                df_detail = _suppress_repeated(df_detail, 'Client')
-                st.dataframe(df_detail, use_container_width=True, hide_index=True)
-            else:
-                df_tmp = df_sim_f.copy()
-                df_tmp['prio_rank'] = df_tmp.get('prioridad','MEDIA').apply(lambda p: 2 if str(p).upper()=='ALTA' else 1)
-                g = df_tmp.groupby('Client', dropna=False)
-                df_group = g.agg(
-                    pares=('Client','size'),
-                    prioridad_max=('prio_rank','max'),
-                    ejemplo_pedido_1=('Pedido_1', lambda x: next((v for v in x if str(v)!='nan'), '')),
-                    ejemplo_pedido_2=('Pedido_2', lambda x: next((v for v in x if str(v)!='nan'), '')),
-                ).reset_index()
-                df_group['prioridad_max'] = df_group['prioridad_max'].map({2:'ALTA',1:'MEDIA'}).fillna('MEDIA')
-                df_group = df_group.sort_values(['prioridad_max','pares','Client'], ascending=[False,False,True])
-                st.dataframe(df_group, use_container_width=True, hide_index=True)
-                st.download_button('Descargar similares_agrupado_por_cliente.csv', data=df_group.to_csv(index=False).encode('utf-8'),
-                                   file_name='similares_agrupado_por_cliente.csv', mime='text/csv')
-
-        st.download_button('Descargar duplicados_similares.csv', data=out_sim.read_bytes(), file_name='duplicados_similares.csv', mime='text/csv')
-
-    with tab2:
-        st.subheader('✅ Duplicados exactos (sin repetir Client)')
-        df_show = df_exact_f.copy()
-        if not mostrar_firma and not df_show.empty and 'firma_productos' in df_show.columns:
-            df_show['firma_productos'] = df_show['firma_productos'].astype(str).str.slice(0,120) + '…'
-        if not df_show.empty:
-            df_detail = df_show.sort_values(['prioridad','Client'], ascending=[False, True]) if 'prioridad' in df_show.columns else df_show.sort_values(['Client'])
-            df_detail = _suppress_repeated(df_detail, 'Client')
-            st.dataframe(df_detail, use_container_width=True, hide_index=True)
+            df_group = vistas['sim_agrupada'][solo_alta]
+            _tabla(df_group, 'sim_agrupada')
+            st.download_button('Descargar similares_agrupado_por_cliente.csv', data=df_group.to_csv(index=False).encode('utf-8'),
+                               file_name='similares_agrupado_por_cliente.csv', mime='text/csv')
+
+    st.download_button('Descargar duplicados_similares.csv', data=_csv_bytes(res, vistas, 'sim'), file_name='duplicados_similares.csv', mime='text/csv')
+
+with tab2:
+    st.subheader('✅ Duplicados exactos (sin repetir Client)')
+    df_detail = vistas['exact_detalle'][solo_alta]
+    if not df_detail.empty:
+        _tabla(df_detail, 'exact_detalle', column_config=_COLS_FECHA, column_order=_columnas_exactos(df_detail))
+    else:
+        st.info('No hay exactos con los criterios actuales.')
+    st.download_button('Descargar duplicados_exactos.csv', data=_csv_bytes(res, res, 'exact', mostrar_firma), file_name='duplicados_exactos.csv', mime='text/csv')
+
+with tab3:
+    st.subheader('🧾 Clientes únicos (para bloquear)')
+    st.caption('Acá SIEMPRE es 1 fila por Client (normalizado a solo dígitos).')
+    _tabla(df_clients_sum, 'clientes')
+    st.download_button('Descargar lista_clientes_unicos.csv', data=df_clients_sum.to_csv(index=False).encode('utf-8'),
+                       file_name='lista_clientes_unicos.csv', mime='text/csv')
+
+with tab4:
+    st.subheader('📨 Enviar a preventivos')
+    prefill = '\n'.join(df_clients_sum['Client'].astype(str).tolist()) if not df_clients_sum.empty else ''
+    clientes_texto = st.text_area('Clientes (uno por línea / coma / espacio / ;)', value=prefill, height=220)
+    formato = st.selectbox('Formato', ['Líneas', 'Coma', 'Punto y coma'], index=0)
+    solo_alta_msg = st.checkbox('Solo ALTA en mensaje', value=False)
+
+    clientes_list = _split_clients(clientes_texto)
+    df_sel = df_clients_sum[df_clients_sum['Client'].astype(str).isin(clientes_list)].copy() if not df_clients_sum.empty else pd.DataFrame()
+    if solo_alta_msg and not df_sel.empty:
+        df_sel = df_sel[df_sel['prioridad_max'] == 'ALTA']
+
+    _tabla(df_sel, 'preventivos')
+
+    if not df_sel.empty:
+        ids = df_sel['Client'].astype(str).tolist()
+        if formato == 'Líneas':
+            mensaje = '\n'.join(ids)
+        elif formato == 'Coma':
+            mensaje = ', '.join(ids)
         else:
-            st.info('No hay exactos con los criterios actuales.')
-        st.download_button('Descargar duplicados_exactos.csv', data=out_exact.read_bytes(), file_name='duplicados_exactos.csv', mime='text/csv')
-
-    with tab3:
-        st.subheader('🧾 Clientes únicos (para bloquear)')
-        st.caption('Acá SIEMPRE es 1 fila por Client (normalizado a solo dígitos).')
-        st.dataframe(df_clients_sum, use_container_width=True, hide_index=True)
-        st.download_button('Descargar lista_clientes_unicos.csv', data=df_clients_sum.to_csv(index=False).encode('utf-8'),
-                           file_name='lista_clientes_unicos.csv', mime='text/csv')
-
-    with tab4:
-        st.subheader('📨 Enviar a preventivos')
-        prefill = '\n'.join(df_clients_sum['Client'].astype(str).tolist()) if not df_clients_sum.empty else ''
-        clientes_texto = st.text_area('Clientes (uno por línea / coma / espacio / ;)', value=prefill, height=220)
-        formato = st.selectbox('Formato', ['Líneas', 'Coma', 'Punto y coma'], index=0)
-        solo_alta_msg = st.checkbox('Solo ALTA en mensaje', value=False)
-
-        clientes_list = _split_clients(clientes_texto)
-        df_sel = df_clients_sum[df_clients_sum['Client'].astype(str).isin(clientes_list)].copy() if not df_clients_sum.empty else pd.DataFrame()
-        if solo_alta_msg and not df_sel.empty:
-            df_sel = df_sel[df_sel['prioridad_max'] == 'ALTA']
-
-        st.dataframe(df_sel, use_container_width=True, hide_index=True)
-
-        if not df_sel.empty:
-            ids = df_sel['Client'].astype(str).tolist()
-            if formato == 'Líneas':
-                mensaje = '\n'.join(ids)
-            elif formato == 'Coma':
-                mensaje = ', '.join(ids)
-            else:
-                mensaje = '; '.join(ids)
-            st.code(mensaje, language='text')
-            st.download_button('Descargar mensaje_preventivos.txt', data=mensaje.encode('utf-8'),
-                               file_name='mensaje_preventivos.txt', mime='text/plain')
+            mensaje = '; '.join(ids)
+        st.code(mensaje, language='text')
+        st.download_button('Descargar mensaje_preventivos.txt', data=mensaje.encode('utf-8'),
+                           file_name='mensaje_preventivos.txt', mime='text/plain')
+
+# Vistas y CSV nuevos agrandan el resultado cacheado: se vuelve a medir (CACHE_MAX_BYTES)
+_result_cache().resize(clave)
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+"""Benchmark del detector: tiempo por etapa, memoria pico y verificación contra la verdad.
+
+Genera reportes sintéticos (synth_report) y corre cada motor en un proceso aparte,
+así la memoria pico (RSS) de un caso no contamina al siguiente.
+
+Etapas:
+- parse:     lectura + parseo de líneas (motor python: una pasada solo de parseo)
+- aggregate: líneas -> pedidos con firmas (motor python: pasada completa menos 'parse')
+- exact:     exactos SOLO RET
+- similar:   pares similares
+- write:     CSV de salida
+
+Verificación: todos los exactos y casi-duplicados inyectados tienen que aparecer, y
+ningún pedido con Sts descartado; con más de un motor, los CSV (huella_productos incluida)
+tienen que ser idénticos entre motores. Sale con código 1 si algo falla.
+
+Equivalencia: antes de medir, sobre un reporte de casos límite de redondeo
+(synth_report.generate_redondeos), python, pandas y python con workers (lectura por
+rangos y similares en procesos, sin los mínimos de tamaño) tienen que escribir
+exactamente los mismos CSV, con huella y firma_productos completa.
+
+Regresiones (también antes de medir): chequeos chicos de lo que prometen los otros modos.
+- streaming_memoria: la memoria pico de detector_streaming no crece con el largo del
+  reporte (más días), solo con la ventana
+- streaming_equivalencia: sobre un reporte ordenado por Entrega, detector_streaming
+  escribe las mismas filas que run_detector
+- incremental_partido: el mismo reporte partido por días en varias corridas de
+  detector_incremental suma las filas de run_detector, y repetir la última no agrega nada
+- cruzado_recall: los pares de detector_cruzado (LSH) son pares de la búsqueda exhaustiva
+  y encuentran casi todos (semilla fija)
+
+--equivalencia corre solo la equivalencia y las regresiones.
+
+Uso:
+    python bench_detector.py --lines 10000 100000 1000000 --engine python pandas
+    python bench_detector.py --lines 10000000 --engine pandas --delim tab --json bench.json
+    python bench_detector.py --equivalencia
+"""
+
+import argparse
+import csv
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+
+import detector_core as core
+from synth_report import generate_redondeos, generate_report, ordenar_por_entrega
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ETAPAS = ('parse', 'aggregate', 'exact', 'similar', 'write')
+SALIDAS = ('duplicados_exactos.csv', 'duplicados_similares.csv')
+
+
+class _Etapas:
+    """Cronómetro por etapa; con tracemalloc también registra el pico de cada una."""
+
+    def __init__(self, trace: bool):
+        self.trace = trace
+        self.seconds = {}
+        self.peak_mb = {}
+
+    def run(self, name, fn, *args):
+        if self.trace:
+            tracemalloc.reset_peak()
+        t0 = time.perf_counter()
+        out = fn(*args)
+        self.seconds[name] = time.perf_counter() - t0
+        if self.trace:
+            self.peak_mb[name] = tracemalloc.get_traced_memory()[1] / 2**20
+        return out
+
+
+def _consume(rows):
+    n = 0
+    for _ in rows:
+        n += 1
+    return n
+
+
+def _case_python(path: Path, out_dir: Path, st: _Etapas, workers):
+    catalogo = core.Catalogo()
+    if core._lectura_paralela(path, workers):
+        # Lectura por rangos en paralelo: parse y aggregate los mide la propia lectura
+        stats = core.DetectorStats()
+        orders = core._armar_pedidos_paralelo(path, workers, catalogo, stats)
+        st.seconds.update(stats.seconds)
+    else:
+        st.run('parse', _consume, core.iter_rows_from_path(path))
+        orders = st.run('aggregate', core._armar_pedidos, core.iter_rows_from_path(path), catalogo)
+        st.seconds['aggregate'] = max(st.seconds['aggregate'] - st.seconds['parse'], 0.0)
+    exact = st.run('exact', core._exactos, orders, catalogo)
+    sim = st.run('similar', core._similares, orders, workers)
+    st.run('write', core._write_results, exact, sim, out_dir / 'duplicados_exactos.csv', out_dir / 'duplicados_similares.csv')
+    return len(orders)
+
+
+def _case_pandas(path: Path, out_dir: Path, st: _Etapas, workers):
+    import detector_columnar as col
+
+    cols = st.run('parse', col._read_columns, core._iter_lines_from_path(path))
+    o = st.run('aggregate', col._aggregate, cols)
+    del cols
+    exact = st.run('exact', col._exact_rows, o)
+    sim = st.run('similar', col._similar_rows, o)
+    st.run('write', core._write_results, exact, sim, out_dir / 'duplicados_exactos.csv', out_dir / 'duplicados_similares.csv')
+    return o['n']
+
+
+def run_case(path: Path, engine: str, out_dir: Path, trace: bool = False, workers=None) -> dict:
+    """Corre un motor sobre un reporte (en este proceso) y devuelve tiempos y memoria."""
+    st = _Etapas(trace)
+    if trace:
+        tracemalloc.start()
+    n_orders = (_case_pandas if engine == 'pandas' else _case_python)(path, out_dir, st, workers)
+    total = sum(st.seconds.values())
+    if trace:
+        tracemalloc.stop()
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None
+    return {
+        'engine': engine,
+        'orders': n_orders,
+        'seconds': {k: round(v, 4) for k, v in st.seconds.items()},
+        'total_seconds': round(total, 4),
+        'peak_rss_mb': round(peak_rss, 1) if peak_rss is not None else None,
+        'peak_traced_mb': {k: round(v, 1) for k, v in st.peak_mb.items()},
+    }
+
+
+def verify(truth: dict, out_dir: Path) -> dict:
+    """Compara las salidas con los duplicados inyectados."""
+    with (out_dir / 'duplicados_exactos.csv').open(encoding='utf-8', newline='') as f:
+        exact = list(csv.DictReader(f))
+    with (out_dir / 'duplicados_similares.csv').open(encoding='utf-8', newline='') as f:
+        sim = list(csv.DictReader(f))
+
+    grupo = {(r['Client'], r['Pedido']): (r['Entrega'], r['Importe'], r['huella_productos']) for r in exact}
+    pares = {(r['Client'], *sorted((r['Pedido_1'], r['Pedido_2']))) for r in sim}
+    vistos = set(p for (_, p) in grupo) | {r['Pedido_1'] for r in sim} | {r['Pedido_2'] for r in sim}
+
+    miss_exact = [p for p in truth['exact_pairs']
+                  if (p[0], p[1]) not in grupo or grupo.get((p[0], p[1])) != grupo.get((p[0], p[2]))]
+    miss_near = [p for p in truth['near_pairs'] if (p[0], *sorted(p[1:])) not in pares]
+    leaked = [p for p in truth['negatives'] if p[1] in vistos]
+    return {
+        'exact_rows': len(exact),
+        'similar_rows': len(sim),
+        'exact_recall': 1 - len(miss_exact) / max(len(truth['exact_pairs']), 1),
+        'near_recall': 1 - len(miss_near) / max(len(truth['near_pairs']), 1),
+        'negatives_leaked': len(leaked),
+        'ok': not miss_exact and not miss_near and not leaked,
+    }
+
+
+@contextmanager
+def _constantes(modulo, **valores):
+    """Cambia constantes de un módulo mientras dura el bloque."""
+    antes = {k: getattr(modulo, k) for k in valores}
+    for k, v in valores.items():
+        setattr(modulo, k, v)
+    try:
+        yield
+    finally:
+        for k, v in antes.items():
+            setattr(modulo, k, v)
+
+
+def _paralelo_siempre():
+    """Lectura y similares en paralelo aunque el reporte sea chico (para comparar salidas)."""
+    return _constantes(core, PARALELO_MIN_BYTES=0, PARALELO_MIN_PARES=0)
+
+
+def _diferencias(nombre_a, dir_a: Path, nombre_b, dir_b: Path):
+    """Salidas de dir_b que no son idénticas a las de dir_a (con la primera línea distinta)."""
+    diferencias = []
+    for nombre in SALIDAS:
+        a, b = (dir_a / nombre).read_bytes(), (dir_b / nombre).read_bytes()
+        if a != b:
+            la, lb = a.splitlines(), b.splitlines()
+            linea = next((k for k, (x, y) in enumerate(zip(la, lb)) if x != y), min(len(la), len(lb)))
+            diferencias.append(f'{nombre_b} vs {nombre_a}: {nombre} difiere desde la línea {linea + 1}')
+    return diferencias
+
+
+def equivalencia(report: Path, workdir: Path, engines, workers: int = 2) -> dict:
+    """Corre cada motor (y python con workers) sobre report, con firma completa, y compara las salidas."""
+    variantes = [(engine, engine, None) for engine in engines]
+    if 'python' in engines and workers > 1:
+        variantes.append((f'python/workers={workers}', 'python', workers))
+    dirs = {}
+    for nombre, engine, w in variantes:
+        dirs[nombre] = workdir / f"equivalencia_{nombre.replace('/', '_').replace('=', '')}"
+        with _paralelo_siempre():
+            core.run_detector(report, engine, w, firma_completa=True, out_dir=dirs[nombre])
+    ref, *otros = dirs
+    diferencias = [d for nombre in otros for d in _diferencias(ref, dirs[ref], nombre, dirs[nombre])]
+    filas = [(dirs[ref] / nombre).read_bytes().count(b'\n') - 1 for nombre in SALIDAS]
+    return {
+        'variantes': list(dirs),
+        'exact_rows': filas[0],
+        'similar_rows': filas[1],
+        'diferencias': diferencias,
+        'ok': not diferencias,
+    }
+
+
+def streaming_memoria(workdir: Path, lineas: int = 10_000, factor: int = 4, tolerancia: float = 1.5) -> dict:
+    """Pico de tracemalloc de run_streaming con un reporte factor veces más largo (y más días).
+
+    Los reportes tienen las mismas líneas por día, así que la ventana es igual de grande.
+    Con bloques de lectura chicos (si no, el bloque de 1 MiB pesa más que la ventana) y
+    pocos desalojados recordados, para que el recorte también se ejercite.
+    """
+    import detector_streaming as ds
+
+    picos = []
+    with _constantes(core, LECTURA_CHUNK_BYTES=1 << 16), _constantes(ds, RECORDAR_DESALOJADOS=1000):
+        for n in (lineas, lineas * factor):
+            report = workdir / f'streaming_{n}' / 'reporte.csv'
+            report.parent.mkdir(parents=True, exist_ok=True)
+            generate_report(report, n, dias=n // 400, n_productos=500, n_clientes=300)
+            ordenar_por_entrega(report)
+            tracemalloc.start()
+            ds.run_streaming(report)
+            picos.append(tracemalloc.get_traced_memory()[1] / 2**20)
+            tracemalloc.stop()
+    return {'nombre': 'streaming_memoria', 'detalle': f"{lineas}/{lineas * factor} líneas: "
+            + '/'.join(f'{p:.1f}' for p in picos) + 'MB', 'ok': picos[1] <= picos[0] * tolerancia}
+
+
+def _mismas_filas(a: Path, b: Path) -> bool:
+    """Misma cabecera y las mismas filas (en cualquier orden)."""
+    la, lb = a.read_bytes().splitlines(), b.read_bytes().splitlines()
+    return la[:1] == lb[:1] and sorted(la[1:]) == sorted(lb[1:])
+
+
+def streaming_equivalencia(workdir: Path, lineas: int = 20_000) -> dict:
+    """run_streaming vs run_detector sobre el mismo reporte ordenado por Entrega.
+
+    Los similares de streaming salen en orden de Entrega: se comparan las filas, no el orden.
+    """
+    import detector_streaming as ds
+
+    base = workdir / 'streaming_equivalencia'
+    report = base / 'reporte.csv'
+    base.mkdir(parents=True, exist_ok=True)
+    generate_report(report, lineas, dias=30)
+    ordenar_por_entrega(report)
+    core.run_detector(report, out_dir=base / 'lote')
+    with report.open('rb') as f:
+        ds.detect_streaming_from_filelike(f, base / 'streaming')
+    distintas = [n for n in SALIDAS if not _mismas_filas(base / 'lote' / n, base / 'streaming' / n)]
+    filas = [(base / 'lote' / n).read_bytes().count(b'\n') - 1 for n in SALIDAS]
+    return {'nombre': 'streaming_equivalencia', 'ok': not distintas,
+            'detalle': f'{lineas} líneas: exact={filas[0]} similar={filas[1]}'
+            + ''.join(f' ({n} difiere)' for n in distintas)}
+
+
+def _partir_por_dias(report: Path, partes: int):
+    """Parte un reporte ordenado por Entrega en partes archivos, cortando entre días distintos."""
+    lineas = report.read_text(encoding='latin1').splitlines(keepends=True)
+    h = next(k for k, x in enumerate(lineas) if x.startswith('F.Pedido'))
+    cabecera, datos = lineas[:h + 1], lineas[h + 1:]
+    i = next(csv.reader(cabecera[-1:], delimiter=';')).index('Entrega')
+    dias = [row[i] for row in csv.reader(datos, delimiter=';')]
+    cortes = [0]
+    for k in range(1, partes):
+        c = len(datos) * k // partes
+        while 0 < c < len(datos) and dias[c] == dias[c - 1]:
+            c += 1
+        if cortes[-1] < c < len(datos):
+            cortes.append(c)
+    cortes.append(len(datos))
+    paths = []
+    for k, (a, b) in enumerate(zip(cortes, cortes[1:])):
+        paths.append(report.with_name(f'parte_{k}.csv'))
+        paths[-1].write_text(''.join(cabecera + datos[a:b]), encoding='latin1')
+    return paths
+
+
+def incremental_partido(workdir: Path, lineas: int = 20_000, partes: int = 3) -> dict:
+    """run_incremental sobre un reporte partido por días vs run_detector sobre el reporte entero.
+
+    Un grupo de exactos se vuelve a escribir entero cuando se le suma un pedido en otra
+    corrida: los exactos se comparan como conjunto; cada par similar sale una sola vez.
+    """
+    import detector_incremental as inc
+
+    base = workdir / 'incremental_partido'
+    report = base / 'reporte.csv'
+    base.mkdir(parents=True, exist_ok=True)
+    generate_report(report, lineas, dias=30)
+    ordenar_por_entrega(report)
+    core.run_detector(report, out_dir=base / 'lote')
+    db = base / 'pedidos.db'
+    db.unlink(missing_ok=True)
+    exactos, similares = set(), []
+    for k, parte in enumerate(_partir_por_dias(report, partes)):
+        with parte.open('rb') as f:
+            out_exact, out_sim = inc.detect_incremental_from_filelike(f, db, base / f'corrida_{k}')
+        exactos.update(out_exact.read_bytes().splitlines()[1:])
+        similares.extend(out_sim.read_bytes().splitlines()[1:])
+    with parte.open('rb') as f:
+        repetida = inc.detect_incremental_from_filelike(f, db, base / 'repetida')
+    lote = [(base / 'lote' / n).read_bytes().splitlines()[1:] for n in SALIDAS]
+    agregadas = sum(p.read_bytes().count(b'\n') - 1 for p in repetida)
+    ok = exactos == set(lote[0]) and sorted(similares) == sorted(lote[1]) and agregadas == 0
+    return {'nombre': 'incremental_partido', 'ok': ok,
+            'detalle': f'{lineas} líneas en {k + 1} corridas: exact={len(exactos)}/{len(lote[0])} '
+            f'similar={len(similares)}/{len(lote[1])}, repetida +{agregadas}'}
+
+
+def cruzado_recall(workdir: Path, lineas: int = 30_000, minimo: float = 0.95) -> dict:
+    """similares_entre_clientes con LSH vs exhaustivo=True sobre un reporte con pares cruzados inyectados."""
+    import detector_cruzado as dc
+
+    report = workdir / 'cruzado_recall' / 'reporte.csv'
+    report.parent.mkdir(parents=True, exist_ok=True)
+    generate_report(report, lineas, dias=30, share_cross=0.02)
+    orders = core._armar_pedidos(core.iter_rows_from_path(report), core.Catalogo())
+
+    def pares(**kw):
+        return {(r['Client_1'], r['Pedido_1'], r['Client_2'], r['Pedido_2'])
+                for r in dc.similares_entre_clientes(orders, **kw)}
+
+    lsh, ref = pares(), pares(exhaustivo=True)
+    recall = len(lsh & ref) / len(ref) if ref else 1.0
+    return {'nombre': 'cruzado_recall', 'ok': bool(ref) and lsh <= ref and recall >= minimo,
+            'detalle': f'{lineas} líneas: {len(lsh)}/{len(ref)} pares, recall={recall:.3f}'
+            + ('' if lsh <= ref else f' ({len(lsh - ref)} fuera de la referencia)')}
+
+
+REGRESIONES = (streaming_memoria, streaming_equivalencia, incremental_partido, cruzado_recall)
+
+
+def _traced(r):
+    if not r['peak_traced_mb']:
+        return ''
+    return ' traced=' + '/'.join(f"{r['peak_traced_mb'][k]:.0f}" for k in ETAPAS) + 'MB'
+
+
+def _print_row(r):
+    s = r['seconds']
+    etapas = ' '.join(f'{k}={s.get(k, 0):.2f}s' for k in ETAPAS)
+    print(f"{r['lines']:>10} {r['delim']!r:>5} {r['engine']:>7}  total={r['total_seconds']:.2f}s  {etapas}  "
+          f"rss={r['peak_rss_mb']}MB{_traced(r)}  exact={r['check']['exact_recall']:.3f} near={r['check']['near_recall']:.3f} "
+          f"leaked={r['check']['negatives_leaked']}  {'OK' if r['check']['ok'] else 'FALLA'}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmark del detector sobre reportes sintéticos.')
+    ap.add_argument('--lines', type=int, nargs='+', default=[10_000, 100_000])
+    ap.add_argument('--engine', nargs='+', default=list(core.ENGINES), choices=core.ENGINES)
+    ap.add_argument('--delim', default=';', choices=[';', ',', 'tab'])
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--workers', type=int, default=None, help='workers del motor python (lectura y similares)')
+    ap.add_argument('--tracemalloc', action='store_true', help='pico de memoria por etapa (más lento)')
+    ap.add_argument('--workdir', type=Path, help='carpeta para reportes y salidas (default: temporal)')
+    ap.add_argument('--json', type=Path, help='guarda los resultados en este archivo')
+    ap.add_argument('--equivalencia', action='store_true',
+                    help='solo la comparación de salidas entre motores en casos límite de redondeo')
+    ap.add_argument('--case', nargs=3, metavar=('REPORTE', 'MOTOR', 'SALIDA'), help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.case:
+        # Modo interno: un caso por proceso, resultado en stdout
+        path, engine, out_dir = args.case
+        print(json.dumps(run_case(Path(path), engine, Path(out_dir), args.tracemalloc, args.workers)))
+        return 0
+
+    tmp = None
+    if args.workdir is None:
+        tmp = tempfile.TemporaryDirectory(prefix='bench_detector_')
+        args.workdir = Path(tmp.name)
+    args.workdir.mkdir(parents=True, exist_ok=True)
+
+    report = args.workdir / f'redondeos_{args.delim}_{args.seed}.csv'
+    generate_redondeos(report, delim=args.delim, seed=args.seed)
+    eq = equivalencia(report, args.workdir, args.engine, args.workers or 2)
+    print(f"equivalencia {' / '.join(eq['variantes'])}: exact={eq['exact_rows']} similar={eq['similar_rows']}  "
+          f"{'OK' if eq['ok'] else 'FALLA'}")
+    for d in eq['diferencias']:
+        print(f'  {d}')
+    ok = eq['ok']
+    for regresion in REGRESIONES:
+        r = regresion(args.workdir)
+        print(f"{r['nombre']} {r['detalle']}  {'OK' if r['ok'] else 'FALLA'}")
+        ok &= r['ok']
+    if args.equivalencia:
+        if tmp is not None:
+            tmp.cleanup()
+        return 0 if ok else 1
+
+    results = []
+    for n in args.lines:
+        report = args.workdir / f'reporte_{n}_{args.delim}_{args.seed}.csv'
+        truth_path = report.with_suffix('.truth.json')
+        if report.exists() and truth_path.exists():
+            truth = json.loads(truth_path.read_text(encoding='utf-8'))
+        else:
+            truth = generate_report(report, n, args.delim, args.seed)
+            truth_path.write_text(json.dumps(truth), encoding='utf-8')
+
+        ref_dir = None
+        for engine in args.engine:
+            out_dir = args.workdir / f'salida_{n}_{engine}'
+            out_dir.mkdir(exist_ok=True)
+            cmd = [sys.executable, str(Path(__file__).resolve()), '--case', str(report), engine, str(out_dir)]
+            if args.tracemalloc:
+                cmd.append('--tracemalloc')
+            if args.workers:
+                cmd += ['--workers', str(args.workers)]
+            proc = subprocess.run(cmd, capture_output=True, text=True, check=True)
+            r = json.loads(proc.stdout.strip().splitlines()[-1])
+            r.update(lines=truth['lines'], delim=args.delim, check=verify(truth, out_dir))
+            if ref_dir is None:
+                ref_dir = out_dir
+            else:
+                # Mismas salidas que el primer motor, byte a byte
+                r['check']['diferencias'] = _diferencias(args.engine[0], ref_dir, engine, out_dir)
+                r['check']['ok'] &= not r['check']['diferencias']
+            ok &= r['check']['ok']
+            results.append(r)
+            _print_row(r)
+            for d in r['check'].get('diferencias', []):
+                print(f'  {d}')
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2), encoding='utf-8')
+    if tmp is not None:
+        tmp.cleanup()
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
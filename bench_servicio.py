@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Prueba de carga del servicio HTTP (detector_servicio) con clientes concurrentes.
+
+Cada cliente sube un reporte (POST /detecciones?esperar=1, cuerpo enviado por partes),
+reintenta si el servicio responde 503 (cola llena, respetando Retry-After) y baja
+duplicados_similares.csv. Los reportes se reparten en ronda, así que con más pedidos que
+reportes distintos también se mide la caché.
+
+Sin --url levanta un servicio local propio (un proceso aparte, puerto libre) y lo cierra
+al final. Los reportes son sintéticos (synth_report) salvo que se pasen con --reportes.
+
+Informa pedidos por segundo, latencias p50/p90/p99 de punta a punta, 503 recibidos y
+las métricas del servicio (GET /metricas). Sale con código 1 si algún pedido falló.
+
+Uso:
+    python bench_servicio.py --clientes 8 --pedidos 40 --distintos 4 --lines 20000
+    python bench_servicio.py --url http://127.0.0.1:8765 --reportes sucursales/*.csv
+"""
+
+import argparse
+import itertools
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from detector_servicio import percentiles
+from synth_report import generate_report
+
+TIMEOUT = 600
+ESPERA_CIERRE = 30  # segundos para que el servicio local termine antes de matarlo
+
+
+def _pedir(url, data=None, headers=None):
+    """(código, headers, cuerpo); los códigos de error HTTP no levantan excepción."""
+    req = urllib.request.Request(url, data=data, headers=headers or {}, method='POST' if data is not None else 'GET')
+    try:
+        with urllib.request.urlopen(req, timeout=TIMEOUT) as r:
+            return r.status, r.headers, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def _subir(url, path: Path, engine):
+    """Sube el reporte hasta que lo acepten: (código, resumen, 503 recibidos)."""
+    rechazos = 0
+    while True:
+        with open(path, 'rb') as f:
+            codigo, headers, cuerpo = _pedir(f'{url}/detecciones?esperar=1&engine={engine}', f,
+                                             {'Content-Length': str(path.stat().st_size),
+                                              'Content-Type': 'text/csv'})
+        if codigo != 503:
+            return codigo, json.loads(cuerpo), rechazos
+        rechazos += 1
+        time.sleep(float(headers.get('Retry-After') or 1))
+
+
+def _cliente(url, trabajo, engine, resultados, lock):
+    for path in trabajo:
+        t0 = time.perf_counter()
+        r = {'reporte': path.name, 'ok': False}
+        try:
+            codigo, resumen, rechazos = _subir(url, path, engine)
+            r.update(codigo=codigo, rechazos=rechazos)
+            if codigo == 200:
+                codigo_csv, _, csv = _pedir(url + resumen['tablas']['similares.csv'])
+                r.update(ok=codigo_csv == 200, similares=resumen['similares'], bytes_csv=len(csv))
+            else:
+                r['error'] = resumen.get('error')
+        except Exception as e:
+            r['error'] = f'{type(e).__name__}: {e}'
+        r['segundos'] = time.perf_counter() - t0
+        with lock:
+            resultados.append(r)
+
+
+def _levantar_servicio(workers, cola):
+    """Corre detector_servicio en otro proceso con un puerto libre -> (proceso, url)."""
+    cmd = [sys.executable, str(Path(__file__).with_name('detector_servicio.py')), '--puerto', '0',
+           '--cola', str(cola)]
+    if workers:
+        cmd += ['--workers', str(workers)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    linea = proc.stdout.readline()  # "Escuchando en http://host:puerto (...)"
+    if not linea:
+        raise RuntimeError('El servicio no arrancó')
+    return proc, linea.split()[2]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Prueba de carga del servicio HTTP de detección.')
+    ap.add_argument('--url', help='servicio ya corriendo (default: levanta uno local)')
+    ap.add_argument('--reportes', type=Path, nargs='+', help='reportes a subir (default: sintéticos)')
+    ap.add_argument('--lines', type=int, default=20_000, help='líneas de cada reporte sintético')
+    ap.add_argument('--distintos', type=int, default=4, help='reportes sintéticos distintos')
+    ap.add_argument('--clientes', type=int, default=8, help='clientes concurrentes')
+    ap.add_argument('--pedidos', type=int, default=32, help='subidas en total')
+    ap.add_argument('--engine', default='python')
+    ap.add_argument('--workers', type=int, default=None, help='workers del servicio local')
+    ap.add_argument('--cola', type=int, default=4, help='cola del servicio local')
+    ap.add_argument('--json', type=Path, help='guarda el resultado en este archivo')
+    args = ap.parse_args(argv)
+
+    tmp = proc = None
+    reportes = args.reportes
+    if not reportes:
+        tmp = tempfile.TemporaryDirectory(prefix='bench_servicio_')
+        reportes = [Path(tmp.name) / f'reporte_{k}.csv' for k in range(args.distintos)]
+        for k, path in enumerate(reportes):
+            generate_report(path, args.lines, seed=k)
+    url = args.url
+    if url is None:
+        proc, url = _levantar_servicio(args.workers, args.cola)
+    url = url.rstrip('/')
+
+    try:
+        ronda = list(itertools.islice(itertools.cycle(reportes), args.pedidos))
+        trabajos = [ronda[k::args.clientes] for k in range(args.clientes)]
+        resultados = []
+        lock = threading.Lock()
+        hilos = [threading.Thread(target=_cliente, args=(url, t, args.engine, resultados, lock)) for t in trabajos]
+        t0 = time.perf_counter()
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        total = time.perf_counter() - t0
+        metricas = json.loads(_pedir(f'{url}/metricas')[2])
+    finally:
+        if proc is not None:
+            proc.terminate()  # SIGTERM: el servicio cierra el servidor y el pool
+            try:
+                proc.wait(timeout=ESPERA_CIERRE)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        if tmp is not None:
+            tmp.cleanup()
+
+    fallidos = [r for r in resultados if not r['ok']]
+    lat = percentiles([r['segundos'] for r in resultados])
+    out = {
+        'pedidos': len(resultados),
+        'clientes': args.clientes,
+        'reportes_distintos': len(reportes),
+        'fallidos': len(fallidos),
+        'rechazos_503': sum(r.get('rechazos', 0) for r in resultados),
+        'segundos': round(total, 4),
+        'pedidos_por_segundo': round(len(resultados) / total, 2) if total else None,
+        'latencia': {k: round(v, 4) if v is not None else None for k, v in lat.items()},
+        'servicio': metricas,
+    }
+    print(f"{out['pedidos']} pedidos, {args.clientes} clientes, {out['reportes_distintos']} reportes distintos: "
+          f"{total:.2f}s ({out['pedidos_por_segundo']}/s)  "
+          + '  '.join(f'{k}={v:.3f}s' for k, v in lat.items() if v is not None)
+          + f"  503={out['rechazos_503']}  fallidos={out['fallidos']}")
+    print(f"servicio: detecciones={metricas['detecciones']} cache_hits={metricas['cache_hits']} "
+          f"rechazadas={metricas['rechazadas']} errores={metricas['errores']}")
+    for r in fallidos[:5]:
+        print(f"  FALLA {r['reporte']}: {r.get('codigo')} {r.get('error')}")
+    if args.json:
+        args.json.write_text(json.dumps(out, indent=2, ensure_ascii=False), encoding='utf-8')
+    return 1 if fallidos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
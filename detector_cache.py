@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Caché LRU de resultados de detección, compartida entre sesiones/hilos.
+
+La clave es el hash del contenido subido + la config del detector (detector_config),
+así dos usuarios que suben el mismo reporte comparten el resultado. La caché solo guarda
+resultados terminados: el cálculo en curso lo comparten detector_jobs.Trabajos (app) o
+el registro de detecciones del servicio.
+
+Acotada por cantidad de entradas y por bytes estimados (sizeof). Un valor que crece
+después de guardado (p. ej. con tablas derivadas) se vuelve a medir con resize(clave).
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from detector_core import detector_config
+
+
+def content_key(data) -> tuple:
+    """Clave de caché: sha256 del contenido (bytes o buffer) + config vigente."""
+    return digest_key(hashlib.sha256(data).hexdigest())
+
+
+def digest_key(digest: str) -> tuple:
+    """Como content_key, para un sha256 ya calculado (p. ej. por partes, mientras se recibe)."""
+    return digest, tuple(sorted(detector_config().items()))
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 16, max_bytes: int = 512 * 1024 * 1024, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()  # clave -> (valor, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key][0]
+
+    def put(self, key, value) -> bool:
+        """Guarda value; False si no entra (más grande que max_bytes) y no se guardó."""
+        size = self._sizeof(value)
+        with self._lock:
+            return self._guardar(key, value, size)
+
+    def resize(self, key):
+        """Vuelve a medir el valor de key (si sigue en la caché) y desaloja lo que haga falta."""
+        with self._lock:
+            if key not in self._data:
+                return
+            value = self._data[key][0]
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._data and self._data[key][0] is value:
+                self._guardar(key, value, size)
+
+    def _guardar(self, key, value, size):
+        # Con self._lock tomado
+        if key in self._data:
+            self._bytes -= self._data.pop(key)[1]
+        if size > self.max_bytes:
+            return False
+        self._data[key] = (value, size)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, old) = self._data.popitem(last=False)
+            self._bytes -= old
+        return True
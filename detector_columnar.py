@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""Motor columnar (pandas/NumPy) del detector.
+
+Hace los mismos pasos que detector_core._detect, pero sobre columnas:
+- Líneas -> pedidos con factorize + np.add.at (suma en el mismo orden que el loop)
+- Exactos (SOLO RET): agrupa por huella del pedido y verifica la firma completa
+- Similares: arma los pares candidatos de la ventana MAX_DIAS en bloque
+
+Los CSV que escribe son idénticos byte a byte a los del motor 'python'.
+Se usa con run_detector(..., engine='pandas') o detect_from_filelike(..., engine='pandas').
+"""
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import detector_core as core
+
+BLOQUE_PARES = 1 << 20  # tope de pares candidatos (y de productos expandidos) por bloque
+_MEZCLA = np.uint64(0x9E3779B97F4A7C15)
+
+
+class _LineStream:
+    """Adaptador file-like sobre un iterable de líneas, para pd.read_csv."""
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._buf = ''
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = self._buf + ''.join(self._lines)
+            self._buf = ''
+            return data
+        parts = [self._buf]
+        n = len(self._buf)
+        for line in self._lines:
+            parts.append(line)
+            n += len(line)
+            if n >= size:
+                break
+        data = ''.join(parts)
+        self._buf = data[size:]
+        return data[:size]
+
+    def __iter__(self):
+        return self._lines
+
+
+def _read_columns(lines):
+    """Parsea el reporte a columnas de texto (ya con strip), como las filas de _parse_rows."""
+    delim, lines = core._open_report(lines)
+    df = pd.read_csv(_LineStream(lines), sep=delim, dtype=str, keep_default_na=False,
+                     na_filter=False, index_col=False, engine='c')
+    df.columns = [str(c).strip() for c in df.columns]
+
+    def col(name):
+        if name not in df.columns:
+            return np.full(len(df), '', dtype=object)
+        codes, stripped = _map_unique(df[name].to_numpy(dtype=object), str.strip)
+        return np.array(stripped, dtype=object)[codes]
+
+    return {name: col(name) for name in (
+        core.COL_CLIENTE, core.COL_PEDIDO, core.COL_ENTREGA, core.COL_IMPORTE,
+        core.COL_CPRD, core.COL_CANT, core.COL_RAZON, core.COL_STS,
+    )}
+
+
+def _map_unique(values, fn):
+    """Aplica fn una sola vez por valor distinto (los reportes repiten mucho)."""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return codes, [fn(u) for u in uniques]
+
+
+def _first_where(codes, mask):
+    """(grupos, índice de su primera fila con mask); los grupos sin ninguna no aparecen."""
+    pos = np.flatnonzero(mask)
+    groups, first = np.unique(codes[pos], return_index=True)
+    return groups, pos[first]
+
+
+def _first_nonempty(codes, n_orders, values):
+    out = np.full(n_orders, '', dtype=object)
+    groups, idx = _first_where(codes, values != '')
+    out[groups] = values[idx]
+    return out
+
+
+def _entregas(values):
+    """Entrega por línea como ordinal (-1 = sin fecha): texto dd/mm/yy, o ya ordinal (enteros, ver detector_parquet)."""
+    if values.dtype.kind in 'iu':
+        return values.astype(np.int64)
+    codes, dates = _map_unique(values, core.parse_fecha_entrega)
+    e_ord = np.array([d.toordinal() if d is not None else -1 for d in dates], dtype=np.int64)
+    return e_ord[codes] if len(codes) else np.array([], dtype=np.int64)
+
+
+def _numeros(values, vacio):
+    """Importe / Cant por línea: texto (parse_float) o ya float (NaN = sin valor); vacio para los sin valor."""
+    if values.dtype.kind == 'f':
+        return np.where(np.isnan(values), vacio, values).astype(np.float64)
+    codes, vals = _map_unique(values, core.parse_float)
+    arr = np.array([vacio if v is None else v for v in vals], dtype=np.float64)
+    return arr[codes] if len(codes) else np.array([], dtype=np.float64)
+
+
+def _aggregate(cols, stats=None):
+    """Paso 1 y 2: pedidos (Client, Pedido) con sus productos ordenados (CSR)."""
+    s_codes, s_vals = _map_unique(cols[core.COL_STS], str.upper)
+    sts = np.array(s_vals, dtype=object)[s_codes]
+    client = cols[core.COL_CLIENTE]
+    pedido = cols[core.COL_PEDIDO]
+    estado_ok = (sts == '') | np.isin(sts, list(core.ESTADOS_VALIDOS))
+    keep = estado_ok & (client != '') & (pedido != '')
+    if stats is not None:
+        stats.rows_read += len(sts)
+        stats.rows_skipped_estado += int((~estado_ok).sum())
+        stats.rows_skipped_sin_clave += int((estado_ok & ~keep).sum())
+
+    sts = sts[keep]
+    client = client[keep]
+    pedido = pedido[keep]
+    razon = cols[core.COL_RAZON][keep]
+    prd = cols[core.COL_CPRD][keep]
+
+    c_codes, c_uni = pd.factorize(client)
+    p_codes, p_uni = pd.factorize(pedido)
+    o_codes, o_keys = pd.factorize(c_codes.astype(np.int64) * max(len(p_uni), 1) + p_codes)
+    n_orders = len(o_keys)
+
+    o = {
+        'n': n_orders,
+        'client_code': o_keys // max(len(p_uni), 1),
+        'client_names': c_uni,
+        'pedido': p_uni[o_keys % max(len(p_uni), 1)] if n_orders else np.array([], dtype=object),
+        'razon': _first_nonempty(o_codes, n_orders, razon),
+        'sts': _first_nonempty(o_codes, n_orders, sts),
+    }
+
+    # Entrega: primera fecha válida del pedido (ordinal, -1 = sin fecha)
+    row_ord = _entregas(cols[core.COL_ENTREGA][keep])
+    entrega = np.full(n_orders, -1, dtype=np.int64)
+    groups, idx = _first_where(o_codes, row_ord >= 0)
+    entrega[groups] = row_ord[idx]
+    o['entrega'] = entrega
+
+    # Importe: máximo de los valores válidos (NaN = sin importe)
+    row_imp = _numeros(cols[core.COL_IMPORTE][keep], np.nan)
+    o['importe'] = pd.Series(row_imp).groupby(o_codes).max().to_numpy() if n_orders else row_imp
+
+    # Productos: suma de Cant por (pedido, C.Prd) en orden de aparición, como el defaultdict
+    has_prd = prd != ''
+    row_qty = _numeros(cols[core.COL_CANT][keep][has_prd], 0.0)
+    prd_codes, prd_uni = pd.factorize(prd[has_prd], sort=True)
+    n_prd = max(len(prd_uni), 1)
+    k_codes, k_uni = pd.factorize(o_codes[has_prd].astype(np.int64) * n_prd + prd_codes)
+    qty = np.zeros(len(k_uni), dtype=np.float64)
+    np.add.at(qty, k_codes, row_qty)
+    e_order = k_uni // n_prd
+
+    # Normas en orden de inserción (misma suma secuencial que cosine_sim)
+    o['norm'] = np.sqrt(np.bincount(e_order, weights=qty * qty, minlength=n_orders))
+
+    srt = np.argsort(k_uni, kind='stable')
+    o['prd_uni'] = prd_uni
+    o['e_key'] = k_uni[srt]
+    o['e_prd'] = (k_uni % n_prd)[srt]
+    o['e_qty'] = qty[srt]
+    o['indptr'] = np.concatenate(([0], np.cumsum(np.bincount(e_order, minlength=n_orders)))).astype(np.int64)
+    if stats is not None:
+        stats.orders += n_orders
+    return o
+
+
+def _prd_tuple(o, i, q_round):
+    s, e = o['indptr'][i], o['indptr'][i + 1]
+    return tuple(zip(o['prd_uni'][o['e_prd'][s:e]].tolist(), q_round[s:e].tolist()))
+
+
+def _fmt_importe(v):
+    return None if np.isnan(v) else float(v)
+
+
+def _fmt_entrega(v):
+    return None if v < 0 else date.fromordinal(int(v))
+
+
+def _exact_rows(o):
+    """Paso 3: exactos SOLO RET, agrupados por (Client, Entrega, Importe_r, prd_tuple)."""
+    n = o['n']
+    if not n:
+        return []
+
+    # Redondeos con round() de Python sobre float (con np.float64 round() usa el de numpy,
+    # que no siempre coincide: 2.675 -> 2.68 en vez de 2.67), una vez por valor distinto
+    q_codes, q_vals = _map_unique(o['e_qty'], lambda q: round(float(q), core.REDONDEO_CANT))
+    q_round = np.array(q_vals, dtype=np.float64)[q_codes]
+    i_codes, i_vals = _map_unique(o['importe'], lambda v: round(0.0 if np.isnan(v) else float(v), core.REDONDEO_IMPORTE))
+    imp_r = np.array(i_vals, dtype=np.float64)[i_codes]
+
+    # Huella por pedido: suma (mod 2^64) de un hash por (producto, cantidad redondeada)
+    qr_codes, _ = pd.factorize(q_round, use_na_sentinel=False)
+    h = (o['e_prd'].astype(np.uint64) << np.uint64(32)) ^ qr_codes.astype(np.uint64)
+    h *= np.uint64(0x9E3779B97F4A7C15)
+    h ^= h >> np.uint64(29)
+    nnz = np.diff(o['indptr'])
+    fp = np.zeros(n, dtype=np.uint64)
+    nonempty = np.flatnonzero(nnz)
+    if len(h):
+        fp[nonempty] = np.add.reduceat(h, o['indptr'][nonempty])
+
+    ret = np.flatnonzero(o['sts'] == 'RET')
+    keys = pd.DataFrame({
+        'c': o['client_code'][ret], 'e': o['entrega'][ret], 'i': imp_r[ret],
+        'n': nnz[ret], 'h': fp[ret],
+    })
+    gid = keys.groupby(['c', 'e', 'i', 'n', 'h'], sort=False).ngroup().to_numpy()
+    multi = np.bincount(gid, minlength=1)[gid] > 1 if len(gid) else np.zeros(0, dtype=bool)
+
+    # Verificación de la firma completa (solo candidatos: protege contra colisiones de la huella)
+    groups = {}
+    for i, g in zip(ret[multi].tolist(), gid[multi].tolist()):
+        groups.setdefault((g, _prd_tuple(o, i, q_round)), []).append(i)
+
+    rows = []
+    for members in sorted((m for m in groups.values() if len(m) > 1), key=lambda m: m[0]):
+        for i in members:
+            firma = _prd_tuple(o, i, q_round)
+            rows.append({
+                'Client': o['client_names'][o['client_code'][i]],
+                'Razon social': o['razon'][i],
+                'Sts': o['sts'][i],
+                'Pedido': o['pedido'][i],
+                'Entrega': _fmt_entrega(o['entrega'][i]),
+                'Importe': _fmt_importe(o['importe'][i]),
+                'prioridad': 'MEDIA',
+                'n_productos': len(firma),
+                'huella_productos': core.huella_productos(firma),
+                'firma_productos': firma,
+            })
+    return rows
+
+
+def _orden_ventana(o, max_dias):
+    """Pedidos con Entrega ordenados por (Client, Entrega, Pedido): (idx, comp, cliente).
+
+    comp = cliente * span + Entrega: dos pedidos están en la misma ventana si y solo si
+    |comp_a - comp_b| <= max_dias. cliente es el rango del Client (0, 1, ... en ese orden).
+    """
+    elig = np.flatnonzero(o['entrega'] >= 0)
+    if not len(elig):
+        return elig, np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    crank, _ = pd.factorize(o['client_code'][elig])
+    ped_rank, _ = pd.factorize(o['pedido'][elig], sort=True)
+    order = np.lexsort((ped_rank, o['entrega'][elig], crank))
+    idx = elig[order]
+    ent = o['entrega'][idx]
+    span = int(ent.max()) + max_dias + 1
+    c_orden = crank[order].astype(np.int64)
+    return idx, c_orden * span + ent, c_orden
+
+
+def _pair_blocks(o, max_dias, stats=None):
+    """Pares candidatos (i, j) de la ventana max_dias, en el orden del loop anidado.
+
+    Con stats.progreso informa clientes terminados (los bloques van cliente por cliente).
+    """
+    idx, comp, c_orden = _orden_ventana(o, max_dias)
+    if not len(idx):
+        return
+    core._avance(stats, clientes=0, clientes_total=int(c_orden[-1]) + 1, pares=0)
+    end = np.searchsorted(comp, comp + max_dias, side='right')
+    cnt = end - np.arange(len(idx)) - 1
+
+    start = 0
+    csum = np.cumsum(cnt)
+    while start < len(idx):
+        base = csum[start - 1] if start else 0
+        stop = max(int(np.searchsorted(csum, base + BLOQUE_PARES, side='right')), start + 1)
+        c = cnt[start:stop]
+        total = int(c.sum())
+        if total:
+            ii = np.repeat(np.arange(start, stop), c)
+            off = np.arange(total) - np.repeat(np.cumsum(c) - c, c)
+            yield idx[ii], idx[ii + 1 + off]
+        start = stop
+        core._avance(stats, clientes=int(c_orden[stop - 1]) + (stop == len(idx)))
+
+
+def _sim_importe(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = 1.0 - np.abs(a - b) / np.maximum(a, b)
+    return np.where((a == 0) | (b == 0), 0.0, s)
+
+
+def _cosine(o, A, B):
+    """cosine_sim de cada par (A[k], B[k]) sobre las filas CSR, en bloque."""
+    indptr, e_prd, e_qty, keys = o['indptr'], o['e_prd'], o['e_qty'], o['e_key']
+    n_prd = max(len(o['prd_uni']), 1)
+    out = np.zeros(len(A), dtype=np.float64)
+    cnt = indptr[A + 1] - indptr[A]
+    csum = np.cumsum(cnt)
+    start = 0
+    while start < len(A):
+        base = csum[start - 1] if start else 0
+        stop = max(int(np.searchsorted(csum, base + BLOQUE_PARES, side='right')), start + 1)
+        c = cnt[start:stop]
+        total = int(c.sum())
+        if total:
+            rep = np.repeat(np.arange(stop - start), c)
+            pos = np.repeat(indptr[A[start:stop]], c) + np.arange(total) - np.repeat(np.cumsum(c) - c, c)
+            look = B[start:stop][rep].astype(np.int64) * n_prd + e_prd[pos]
+            hit = np.minimum(np.searchsorted(keys, look), len(keys) - 1)
+            match = keys[hit] == look
+            dot = np.bincount(rep[match], weights=e_qty[pos[match]] * e_qty[hit[match]], minlength=stop - start)
+            n1 = o['norm'][A[start:stop]]
+            n2 = o['norm'][B[start:stop]]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                out[start:stop] = np.where((n1 == 0) | (n2 == 0), 0.0, dot / (n1 * n2))
+        start = stop
+    return out
+
+
+def _bits_productos(o):
+    """Máscara de 64 bits por pedido (un bit por C.Prd, con hash): si dos máscaras no se
+    tocan, los pedidos no comparten productos y el coseno es 0 sin calcularlo."""
+    bit = ((o['e_prd'].astype(np.uint64) * _MEZCLA) >> np.uint64(58)).astype(np.uint64)
+    por_entrada = np.left_shift(np.uint64(1), bit)
+    bits = np.zeros(o['n'], dtype=np.uint64)
+    con = np.flatnonzero(np.diff(o['indptr']) > 0)
+    if len(con):
+        bits[con] = np.bitwise_or.reduceat(por_entrada, o['indptr'][con])
+    return bits
+
+
+def _similar_blocks(o, max_dias, min_sim_importe, min_sim_productos, stats=None, margen=0.05):
+    """Bloques (A, B, sim_importe, sim_productos) de los pares que pasan los umbrales.
+
+    margen: el coseno se calcula para sim_importe >= min_sim_importe - margen (como el motor python).
+    """
+    imp0 = np.nan_to_num(o['importe'], nan=0.0)
+    bits = _bits_productos(o) if min_sim_productos > 0 else None
+    if stats is not None:
+        # Por cliente: ventana (= visitados, acá no hay índice), coseno, emitidos
+        n_cli = len(o['client_names'])
+        cnt = [np.zeros(n_cli, dtype=np.int64) for _ in range(3)]
+    emitidos = 0
+    for A, B in _pair_blocks(o, max_dias, stats):
+        s_imp = _sim_importe(imp0[A], imp0[B])
+        pre = s_imp >= (min_sim_importe - margen)
+        if stats is not None:
+            cnt[0] += np.bincount(o['client_code'][A], minlength=n_cli)
+        A, B, s_imp = A[pre], B[pre], s_imp[pre]
+        if bits is None:
+            s_prd = _cosine(o, A, B)
+        else:
+            comparten = (bits[A] & bits[B]) != 0
+            s_prd = np.zeros(len(A), dtype=np.float64)
+            s_prd[comparten] = _cosine(o, A[comparten], B[comparten])
+        ok = (s_imp >= min_sim_importe) & (s_prd >= min_sim_productos)
+        if stats is not None:
+            cnt[1] += np.bincount(o['client_code'][A], minlength=n_cli)
+            cnt[2] += np.bincount(o['client_code'][A[ok]], minlength=n_cli)
+        emitidos += int(ok.sum())
+        core._avance(stats, pares=emitidos)
+        yield A[ok], B[ok], s_imp[ok], s_prd[ok]
+    if stats is not None:
+        con_fecha = np.bincount(o['client_code'][o['entrega'] >= 0], minlength=n_cli)
+        for c in np.flatnonzero(con_fecha).tolist():
+            ventana, cosenos, emitidos = (int(x[c]) for x in cnt)
+            stats.add_client(o['client_names'][c], int(con_fecha[c]), ventana, ventana, cosenos, emitidos)
+
+
+def _similar_rows(o, stats=None):
+    """Paso 4: similares RET/PRC dentro del mismo Client y la ventana MAX_DIAS."""
+    rows = []
+    for A, B, s_imp, s_prd in _similar_blocks(o, core.MAX_DIAS, core.MIN_SIM_IMPORTE, core.MIN_SIM_PRODUCTOS,
+                                              stats):
+        for a, b, si, sp in zip(A.tolist(), B.tolist(), s_imp.tolist(), s_prd.tolist()):
+            rows.append({
+                'Client': o['client_names'][o['client_code'][a]],
+                'Razon social': o['razon'][a] or o['razon'][b],
+                'Sts_1': o['sts'][a],
+                'Sts_2': o['sts'][b],
+                'Pedido_1': o['pedido'][a],
+                'Pedido_2': o['pedido'][b],
+                'Entrega_1': _fmt_entrega(o['entrega'][a]),
+                'Entrega_2': _fmt_entrega(o['entrega'][b]),
+                'Importe_1': _fmt_importe(o['importe'][a]),
+                'Importe_2': _fmt_importe(o['importe'][b]),
+                'sim_importe': round(si, 4),
+                'sim_productos': round(sp, 4),
+                'prioridad': core.prioridad(o['sts'][a], o['sts'][b]),
+            })
+    return rows
+
+
+def _entrega_datetime(v):
+    return (v - date(1970, 1, 1).toordinal()).astype('datetime64[D]').astype('datetime64[ns]')
+
+
+def _scored_pairs(o, max_dias, min_sim_importe, min_sim_productos, stats=None):
+    """Pares puntuados con cotas sueltas, en columnas (ver core.filtrar_pares).
+
+    sim_importe y sim_productos sin redondear (así el filtro corta igual que el motor)
+    y 'dias' = Entrega_2 - Entrega_1. Mismo orden de filas que _similar_rows.
+    """
+    bloques = list(_similar_blocks(o, max_dias, min_sim_importe, min_sim_productos, stats, margen=0.0))
+    A, B, s_imp, s_prd = (np.concatenate([b[k] for b in bloques]) if bloques else np.zeros(0, dtype=dt)
+                          for k, dt in enumerate((np.int64, np.int64, np.float64, np.float64)))
+    razon_a, razon_b = o['razon'][A], o['razon'][B]
+    sts_a, sts_b = o['sts'][A], o['sts'][B]
+    alta = ((sts_a == 'PRC') & (sts_b == 'RET')) | ((sts_a == 'RET') & (sts_b == 'PRC'))
+    return pd.DataFrame({
+        'Client': o['client_names'][o['client_code'][A]],
+        'Razon social': np.where(razon_a != '', razon_a, razon_b),
+        'Sts_1': sts_a,
+        'Sts_2': sts_b,
+        'Pedido_1': o['pedido'][A],
+        'Pedido_2': o['pedido'][B],
+        'Entrega_1': _entrega_datetime(o['entrega'][A]),
+        'Entrega_2': _entrega_datetime(o['entrega'][B]),
+        'Importe_1': o['importe'][A],
+        'Importe_2': o['importe'][B],
+        'sim_importe': s_imp,
+        'sim_productos': s_prd,
+        'prioridad': np.where(alta, 'ALTA', 'MEDIA').astype(object),
+        'dias': (o['entrega'][B] - o['entrega'][A]).astype(np.int64),
+    })
+
+
+def detect_columnar_rows(lines, stats=None):
+    """(exact_rows, similar_pairs) como listas de dicts, igual que detector_core._detect_rows."""
+    with core._etapa(stats, 'parse'):
+        cols = _read_columns(lines)
+    with core._etapa(stats, 'aggregate'):
+        o = _aggregate(cols, stats)
+    del cols
+    with core._etapa(stats, 'exact'):
+        exact_rows = _exact_rows(o)
+    with core._etapa(stats, 'similar'):
+        similar_pairs = _similar_rows(o, stats)
+    return exact_rows, similar_pairs
+
+
+def detect_columnar_scored(lines, max_dias, min_sim_importe, min_sim_productos, stats=None):
+    """(exact_rows, pares puntuados como DataFrame): exactos completos y similares con cotas sueltas."""
+    with core._etapa(stats, 'parse'):
+        cols = _read_columns(lines)
+    with core._etapa(stats, 'aggregate'):
+        o = _aggregate(cols, stats)
+    del cols
+    with core._etapa(stats, 'exact'):
+        exact_rows = _exact_rows(o)
+    with core._etapa(stats, 'similar'):
+        pares = _scored_pairs(o, max_dias, min_sim_importe, min_sim_productos, stats)
+    return exact_rows, pares
@@ -4,6 +4,7 @@
 Incluye limpieza tipo macro LIMPIEZA:
 - Detecta separador (',', ';' o tab) como TextToColumns
 - Ignora encabezados del reporte y empieza desde la fila que inicia con 'F.Pedido'
+- Lee en streaming: decodifica por bloques y entrega fila por fila (memoria acotada)
 
 Reglas de negocio:
 - Comparación por FECHA DE ENTREGA (Entrega)
@@ -12,15 +13,51 @@ Reglas de negocio:
 - Similares: se calculan con RET/PRC y prioridad ALTA cuando hay PRC vs RET
 
 Expone:
-- run_detector(in_path) -> (path_exact, path_sim)
-- detect_from_filelike(fileobj, out_dir) -> (path_exact, path_sim)
+- run_detector(in_path, engine='python', firma_completa=False) -> (path_exact, path_sim)
+- detect_from_filelike(fileobj, out_dir, engine='python') -> (path_exact, path_sim)
+
+engine='pandas' usa el motor columnar (detector_columnar): mismos CSV, mucho más rápido.
+workers=N (motor python) reparte los similares por cliente en N procesos; mismo resultado.
+Si la entrada es un archivo grande, también lo lee en N procesos por rangos de bytes.
+
+En memoria (sin CSV intermedios):
+- detect_frames_from_filelike(fileobj) / run_detector_frames(in_path) -> (df_exact, df_sim)
+- frame_to_csv(df) -> bytes (mismo formato que los CSV de arriba)
+
+Umbrales interactivos: detect_scored_frames_from_filelike(fileobj) -> (df_exact, df_pares)
+puntúa una vez los pares con cotas sueltas (PUNTAJE_*); filtrar_pares(df_pares, max_dias,
+min_sim_importe, min_sim_productos) -> df_sim para cualquier umbral dentro de las cotas.
+
+Parquet / Arrow: run_detector y run_detector_frames también aceptan líneas ya tipadas
+(.parquet, .arrow, .feather); resultados y pedidos en Parquet con detector_parquet.
+
+Exactos: la columna huella_productos identifica la firma de productos (64 bits, estable
+entre corridas y motores); con firma_completa=True se agrega firma_productos entera.
+
+Diagnóstico: todas aceptan stats=DetectorStats(), que se llena con tiempos por etapa
+y contadores (filas, pedidos, pares visitados/podados, llamadas a coseno, pares emitidos).
+Con DetectorStats(progreso=Progreso()) se puede seguir la corrida desde otro hilo y
+cancelarla (progreso.cancelar() -> DetectorCancelado); ver detector_jobs.
 """
 
+import codecs
 import csv
+import hashlib
+import heapq
 import math
+import mmap
+import operator
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
-from datetime import datetime
-from io import StringIO
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturoDemorado
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from itertools import chain
 from pathlib import Path
 
 # ---------------- CONFIG ----------------
@@ -29,6 +66,18 @@ MIN_SIM_IMPORTE = 0.95
 MIN_SIM_PRODUCTOS = 0.85
 REDONDEO_IMPORTE = 2
 REDONDEO_CANT = 3
+LECTURA_CHUNK_BYTES = 1 << 20  # lectura en streaming por bloques de 1 MiB
+PARALELO_MIN_PARES = 200_000  # con menos pares en la ventana, los procesos cuestan más de lo que ahorran
+PARALELO_MIN_BYTES = 32 << 20  # lectura en paralelo (workers) solo para archivos de 32 MiB o más
+SHARDS_POR_WORKER = 4  # similares en paralelo: shards por worker
+AVANCE_CADA_LINEAS = 50_000  # con stats.progreso: cada cuántas líneas se informa (y se chequea cancelar)
+AVANCE_SEGUNDOS = 0.25  # esperando a los workers: cada cuánto se chequea cancelar
+
+# Cotas sueltas de los pares puntuados (detect_scored_frames_from_filelike): después se puede
+# filtrar con cualquier umbral igual o más estricto sin volver a leer ni puntuar
+PUNTAJE_MAX_DIAS = 5
+PUNTAJE_MIN_SIM_IMPORTE = 0.90
+PUNTAJE_MIN_SIM_PRODUCTOS = 0.70
 
 COL_CLIENTE = 'Client'
 COL_PEDIDO = 'Pedido'
@@ -41,6 +90,183 @@ COL_STS = 'Sts'
 
 ESTADOS_VALIDOS = {'RET', 'PRC'}
 
+CAMPOS_EXACTOS = ['Client','Razon social','Sts','Pedido','Entrega','Importe','prioridad','n_productos','huella_productos']
+CAMPOS_EXACTOS_FIRMA = CAMPOS_EXACTOS + ['firma_productos']  # con firma_completa=True
+CAMPOS_SIMILARES = ['Client','Razon social','Sts_1','Sts_2','Pedido_1','Pedido_2','Entrega_1','Entrega_2','Importe_1','Importe_2','sim_importe','sim_productos','prioridad']
+CAMPOS_PUNTUADOS = CAMPOS_SIMILARES + ['dias']  # sim_* sin redondear; dias = Entrega_2 - Entrega_1
+
+# Motores de detección: 'python' (loop por fila) o 'pandas' (columnar, ver detector_columnar)
+ENGINES = ('python', 'pandas')
+# Entradas ya columnares (Parquet / Arrow IPC): siempre van por el motor columnar, ver detector_parquet
+SUFIJOS_ARROW = ('.parquet', '.pq', '.arrow', '.feather', '.ipc')
+
+
+def detector_config():
+    """Parámetros que cambian el resultado (para claves de caché y resúmenes)."""
+    return {
+        'MAX_DIAS': MAX_DIAS,
+        'MIN_SIM_IMPORTE': MIN_SIM_IMPORTE,
+        'MIN_SIM_PRODUCTOS': MIN_SIM_PRODUCTOS,
+        'REDONDEO_IMPORTE': REDONDEO_IMPORTE,
+        'REDONDEO_CANT': REDONDEO_CANT,
+        'ESTADOS_VALIDOS': tuple(sorted(ESTADOS_VALIDOS)),
+    }
+
+
+# ---------------- Diagnóstico ----------------
+
+class DetectorCancelado(Exception):
+    """La corrida se cortó porque se pidió Progreso.cancelar()."""
+
+
+@dataclass
+class Progreso:
+    """Avance de una corrida en curso, para leerlo desde otro hilo (DetectorStats.progreso).
+
+    La corrida lo actualiza entre etapas, cada AVANCE_CADA_LINEAS líneas y por cliente
+    (o bloque de pares) en similares; en esos mismos puntos corta si se pidió cancelar.
+    """
+    etapa: str = ''
+    lineas: int = 0
+    clientes: int = 0
+    clientes_total: int = 0
+    pares: int = 0
+    cancelado: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def cancelar(self):
+        self.cancelado.set()
+
+    def chequear(self):
+        if self.cancelado.is_set():
+            raise DetectorCancelado(f'Detección cancelada (etapa {self.etapa or "inicio"})')
+
+    def to_dict(self):
+        return {'etapa': self.etapa, 'lineas': self.lineas, 'clientes': self.clientes,
+                'clientes_total': self.clientes_total, 'pares': self.pares}
+
+
+@dataclass
+class DetectorStats:
+    """Tiempos por etapa y contadores de una corrida (se pasa como stats=... y se llena).
+
+    Pares: window_pairs son los que recorrería el loop completo de la ventana MAX_DIAS;
+    candidate_pairs los que se visitan realmente; cosine_calls los que pasan el chequeo
+    de importe; pairs_emitted los que quedan en duplicados_similares.
+    """
+    engine: str = ''
+    seconds: dict = field(default_factory=dict)
+    rows_read: int = 0
+    rows_skipped_estado: int = 0
+    rows_skipped_sin_clave: int = 0
+    orders: int = 0
+    exact_rows: int = 0
+    window_pairs: int = 0
+    candidate_pairs: int = 0
+    cosine_calls: int = 0
+    pairs_emitted: int = 0
+    # Client -> [pedidos, window_pairs, candidate_pairs, cosine_calls, pairs_emitted]
+    clients: dict = field(default_factory=dict)
+    # Avance en vivo (opcional): DetectorStats(progreso=Progreso())
+    progreso: Progreso | None = field(default=None, repr=False, compare=False)
+
+    @property
+    def pairs_pruned_importe(self):
+        return self.window_pairs - self.cosine_calls
+
+    @contextmanager
+    def stage(self, name):
+        _avance(self, etapa=name)
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - t0
+
+    def add_client(self, client, orders, window_pairs, candidate_pairs, cosine_calls, pairs_emitted):
+        self.window_pairs += window_pairs
+        self.candidate_pairs += candidate_pairs
+        self.cosine_calls += cosine_calls
+        self.pairs_emitted += pairs_emitted
+        c = self.clients.setdefault(client, [0, 0, 0, 0, 0])
+        for k, v in enumerate((orders, window_pairs, candidate_pairs, cosine_calls, pairs_emitted)):
+            c[k] += v
+
+    def merge(self, other: 'DetectorStats'):
+        for client, c in other.clients.items():
+            self.add_client(client, *c)
+
+    def top_clients(self, n: int = 20):
+        """Clientes más caros (por pares de la ventana)."""
+        top = sorted(self.clients.items(), key=lambda kv: (-kv[1][1], kv[0]))[:n]
+        campos = ('orders', 'window_pairs', 'candidate_pairs', 'cosine_calls', 'pairs_emitted')
+        return [{'Client': client, **dict(zip(campos, c))} for client, c in top]
+
+    def to_dict(self, top: int = 20):
+        return {
+            'engine': self.engine,
+            'seconds': {k: round(v, 4) for k, v in self.seconds.items()},
+            'rows_read': self.rows_read,
+            'rows_skipped_estado': self.rows_skipped_estado,
+            'rows_skipped_sin_clave': self.rows_skipped_sin_clave,
+            'orders': self.orders,
+            'exact_rows': self.exact_rows,
+            'window_pairs': self.window_pairs,
+            'candidate_pairs': self.candidate_pairs,
+            'pairs_pruned_importe': self.pairs_pruned_importe,
+            'cosine_calls': self.cosine_calls,
+            'pairs_emitted': self.pairs_emitted,
+            'top_clients': self.top_clients(top),
+        }
+
+
+def _etapa(stats, name):
+    return stats.stage(name) if stats is not None else nullcontext()
+
+
+def _avance(stats, **campos):
+    """Actualiza stats.progreso (si hay) y corta con DetectorCancelado si se pidió cancelar."""
+    p = stats.progreso if stats is not None else None
+    if p is not None:
+        for k, v in campos.items():
+            setattr(p, k, v)
+        p.chequear()
+
+
+def _lineas_con_avance(lines, stats):
+    """Cuenta las líneas leídas en stats.progreso (cada AVANCE_CADA_LINEAS)."""
+    if stats is None or stats.progreso is None:
+        return lines
+    return _contar_lineas(lines, stats)
+
+
+def _contar_lineas(lines, stats):
+    n = 0
+    for n, line in enumerate(lines, 1):
+        if n % AVANCE_CADA_LINEAS == 0:
+            _avance(stats, lineas=n)
+        yield line
+    _avance(stats, lineas=n)
+
+
+def _timed_rows(rows, stats):
+    """Acumula en stats.seconds['parse'] el tiempo gastado produciendo filas."""
+    it = iter(rows)
+    clock = time.perf_counter
+    total = 0.0
+    try:
+        while True:
+            t0 = clock()
+            try:
+                row = next(it)
+            except StopIteration:
+                total += clock() - t0
+                return
+            total += clock() - t0
+            yield row
+    finally:
+        stats.seconds['parse'] = stats.seconds.get('parse', 0.0) + total
+
+
 # ---------------- Utilidades ----------------
 
 def _strip(s):
@@ -89,11 +315,9 @@ def prioridad(sts_a, sts_b):
     return 'ALTA' if ({sts_a, sts_b} == {'PRC', 'RET'}) else 'MEDIA'
 
 
-def _find_header_index(lines):
-    for i, line in enumerate(lines[:2000]):
-        if line.strip().startswith('F.Pedido'):
-            return i
-    return None
+def huella_productos(firma) -> str:
+    """Huella estable (64 bits, hex) de firma_productos: ((C.Prd, Cant redondeada), ...)."""
+    return hashlib.blake2b(repr(firma).encode('utf-8'), digest_size=8).hexdigest()
 
 
 def _detect_delimiter(sample_line: str) -> str:
@@ -107,193 +331,928 @@ def _detect_delimiter(sample_line: str) -> str:
     return ','
 
 
-def _rows_from_text(text: str):
-    lines = text.splitlines(True)
-    header_idx = _find_header_index(lines)
-    if header_idx is None:
-        raise RuntimeError("No se encontró la cabecera (línea que inicia con 'F.Pedido')")
+def _iter_lines(fileobj, chunk_size=None):
+    """Lee el archivo por bloques y entrega líneas completas (con su '\n').
+
+    Decodifica latin1 de forma incremental: nunca tiene el archivo entero en memoria.
+    Acepta archivos binarios o de texto.
+    """
+    chunk_size = chunk_size or LECTURA_CHUNK_BYTES
+    decoder = codecs.getincrementaldecoder('latin1')(errors='ignore')
+    pending = ''
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        parts = (pending + chunk).split('\n')
+        pending = parts.pop()
+        for line in parts:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def _parse_rows(lines, delim):
+    reader = csv.DictReader(lines, delimiter=delim)
+    if reader.fieldnames:
+        reader.fieldnames = [fn.strip() for fn in reader.fieldnames]
+    for row in reader:
+        yield {k.strip(): _strip(v) for k, v in row.items()}
+
 
-    content = ''.join(lines[header_idx:])
-    header_line = lines[header_idx]
+def _buscar_cabecera(lines):
+    """Primera línea que inicia con 'F.Pedido' (entre las primeras 2000) y cuántos caracteres
+    hay hasta su fin; consume lines hasta ahí. RuntimeError si no está."""
+    pos = 0
+    for i, line in enumerate(lines):
+        if i >= 2000:
+            break
+        pos += len(line)
+        if line.strip().startswith('F.Pedido'):
+            return line, pos
+    raise RuntimeError("No se encontró la cabecera (línea que inicia con 'F.Pedido')")
+
+
+def _elegir_separador(header_line, lines):
+    """Separador de la cabecera; el alternativo se decide mirando solo la primera fila de datos.
+
+    Devuelve (separador, líneas consumidas de lines, empezando por la cabecera).
+    """
     delim = _detect_delimiter(header_line)
 
-    def parse_with(d):
-        reader = csv.DictReader(StringIO(content), delimiter=d)
-        if reader.fieldnames:
-            reader.fieldnames = [fn.strip() for fn in reader.fieldnames]
-        for row in reader:
-            yield {k.strip(): _strip(v) for k, v in row.items()}
+    # Muestra de look-ahead: las líneas que consume la primera fila quedan guardadas
+    sample = [header_line]
+
+    def recording():
+        for line in lines:
+            sample.append(line)
+            yield line
+
+    first = next(_parse_rows(chain([header_line], recording()), delim), None)
+    if first is not None and len(first.keys()) <= 2:
+        delim = ',' if delim == ';' else ';'
+    return delim, sample
 
-    parsed = list(parse_with(delim))
-    if parsed and (len(parsed[0].keys()) <= 2):
-        alt = ',' if delim == ';' else ';'
-        parsed = list(parse_with(alt))
 
-    for row in parsed:
-        yield row
+def _open_report(lines):
+    """Ubica la cabecera 'F.Pedido' y elige el separador.
+
+    Devuelve (separador, líneas desde la cabecera).
+    """
+    lines = iter(lines)
+    header_line, _ = _buscar_cabecera(lines)
+    delim, sample = _elegir_separador(header_line, lines)
+    return delim, chain(sample, lines)
+
+
+def _rows_from_lines(lines):
+    """Parsea filas en streaming desde un iterable de líneas."""
+    delim, lines = _open_report(lines)
+    yield from _parse_rows(lines, delim)
+
+
+def _iter_lines_from_path(path: Path):
+    with Path(path).open('rb') as f:
+        yield from _iter_lines(f)
 
 
 def iter_rows_from_path(path: Path):
-    text = path.read_bytes().decode('latin1', errors='ignore')
-    yield from _rows_from_text(text)
+    yield from _rows_from_lines(_iter_lines_from_path(path))
 
 
 def iter_rows_from_filelike(fileobj):
-    data = fileobj.read()
-    if isinstance(data, bytes):
-        text = data.decode('latin1', errors='ignore')
-    else:
-        text = data
-    yield from _rows_from_text(text)
+    yield from _rows_from_lines(_iter_lines(fileobj))
+
+
+def _fila_csv(r):
+    rr = dict(r)
+    for k, v in rr.items():
+        if hasattr(v, 'isoformat'):
+            rr[k] = v.isoformat()
+    return rr
 
 
 def write_csv(path: Path, rows, fieldnames):
+    """Escribe solo las columnas de fieldnames (las demás claves de cada fila se ignoran)."""
     with path.open('w', encoding='utf-8', newline='') as f:
-        w = csv.DictWriter(f, fieldnames=fieldnames)
+        w = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
         w.writeheader()
         for r in rows:
-            rr = dict(r)
-            for k, v in rr.items():
-                if hasattr(v, 'isoformat'):
-                    rr[k] = v.isoformat()
-            w.writerow(rr)
+            w.writerow(_fila_csv(r))
 
 
-def _detect(rows_iter, out_exact: Path, out_sim: Path):
-    orders = {}
+# ---------------- Pedidos ----------------
 
-    # 1) Armar pedidos desde líneas
-    for row in rows_iter:
+class Catalogo:
+    """Códigos C.Prd internados a ids enteros (uno por corrida o por store)."""
+    __slots__ = ('ids', 'codigos')
+
+    def __init__(self):
+        self.ids = {}
+        self.codigos = []
+
+    def id(self, codigo):
+        i = self.ids.get(codigo)
+        if i is None:
+            i = self.ids[codigo] = len(self.codigos)
+            self.codigos.append(codigo)
+        return i
+
+
+class Pedido:
+    """Pedido agregado (Client, Pedido).
+
+    prd/qty: ids de C.Prd (Catalogo) ordenados y la suma de Cant de cada uno, como
+    arrays paralelos; sirven tanto para la firma de exactos como para el coseno.
+    """
+    __slots__ = ('client', 'pedido', 'razon', 'sts', 'entrega', 'importe', 'prd', 'qty', 'norm')
+
+    def __init__(self, client, pedido, razon='', sts='', entrega=None, importe=None):
+        self.client = client
+        self.pedido = pedido
+        self.razon = razon
+        self.sts = sts
+        self.entrega = entrega
+        self.importe = importe
+        self.prd = array('i')
+        self.qty = array('d')
+        self.norm = 0.0
+
+    @property
+    def importe_r(self):
+        return round(self.importe or 0.0, REDONDEO_IMPORTE)
+
+    def abrir(self):
+        """{id C.Prd: Cant} para seguir sumando líneas (se vuelve a cerrar con cerrar)."""
+        return dict(zip(self.prd, self.qty))
+
+    def cerrar(self, acum):
+        # Norma sumada en el orden de acum. Armado por _Agregador es el orden de aparición de
+        # los C.Prd en el pedido: la misma suma secuencial que cosine_sim y detector_columnar.
+        # Al reabrir un pedido ya cerrado (fusionar, o un pedido sin fecha en detector_streaming)
+        # acum arranca en orden de id y la suma puede diferir en el último bit.
+        cant = acum.values()
+        self.norm = math.sqrt(sum(map(operator.mul, cant, cant)))
+        self.prd = array('i', sorted(acum))
+        self.qty = array('d', map(acum.__getitem__, self.prd))
+        return self
+
+    def fusionar(self, otro):
+        """Suma un parcial del mismo pedido leído más adelante (mismas reglas que las líneas)."""
+        if not self.razon and otro.razon:
+            self.razon = otro.razon
+        if not self.sts and otro.sts:
+            self.sts = otro.sts
+        if self.entrega is None and otro.entrega is not None:
+            self.entrega = otro.entrega
+        if otro.importe is not None:
+            if self.importe is None or otro.importe > self.importe:
+                self.importe = otro.importe
+        acum = self.abrir()
+        for p, q in zip(otro.prd, otro.qty):
+            acum[p] = acum.get(p, 0.0) + q
+        return self.cerrar(acum)
+
+    def traducir(self, ids):
+        """Pasa los ids de C.Prd de otro Catalogo a este (ids[viejo] = nuevo); la norma no cambia."""
+        if self.prd:
+            prd, qty = zip(*sorted(zip(map(ids.__getitem__, self.prd), self.qty)))
+            self.prd = array('i', prd)
+            self.qty = array('d', qty)
+        return self
+
+    def clave_exacto(self):
+        """Clave de exactos: (Client, Entrega, Importe_r, productos con Cant redondeada)."""
+        return (self.client, self.entrega, self.importe_r, self.prd.tobytes(),
+                tuple(round(q, REDONDEO_CANT) for q in self.qty))
+
+    def clave_huella(self):
+        """Como clave_exacto, con los C.Prd reducidos a un hash (válido en la corrida).
+
+        Las cantidades (redondearlas es lo caro) se comparan solo en los grupos candidatos.
+        """
+        return (self.client, self.entrega, self.importe_r, hash(self.prd.tobytes()))
+
+    def firma(self, catalogo):
+        """firma_productos: ((C.Prd, Cant redondeada), ...) ordenada por código."""
+        codigos = catalogo.codigos
+        return tuple(sorted((codigos[p], round(q, REDONDEO_CANT)) for p, q in zip(self.prd, self.qty)))
+
+
+def _cosine_cached(a, b):
+    """cosine_sim entre dos pedidos (merge de los arrays ordenados, norma ya calculada)."""
+    if not a.prd or not b.prd or a.norm == 0 or b.norm == 0:
+        return 0.0
+    p1, q1, p2, q2 = a.prd, a.qty, b.prd, b.qty
+    n1, n2 = len(p1), len(p2)
+    i = j = 0
+    dot = 0.0
+    while i < n1 and j < n2:
+        x, y = p1[i], p2[j]
+        if x == y:
+            dot += q1[i] * q2[j]
+            i += 1
+            j += 1
+        elif x < y:
+            i += 1
+        else:
+            j += 1
+    return dot / (a.norm * b.norm)
+
+
+def _pares_candidatos(lst):
+    """Pares (i, j), i < j, de lst (ordenada por Entrega, Pedido) que pueden pasar MIN_SIM_IMPORTE.
+
+    Indexa por día de entrega con los importes ordenados: en vez de recorrer toda la
+    ventana MAX_DIAS, cada pedido solo visita los de su banda de importe. Mismo orden
+    que el loop anidado (i creciente, j creciente).
+    """
+    if MIN_SIM_IMPORTE <= 0:
+        # Con umbral <= 0 cualquier par de la ventana puede pasar: recorrido completo
+        for i, a in enumerate(lst):
+            for j in range(i + 1, len(lst)):
+                if (lst[j].entrega - a.entrega).days > MAX_DIAS:
+                    break
+                yield i, j
+        return
+
+    # sim_importe(a, b) >= MIN solo si b está en [a * MIN, a / MIN] (margen por redondeo float).
+    # Dos importes negativos siempre dan sim >= 1; signos distintos o cero nunca pasan.
+    lo = MIN_SIM_IMPORTE * (1 - 1e-9)
+    pos_days = defaultdict(list)
+    neg_days = defaultdict(list)
+    for j, o in enumerate(lst):
+        imp = o.importe or 0.0
+        if imp > 0:
+            pos_days[o.entrega.toordinal()].append((imp, j))
+        elif imp < 0:
+            neg_days[o.entrega.toordinal()].append(j)
+    index = {}
+    for d, items in pos_days.items():
+        items.sort()
+        index[d] = ([imp for imp, _ in items], [j for _, j in items])
+
+    for i, a in enumerate(lst):
+        imp = a.importe or 0.0
+        d0 = a.entrega.toordinal()
+        js = []
+        if imp > 0:
+            low, high = imp * lo, imp / lo
+            for d in range(d0, d0 + MAX_DIAS + 1):
+                if d not in index:
+                    continue
+                imps, idx = index[d]
+                for k in range(bisect_left(imps, low), bisect_right(imps, high)):
+                    if idx[k] > i:
+                        js.append(idx[k])
+        elif imp < 0:
+            for d in range(d0, d0 + MAX_DIAS + 1):
+                js.extend(j for j in neg_days.get(d, ()) if j > i)
+        js.sort()
+        for j in js:
+            yield i, j
+
+
+def _similares_cliente(client, lst, solo=None, stats=None):
+    """Pares similares de un cliente (los pares nunca cruzan clientes).
+
+    solo: si se pasa un set de Pedido, solo se evalúan pares donde participa alguno.
+    """
+    similar_pairs = []
+    visitados = cosenos = 0
+    lst.sort(key=lambda x: (x.entrega, x.pedido))
+    for i, j in _pares_candidatos(lst):
+        visitados += 1
+        a = lst[i]
+        b = lst[j]
+        if solo is not None and a.pedido not in solo and b.pedido not in solo:
+            continue
+        s_imp = sim_importe(a.importe or 0.0, b.importe or 0.0)
+        if s_imp < (MIN_SIM_IMPORTE - 0.05):
+            continue
+        cosenos += 1
+        s_prd = _cosine_cached(a, b)
+        if s_imp >= MIN_SIM_IMPORTE and s_prd >= MIN_SIM_PRODUCTOS:
+            similar_pairs.append({
+                'Client': client,
+                'Razon social': a.razon or b.razon,
+                'Sts_1': a.sts,
+                'Sts_2': b.sts,
+                'Pedido_1': a.pedido,
+                'Pedido_2': b.pedido,
+                'Entrega_1': a.entrega,
+                'Entrega_2': b.entrega,
+                'Importe_1': a.importe,
+                'Importe_2': b.importe,
+                'sim_importe': round(s_imp, 4),
+                'sim_productos': round(s_prd, 4),
+                'prioridad': prioridad(a.sts, b.sts),
+            })
+    if stats is not None:
+        stats.add_client(client, len(lst), _pares_ventana(lst), visitados, cosenos, len(similar_pairs))
+    return similar_pairs
+
+
+def _pares_ventana(lst):
+    """Pares (i < j) con Entrega a <= MAX_DIAS: los que recorre el loop completo.
+
+    Se usa en los contadores de stats y para balancear los shards de _similares_paralelo.
+    """
+    por_dia = defaultdict(int)
+    for o in lst:
+        por_dia[o.entrega.toordinal()] += 1
+    return sum(n * (n - 1) // 2 + n * sum(por_dia.get(d + k, 0) for k in range(1, MAX_DIAS + 1))
+               for d, n in por_dia.items())
+
+
+def _init_worker(config):
+    # Los workers 'spawn' re-importan el módulo: se les pasa la config vigente
+    globals().update(config)
+
+
+def _similares_shard(shard, con_stats=False):
+    stats = DetectorStats() if con_stats else None
+    return [(pos, _similares_cliente(client, lst, stats=stats)) for pos, client, lst in shard], stats
+
+
+def _similares_paralelo(by_client, workers, stats=None):
+    """Reparte los clientes en shards balanceados por pares estimados (LPT) y une en orden."""
+    items = list(by_client.items())
+    cargas = sorted(((_pares_ventana(lst), pos) for pos, (_, lst) in enumerate(items)), reverse=True)
+    if sum(c for c, _ in cargas) < PARALELO_MIN_PARES:
+        similar_pairs = []
+        for k, (client, lst) in enumerate(items, 1):
+            similar_pairs.extend(_similares_cliente(client, lst, stats=stats))
+            _avance(stats, clientes=k, pares=len(similar_pairs))
+        return similar_pairs
+
+    # Más shards que workers: el avance se informa más seguido
+    n_shards = workers * SHARDS_POR_WORKER
+    heap = [(0, k) for k in range(n_shards)]
+    shards = [[] for _ in range(n_shards)]
+    for carga, pos in cargas:
+        total, k = heapq.heappop(heap)
+        client, lst = items[pos]
+        shards[k].append((pos, client, lst))
+        heapq.heappush(heap, (total + carga, k))
+
+    config = {'MAX_DIAS': MAX_DIAS, 'MIN_SIM_IMPORTE': MIN_SIM_IMPORTE, 'MIN_SIM_PRODUCTOS': MIN_SIM_PRODUCTOS}
+    por_cliente = [None] * len(items)
+    hechos = pares = 0
+    with _pool(workers, config) as ex:
+        pendientes = {ex.submit(_similares_shard, sh, stats is not None) for sh in shards if sh}
+        while pendientes:
+            # Se une a medida que terminan (el orden final lo da por_cliente)
+            listos, pendientes = wait(pendientes, timeout=_espera(stats), return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                resultados, shard_stats = futuro.result()
+                for pos, pairs in resultados:
+                    por_cliente[pos] = pairs
+                    pares += len(pairs)
+                if stats is not None:
+                    stats.merge(shard_stats)
+                hechos += len(resultados)
+            _avance(stats, clientes=hechos, pares=pares)
+    return [p for pairs in por_cliente for p in pairs]
+
+
+class _Agregador:
+    """Paso 1: acumula líneas en pedidos (Client, Pedido), fila por fila.
+
+    Los C.Prd se internan en catalogo. Client, Razon social, Sts y Entrega se comparten
+    entre pedidos (un objeto por valor distinto). Las líneas de producto de cada pedido
+    se guardan tal cual en dos arrays (C.Prd, Cant) y se suman recién en cerrar, una vez
+    por pedido y en orden de archivo: un reporte con pedidos intercalados no reabre ni
+    reordena nada, y la memoria por pedido sigue siendo la de los arrays.
+    """
+
+    def __init__(self, catalogo: Catalogo):
+        self.catalogo = catalogo
+        self.orders = {}        # (Client, Pedido) -> Pedido
+        self.nuevos = []        # pedidos en orden de aparición
+        self.lineas = {}        # Pedido -> (C.Prd, Cant) de sus líneas sin sumar
+        self.textos = {}
+        self.fechas = {}
+        self.abierto = self.l_prd = self.l_qty = None
+        self.leidas = self.sin_estado = self.sin_clave = 0
+
+    def fecha(self, raw):
+        fechas = self.fechas
+        if raw not in fechas:
+            fechas[raw] = parse_fecha_entrega(raw)
+        return fechas[raw]
+
+    def agregar(self, row):
+        """Suma una línea; devuelve su pedido (None si la línea se descarta)."""
+        self.leidas += 1
         sts = _strip(row.get(COL_STS)).upper()
         if sts and sts not in ESTADOS_VALIDOS:
-            continue
+            self.sin_estado += 1
+            return None
 
         client = _strip(row.get(COL_CLIENTE))
         pedido = _strip(row.get(COL_PEDIDO))
         if not client or not pedido:
-            continue
+            self.sin_clave += 1
+            return None
 
         key = (client, pedido)
-        entrega = parse_fecha_entrega(row.get(COL_ENTREGA))
+        entrega = self.fecha(row.get(COL_ENTREGA))
         imp = parse_float(row.get(COL_IMPORTE))
         prd = _strip(row.get(COL_CPRD))
         cant = parse_float(row.get(COL_CANT))
         razon = _strip(row.get(COL_RAZON))
+        textos = self.textos
 
-        if key not in orders:
-            orders[key] = {
-                'Client': client,
-                'Pedido': pedido,
-                'Razon social': razon,
-                'Sts': sts,
-                'Entrega': entrega,
-                'Importe': imp,
-                'prd_qty': defaultdict(float),
-            }
-
-        o = orders[key]
-        if not o.get('Razon social') and razon:
-            o['Razon social'] = razon
-        if not o.get('Sts') and sts:
-            o['Sts'] = sts
-        if o.get('Entrega') is None and entrega is not None:
-            o['Entrega'] = entrega
+        o = self.orders.get(key)
+        if o is None:
+            client = textos.setdefault(client, client)
+            o = self.orders[key] = Pedido(client, pedido, textos.setdefault(razon, razon),
+                                          textos.setdefault(sts, sts), entrega, imp)
+            self.nuevos.append(o)
+        if o is not self.abierto:
+            lineas = self.lineas.get(o)
+            if lineas is None:
+                lineas = self.lineas[o] = (array('i'), array('d'))
+            self.abierto = o
+            self.l_prd, self.l_qty = lineas
+
+        if not o.razon and razon:
+            o.razon = textos.setdefault(razon, razon)
+        if not o.sts and sts:
+            o.sts = textos.setdefault(sts, sts)
+        if o.entrega is None and entrega is not None:
+            o.entrega = entrega
         if imp is not None:
-            if o.get('Importe') is None or imp > o['Importe']:
-                o['Importe'] = imp
+            if o.importe is None or imp > o.importe:
+                o.importe = imp
         if prd:
-            o['prd_qty'][prd] += (cant or 0.0)
+            self.l_prd.append(self.catalogo.id(prd))
+            self.l_qty.append(cant or 0.0)
+        return o
 
-    orders_list = list(orders.values())
+    def cerrar(self):
+        """Paso 2 (firmas) de los pedidos con líneas sin sumar."""
+        lineas = self.lineas
+        while lineas:
+            o, (prd, qty) = lineas.popitem()
+            acum = None if o.prd else dict(zip(prd, qty))
+            if acum is None or len(acum) < len(prd):
+                # C.Prd repetidos (o pedido ya cerrado): suma línea por línea, en orden de archivo
+                acum = o.abrir()
+                for p, q in zip(prd, qty):
+                    acum[p] = acum.get(p, 0.0) + q
+            o.cerrar(acum)
+        self.abierto = self.l_prd = self.l_qty = None
 
-    # 2) Firmas
-    for o in orders_list:
-        o['Importe_r'] = round(o['Importe'] or 0.0, REDONDEO_IMPORTE)
-        o['prd_tuple'] = tuple(sorted((p, round(q, REDONDEO_CANT)) for p, q in o['prd_qty'].items() if p))
+    def volcar_stats(self, stats):
+        if stats is not None:
+            stats.rows_read += self.leidas
+            stats.rows_skipped_estado += self.sin_estado
+            stats.rows_skipped_sin_clave += self.sin_clave
+            stats.orders += len(self.nuevos)
 
-    # 3) Exactos (✅ SOLO RET)
-    orders_ret = [o for o in orders_list if str(o.get('Sts','')).upper() == 'RET']
 
-    exact_groups = defaultdict(list)
-    for o in orders_ret:
-        k = (o['Client'], o['Entrega'], o['Importe_r'], o['prd_tuple'])
-        exact_groups[k].append(o)
+def _armar_pedidos(rows_iter, catalogo: Catalogo, stats=None):
+    """Pasos 1 y 2: líneas -> pedidos (Client, Pedido) con sus firmas."""
+    ag = _Agregador(catalogo)
+    agregar = ag.agregar
+    for row in rows_iter:
+        agregar(row)
+    ag.cerrar()
+    ag.volcar_stats(stats)
+    return ag.nuevos
 
-    exact_rows = []
-    for k, items in exact_groups.items():
+
+# ---------------- Lectura en paralelo ----------------
+
+class _Rango:
+    """Vista de solo lectura de mm[inicio:fin] con read(n), para _iter_lines."""
+
+    def __init__(self, mm, inicio, fin):
+        self.mm = mm
+        self.pos = inicio
+        self.fin = fin
+
+    def read(self, n):
+        chunk = self.mm[self.pos:min(self.pos + n, self.fin)]
+        self.pos += len(chunk)
+        return chunk
+
+
+def _cortes(mm, inicio, fin, n, delim, campos):
+    """Hasta n rangos [a, b) de líneas completas, cortando donde cambia (Client, Pedido).
+
+    Así un pedido con sus líneas seguidas queda entero en un solo rango.
+    """
+    cols = [campos.index(c) for c in (COL_CLIENTE, COL_PEDIDO) if c in campos]
+
+    def clave(a, b):
+        row = next(csv.reader([mm[a:b].decode('latin1')], delimiter=delim), [])
+        return tuple(_strip(row[c]) if c < len(row) else '' for c in cols)
+
+    def fin_linea(a):
+        nl = mm.find(b'\n', a, fin)
+        return fin if nl < 0 else nl + 1
+
+    bordes = [inicio]
+    for k in range(1, n):
+        pos = fin_linea(inicio + (fin - inicio) * k // n)
+        if pos <= bordes[-1] or pos >= fin:
+            continue
+        previa = clave(mm.rfind(b'\n', 0, pos - 1) + 1, pos)
+        while pos < fin:
+            sig = fin_linea(pos)
+            if clave(pos, sig) != previa:
+                break
+            pos = sig
+        if bordes[-1] < pos < fin:
+            bordes.append(pos)
+    bordes.append(fin)
+    return list(zip(bordes, bordes[1:]))
+
+
+def _armar_rango(path, inicio, fin, cabecera, delim):
+    """Worker: pasos 1 y 2 sobre un rango de bytes, con su propio Catalogo.
+
+    Devuelve los pedidos por columnas (listas y arrays): se serializan mucho más
+    rápido que los objetos Pedido.
+    """
+    ag = _Agregador(Catalogo())
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for row in _parse_rows(chain([cabecera], _iter_lines(_Rango(mm, inicio, fin))), delim):
+            ag.agregar(row)
+    ag.cerrar()
+    pedidos = ag.nuevos
+    indptr = array('q', [0])
+    prd = array('i')
+    qty = array('d')
+    for o in pedidos:
+        prd.extend(o.prd)
+        qty.extend(o.qty)
+        indptr.append(len(prd))
+    columnas = (
+        [o.client for o in pedidos], [o.pedido for o in pedidos], [o.razon for o in pedidos],
+        [o.sts for o in pedidos], [o.entrega.toordinal() if o.entrega is not None else 0 for o in pedidos],
+        [o.importe for o in pedidos], array('d', [o.norm for o in pedidos]), indptr, prd, qty,
+    )
+    return columnas, ag.catalogo.codigos, (ag.leidas, ag.sin_estado, ag.sin_clave)
+
+
+def _espera(stats):
+    """Timeout al esperar workers: sin progreso no hace falta despertarse a chequear cancelar."""
+    return AVANCE_SEGUNDOS if stats is not None and stats.progreso is not None else None
+
+
+@contextmanager
+def _pool(workers, config):
+    """ProcessPoolExecutor con _init_worker; si el bloque corta (p. ej. DetectorCancelado) no
+    espera a los workers: se descartan las tareas pendientes y las que corren terminan solas."""
+    ex = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,))
+    try:
+        yield ex
+    except BaseException:
+        ex.shutdown(wait=False, cancel_futures=True)
+        raise
+    ex.shutdown()
+
+
+def _rangos_con_avance(futuros, ag, stats):
+    """Resultados de los rangos en orden; mientras espera informa líneas leídas (y corta si se cancela)."""
+    _avance(stats, etapa='parse')
+    for futuro in futuros:
+        while True:
+            try:
+                parcial = futuro.result(timeout=_espera(stats))
+                break
+            except FuturoDemorado:
+                _avance(stats, lineas=ag.leidas)
+        yield parcial
+        _avance(stats, lineas=ag.leidas)
+
+
+def _armar_pedidos_paralelo(path: Path, workers: int, catalogo: Catalogo, stats=None):
+    """Como _armar_pedidos(iter_rows_from_path(path)), leyendo rangos de bytes en N procesos.
+
+    Cada worker arma pedidos parciales de su rango; se unen en orden de archivo con
+    Pedido.fusionar (Importe máximo, primer Razon social/Sts/Entrega no vacío, Cant sumadas).
+    Supone, como el resto del lector, que ningún campo tiene saltos de línea entre comillas.
+    """
+    t0 = time.perf_counter()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        lineas = _iter_lines(_Rango(mm, 0, len(mm)))
+        cabecera, inicio = _buscar_cabecera(lineas)  # latin1: un byte por carácter
+        delim, _ = _elegir_separador(cabecera, lineas)
+        campos = [c.strip() for c in next(csv.reader([cabecera], delimiter=delim))]
+        rangos = _cortes(mm, inicio, len(mm), workers * 4, delim, campos)
+
+    ag = _Agregador(catalogo)
+    fechas = {}
+    t_union = 0.0
+    n = len(rangos)
+    config = {'ESTADOS_VALIDOS': set(ESTADOS_VALIDOS)}
+    with _pool(workers, config) as ex:
+        futuros = [ex.submit(_armar_rango, str(path), a, b, cabecera, delim) for a, b in rangos]
+        for columnas, codigos, (leidas, sin_estado, sin_clave) in _rangos_con_avance(futuros, ag, stats):
+            t1 = time.perf_counter()
+            ids = [catalogo.id(c) for c in codigos]
+            identidad = ids == list(range(len(ids)))
+            textos = ag.textos
+            clients, pedidos, razones, estados, entregas, importes, normas, indptr, prd, qty = columnas
+            for k, (client, pedido) in enumerate(zip(clients, pedidos)):
+                d = entregas[k]
+                if d and d not in fechas:
+                    fechas[d] = date.fromordinal(d)
+                p = Pedido(textos.setdefault(client, client), pedido, textos.setdefault(razones[k], razones[k]),
+                           textos.setdefault(estados[k], estados[k]), fechas[d] if d else None, importes[k])
+                p.prd = prd[indptr[k]:indptr[k + 1]]
+                p.qty = qty[indptr[k]:indptr[k + 1]]
+                p.norm = normas[k]
+                if not identidad:
+                    p.traducir(ids)
+                key = (p.client, pedido)
+                o = ag.orders.get(key)
+                if o is not None:
+                    o.fusionar(p)
+                else:
+                    ag.orders[key] = p
+                    ag.nuevos.append(p)
+            ag.leidas += leidas
+            ag.sin_estado += sin_estado
+            ag.sin_clave += sin_clave
+            t_union += time.perf_counter() - t1
+
+    ag.volcar_stats(stats)
+    if stats is not None:
+        stats.seconds['parse'] = stats.seconds.get('parse', 0.0) + time.perf_counter() - t0 - t_union
+        stats.seconds['aggregate'] = stats.seconds.get('aggregate', 0.0) + t_union
+    return ag.nuevos
+
+
+def _fila_exacto(o: Pedido, catalogo: Catalogo):
+    firma = o.firma(catalogo)
+    return {
+        'Client': o.client,
+        'Razon social': o.razon,
+        'Sts': o.sts,
+        'Pedido': o.pedido,
+        'Entrega': o.entrega,
+        'Importe': o.importe,
+        'prioridad': 'MEDIA',
+        'n_productos': len(firma),
+        'huella_productos': huella_productos(firma),
+        'firma_productos': firma,
+    }
+
+
+def _exactos(orders_list, catalogo: Catalogo):
+    """Paso 3: exactos (✅ SOLO RET) agrupados por (Client, Entrega, Importe_r, huella de productos).
+
+    La firma completa (con Cant redondeada) solo se compara dentro de los grupos candidatos.
+    """
+    candidatos = defaultdict(list)
+    for pos, o in enumerate(orders_list):
+        if o.sts == 'RET':
+            candidatos[o.clave_huella()].append(pos)
+
+    exact_groups = {}
+    for items in candidatos.values():
         if len(items) > 1:
-            for o in items:
-                exact_rows.append({
-                    'Client': o['Client'],
-                    'Razon social': o.get('Razon social', ''),
-                    'Sts': o.get('Sts', ''),
-                    'Pedido': o['Pedido'],
-                    'Entrega': o.get('Entrega'),
-                    'Importe': o.get('Importe'),
-                    'prioridad': 'MEDIA',
-                    'n_productos': len(o['prd_tuple']),
-                    'firma_productos': o['prd_tuple'],
-                })
-
-    if exact_rows:
-        write_csv(out_exact, exact_rows, list(exact_rows[0].keys()))
-    else:
-        write_csv(out_exact, [], ['Client','Razon social','Sts','Pedido','Entrega','Importe','prioridad','n_productos','firma_productos'])
+            for pos in items:
+                exact_groups.setdefault(orders_list[pos].clave_exacto(), []).append(pos)
+
+    exact_rows = []
+    for items in sorted((g for g in exact_groups.values() if len(g) > 1), key=lambda g: g[0]):
+        for pos in items:
+            exact_rows.append(_fila_exacto(orders_list[pos], catalogo))
+    return exact_rows
+
 
-    # 4) Similares (RET/PRC)
+def _similares(orders_list, workers: int | None = None, stats=None):
+    """Paso 4: similares (RET/PRC) dentro de cada Client y la ventana MAX_DIAS."""
     by_client = defaultdict(list)
     for o in orders_list:
-        if o.get('Entrega') is not None:
-            by_client[o['Client']].append(o)
+        if o.entrega is not None:
+            by_client[o.client].append(o)
 
+    _avance(stats, clientes=0, clientes_total=len(by_client), pares=0)
+    if workers and workers > 1:
+        return _similares_paralelo(by_client, workers, stats)
     similar_pairs = []
-    for client, lst in by_client.items():
-        lst.sort(key=lambda x: (x['Entrega'], x['Pedido']))
-        for i in range(len(lst)):
-            a = lst[i]
-            for j in range(i + 1, len(lst)):
-                b = lst[j]
-                if (b['Entrega'] - a['Entrega']).days > MAX_DIAS:
-                    break
-                s_imp = sim_importe(a.get('Importe') or 0.0, b.get('Importe') or 0.0)
-                if s_imp < (MIN_SIM_IMPORTE - 0.05):
-                    continue
-                s_prd = cosine_sim(a.get('prd_qty'), b.get('prd_qty'))
-                if s_imp >= MIN_SIM_IMPORTE and s_prd >= MIN_SIM_PRODUCTOS:
-                    similar_pairs.append({
-                        'Client': client,
-                        'Razon social': a.get('Razon social') or b.get('Razon social'),
-                        'Sts_1': a.get('Sts', ''),
-                        'Sts_2': b.get('Sts', ''),
-                        'Pedido_1': a['Pedido'],
-                        'Pedido_2': b['Pedido'],
-                        'Entrega_1': a.get('Entrega'),
-                        'Entrega_2': b.get('Entrega'),
-                        'Importe_1': a.get('Importe'),
-                        'Importe_2': b.get('Importe'),
-                        'sim_importe': round(s_imp, 4),
-                        'sim_productos': round(s_prd, 4),
-                        'prioridad': prioridad(a.get('Sts'), b.get('Sts')),
-                    })
-
-    if similar_pairs:
-        write_csv(out_sim, similar_pairs, list(similar_pairs[0].keys()))
-    else:
-        write_csv(out_sim, [], ['Client','Razon social','Sts_1','Sts_2','Pedido_1','Pedido_2','Entrega_1','Entrega_2','Importe_1','Importe_2','sim_importe','sim_productos','prioridad'])
+    for k, (client, lst) in enumerate(by_client.items(), 1):
+        similar_pairs.extend(_similares_cliente(client, lst, stats=stats))
+        _avance(stats, clientes=k, pares=len(similar_pairs))
+    return similar_pairs
+
+
+def _detect_rows(rows_iter, workers: int | None = None, stats=None):
+    """Pasos 1-4 en memoria: devuelve (exact_rows, similar_pairs) como listas de dicts."""
+    if stats is not None:
+        rows_iter = _timed_rows(rows_iter, stats)
+    catalogo = Catalogo()
+    with _etapa(stats, 'aggregate'):
+        orders_list = _armar_pedidos(rows_iter, catalogo, stats)
+    if stats is not None:
+        # 'aggregate' incluyó el parseo (streaming): se descuenta
+        stats.seconds['aggregate'] -= stats.seconds.get('parse', 0.0)
+    return _detect_pedidos(orders_list, catalogo, workers, stats)
+
 
+def _detect_pedidos(orders_list, catalogo: Catalogo, workers: int | None = None, stats=None):
+    """Pasos 3 y 4 sobre pedidos ya armados."""
+    with _etapa(stats, 'exact'):
+        exact_rows = _exactos(orders_list, catalogo)
+    with _etapa(stats, 'similar'):
+        similar_pairs = _similares(orders_list, workers, stats)
+    return exact_rows, similar_pairs
+
+
+def _campos_exactos(firma_completa: bool):
+    return CAMPOS_EXACTOS_FIRMA if firma_completa else CAMPOS_EXACTOS
+
+
+def _write_results(exact_rows, similar_pairs, out_exact: Path, out_sim: Path, stats=None, firma_completa=False):
+    with _etapa(stats, 'write'):
+        write_csv(out_exact, exact_rows, _campos_exactos(firma_completa))
+        write_csv(out_sim, similar_pairs, CAMPOS_SIMILARES)
     return out_exact, out_sim
 
 
-def run_detector(in_path: str | Path):
+def _detect(rows_iter, out_exact: Path, out_sim: Path, workers: int | None = None, stats=None,
+            firma_completa=False):
+    return _write_results(*_detect_rows(rows_iter, workers, stats), out_exact, out_sim, stats, firma_completa)
+
+
+def _lectura_paralela(path, workers):
+    return path is not None and bool(workers) and workers > 1 and Path(path).stat().st_size >= PARALELO_MIN_BYTES
+
+
+def _detect_lines_rows(lines, engine: str = 'python', workers: int | None = None, stats=None, path=None):
+    """path: archivo de origen de lines; con workers, el motor python lo lee en paralelo."""
+    if engine not in ENGINES:
+        raise ValueError(f"Motor desconocido: {engine!r} (opciones: {', '.join(ENGINES)})")
+    if stats is not None:
+        stats.engine = engine
+    lines = _lineas_con_avance(lines, stats)
+    if engine == 'pandas':
+        from detector_columnar import detect_columnar_rows
+        exact_rows, similar_pairs = detect_columnar_rows(lines, stats)
+    elif _lectura_paralela(path, workers):
+        catalogo = Catalogo()
+        orders_list = _armar_pedidos_paralelo(Path(path), workers, catalogo, stats)
+        exact_rows, similar_pairs = _detect_pedidos(orders_list, catalogo, workers, stats)
+    else:
+        exact_rows, similar_pairs = _detect_rows(_rows_from_lines(lines), workers, stats)
+    if stats is not None:
+        stats.exact_rows = len(exact_rows)
+    return exact_rows, similar_pairs
+
+
+def _detect_lines(lines, out_exact: Path, out_sim: Path, engine: str = 'python', workers: int | None = None,
+                  stats=None, path=None, firma_completa=False):
+    return _write_results(*_detect_lines_rows(lines, engine, workers, stats, path), out_exact, out_sim, stats,
+                          firma_completa)
+
+
+def run_detector(in_path: str | Path, engine: str = 'python', workers: int | None = None,
+                 stats: DetectorStats | None = None, firma_completa: bool = False, out_dir: str | Path | None = None):
+    """Escribe duplicados_exactos.csv y duplicados_similares.csv en out_dir (default: junto a in_path).
+
+    in_path puede ser un Parquet / Arrow de líneas (SUFIJOS_ARROW): va por detector_parquet.
+    """
     in_path = Path(in_path)
-    out_exact = in_path.with_name('duplicados_exactos.csv')
-    out_sim = in_path.with_name('duplicados_similares.csv')
-    return _detect(iter_rows_from_path(in_path), out_exact, out_sim)
+    if in_path.suffix.lower() in SUFIJOS_ARROW:
+        from detector_parquet import run_detector_parquet
+        return run_detector_parquet(in_path, out_dir, 'csv', stats=stats, firma_completa=firma_completa)
+    out_dir = in_path.parent if out_dir is None else Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_exact = out_dir / 'duplicados_exactos.csv'
+    out_sim = out_dir / 'duplicados_similares.csv'
+    return _detect_lines(_iter_lines_from_path(in_path), out_exact, out_sim, engine, workers, stats, in_path,
+                         firma_completa=firma_completa)
 
 
-def detect_from_filelike(fileobj, out_dir: str | Path):
+def detect_from_filelike(fileobj, out_dir: str | Path, engine: str = 'python', workers: int | None = None,
+                         stats: DetectorStats | None = None, firma_completa: bool = False):
     out_dir = Path(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
     out_exact = out_dir / 'duplicados_exactos.csv'
     out_sim = out_dir / 'duplicados_similares.csv'
-    return _detect(iter_rows_from_filelike(fileobj), out_exact, out_sim)
+    return _detect_lines(_iter_lines(fileobj), out_exact, out_sim, engine, workers, stats,
+                         firma_completa=firma_completa)
+
+
+# ---------------- Resultados en memoria ----------------
+
+def _rows_to_frame(rows, fieldnames):
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=fieldnames)
+    for c in fieldnames:
+        if c.startswith('Entrega'):
+            df[c] = pd.to_datetime(df[c])
+        elif c.startswith('Importe') or c.startswith('sim_'):
+            df[c] = df[c].astype('float64')
+    if 'n_productos' in df.columns:
+        df['n_productos'] = df['n_productos'].astype('int64')
+    if 'firma_productos' in df.columns:
+        df['firma_productos'] = df['firma_productos'].map(str)
+    return df
+
+
+def _frames(exact_rows, similar_pairs, stats=None, firma_completa=False):
+    with _etapa(stats, 'frames'):
+        return (_rows_to_frame(exact_rows, _campos_exactos(firma_completa)),
+                _rows_to_frame(similar_pairs, CAMPOS_SIMILARES))
+
+
+def detect_frames_from_filelike(fileobj, engine: str = 'python', workers: int | None = None,
+                                stats: DetectorStats | None = None, firma_completa: bool = False):
+    """Como detect_from_filelike, pero sin archivos: devuelve (df_exact, df_sim).
+
+    Fechas como datetime64, importes/similitudes como float64 y firma_productos (si
+    firma_completa) como texto, igual que en el CSV. Para descargar, frame_to_csv(df).
+    """
+    return _frames(*_detect_lines_rows(_iter_lines(fileobj), engine, workers, stats), stats, firma_completa)
+
+
+def run_detector_frames(in_path: str | Path, engine: str = 'python', workers: int | None = None,
+                        stats: DetectorStats | None = None, firma_completa: bool = False):
+    in_path = Path(in_path)
+    if in_path.suffix.lower() in SUFIJOS_ARROW:
+        from detector_parquet import detect_frames_from_parquet
+        return detect_frames_from_parquet(in_path, stats, firma_completa)
+    return _frames(*_detect_lines_rows(_iter_lines_from_path(in_path), engine, workers, stats, in_path), stats,
+                   firma_completa)
+
+
+def _cotas(max_dias, min_sim_importe, min_sim_productos):
+    return {'max_dias': max_dias, 'min_sim_importe': min_sim_importe, 'min_sim_productos': min_sim_productos}
+
+
+def _scored_frames(lines, cotas, stats=None, firma_completa=False):
+    from detector_columnar import detect_columnar_scored
+
+    if stats is not None:
+        stats.engine = 'pandas'
+    exact_rows, pares = detect_columnar_scored(_lineas_con_avance(lines, stats), stats=stats, **cotas)
+    if stats is not None:
+        stats.exact_rows = len(exact_rows)
+    pares.attrs['cotas'] = cotas
+    with _etapa(stats, 'frames'):
+        return _rows_to_frame(exact_rows, _campos_exactos(firma_completa)), pares
+
+
+def detect_scored_frames_from_filelike(fileobj, max_dias: int = PUNTAJE_MAX_DIAS,
+                                       min_sim_importe: float = PUNTAJE_MIN_SIM_IMPORTE,
+                                       min_sim_productos: float = PUNTAJE_MIN_SIM_PRODUCTOS,
+                                       stats: DetectorStats | None = None, firma_completa: bool = False):
+    """Como detect_frames_from_filelike, pero los similares salen puntuados con cotas sueltas.
+
+    Devuelve (df_exact, df_pares): df_pares tiene CAMPOS_PUNTUADOS con todos los pares
+    que pasan las cotas dadas (motor columnar). filtrar_pares lo recorta a los umbrales
+    que se quieran probar, sin volver a leer ni puntuar.
+    """
+    return _scored_frames(_iter_lines(fileobj), _cotas(max_dias, min_sim_importe, min_sim_productos), stats,
+                          firma_completa)
+
+
+def run_detector_scored_frames(in_path: str | Path, max_dias: int = PUNTAJE_MAX_DIAS,
+                               min_sim_importe: float = PUNTAJE_MIN_SIM_IMPORTE,
+                               min_sim_productos: float = PUNTAJE_MIN_SIM_PRODUCTOS,
+                               stats: DetectorStats | None = None, firma_completa: bool = False):
+    return _scored_frames(_iter_lines_from_path(Path(in_path)), _cotas(max_dias, min_sim_importe, min_sim_productos),
+                          stats, firma_completa)
+
+
+def filtrar_pares(pares, max_dias: int | None = None, min_sim_importe: float | None = None,
+                  min_sim_productos: float | None = None):
+    """df_sim (CAMPOS_SIMILARES, similitudes redondeadas) de los pares puntuados que pasan los umbrales.
+
+    Sin argumentos usa MAX_DIAS / MIN_SIM_IMPORTE / MIN_SIM_PRODUCTOS: mismas filas que
+    detect_frames_from_filelike. Un umbral más suelto que las cotas del puntaje es ValueError.
+    """
+    umbrales = _cotas(MAX_DIAS if max_dias is None else max_dias,
+                      MIN_SIM_IMPORTE if min_sim_importe is None else min_sim_importe,
+                      MIN_SIM_PRODUCTOS if min_sim_productos is None else min_sim_productos)
+    cotas = pares.attrs.get('cotas')
+    if cotas is not None:
+        if (umbrales['max_dias'] > cotas['max_dias'] or umbrales['min_sim_importe'] < cotas['min_sim_importe']
+                or umbrales['min_sim_productos'] < cotas['min_sim_productos']):
+            raise ValueError(f'Umbrales {umbrales} fuera de las cotas del puntaje {cotas} (volver a puntuar)')
+    ok = ((pares['dias'].to_numpy() <= umbrales['max_dias'])
+          & (pares['sim_importe'].to_numpy() >= umbrales['min_sim_importe'])
+          & (pares['sim_productos'].to_numpy() >= umbrales['min_sim_productos']))
+    df = pares.loc[ok, CAMPOS_SIMILARES].reset_index(drop=True)
+    for c in ('sim_importe', 'sim_productos'):
+        # round() de Python, como el motor (np.round difiere en algunos valores)
+        df[c] = [round(v, 4) for v in df[c].tolist()]
+        df[c] = df[c].astype('float64')
+    return df
+
+
+def frame_to_csv(df) -> bytes:
+    """CSV de un resultado en memoria, con el mismo formato que write_csv."""
+    return df.to_csv(index=False, lineterminator='\r\n').encode('utf-8')
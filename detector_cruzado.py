@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Similares ENTRE clientes: el mismo pedido cargado con dos códigos de Client.
+
+detector_core solo compara pedidos del mismo Client. Acá se buscan pares de clientes
+distintos (sucursales de una misma empresa, un código mal tipeado) sin comparar todos
+contra todos:
+
+1) MinHash de los productos (C.Prd) de cada pedido: LSH_BANDAS bandas de LSH_FILAS
+   hashes. Dos pedidos son candidatos si coinciden en alguna banda entera dentro de la
+   misma ventana de Entrega: los buckets son por (ventana, banda), con ventanas de
+   MAX_DIAS + 1 días; cada pedido entra en la suya y en la siguiente, así dos pedidos a
+   <= MAX_DIAS siempre comparten alguna. Un bucket junta a lo sumo dos ventanas: los
+   pedidos de un solo producto común no arman buckets de años enteros.
+2) Dentro de cada bucket, solo pares con Entrega a <= MAX_DIAS y en la banda de
+   importe (el mismo índice que los similares por cliente).
+3) Verificación con los umbrales de siempre: sim_importe >= MIN_SIM_IMPORTE y coseno
+   de productos >= MIN_SIM_PRODUCTOS.
+
+Recall vs velocidad: un par con Jaccard J de productos es candidato con probabilidad
+1 - (1 - J**filas)**bandas. Más bandas o menos filas: más recall y más candidatos.
+exhaustivo=True compara todos los pares de la ventana (referencia, cuadrático).
+
+Salida: duplicados_entre_clientes.csv (CAMPOS_CRUZADOS), aparte de los otros dos.
+
+Expone:
+- run_cruzado(in_path, bandas=LSH_BANDAS, filas=LSH_FILAS) -> path
+- cruzado_from_filelike(fileobj, out_dir, ...) -> path
+- similares_entre_clientes(orders_list, ...) -> filas (pedidos de detector_core._armar_pedidos)
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+import detector_core as core
+
+LSH_BANDAS = 16
+LSH_FILAS = 2
+LSH_SEMILLA = 0
+BLOQUE_ENTRADAS = 1 << 16  # productos por bloque al calcular las firmas
+
+CAMPOS_CRUZADOS = ['Client_1', 'Client_2', 'Razon social_1', 'Razon social_2', 'Sts_1', 'Sts_2',
+                   'Pedido_1', 'Pedido_2', 'Entrega_1', 'Entrega_2', 'Importe_1', 'Importe_2',
+                   'sim_importe', 'sim_productos', 'prioridad']
+
+_MEZCLA = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _firmas(orders, n_hash):
+    """MinHash (n_hash valores por pedido) del conjunto de ids de C.Prd."""
+    rng = np.random.default_rng(LSH_SEMILLA)
+    a = rng.integers(1, 2**63, n_hash, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2**63, n_hash, dtype=np.uint64)
+    lens = np.fromiter((len(o.prd) for o in orders), dtype=np.int64, count=len(orders))
+    prd = np.frombuffer(b''.join(o.prd.tobytes() for o in orders), dtype=np.int32).astype(np.uint64)
+    indptr = np.concatenate(([0], np.cumsum(lens)))
+    sig = np.empty((len(orders), n_hash), dtype=np.uint64)
+    start = 0
+    while start < len(orders):
+        stop = max(int(np.searchsorted(indptr, indptr[start] + BLOQUE_ENTRADAS, side='right')) - 1, start + 1)
+        e0, e1 = indptr[start], indptr[stop]
+        # Hash multiply-shift: (a*x + b) mod 2**64, 32 bits altos
+        h = (prd[e0:e1, None] * a[None, :] + b[None, :]) >> np.uint64(32)
+        sig[start:stop] = np.minimum.reduceat(h, indptr[start:stop] - e0, axis=0)
+        start = stop
+    return sig
+
+
+def _buckets(sig, dias, bandas, filas):
+    """Grupos (índices de pedidos) que coinciden en alguna banda en la misma ventana de Entrega.
+
+    dias: Entrega de cada pedido (ordinal). Sin repetir grupos.
+    """
+    ventana = (dias // (core.MAX_DIAS + 1)).astype(np.uint64)
+    # Cada pedido va a su ventana y a la siguiente (ver arriba)
+    idx = np.concatenate((np.arange(len(sig)), np.arange(len(sig))))
+    ventanas = np.concatenate((ventana, ventana + np.uint64(1)))
+    vistos = set()
+    for k in range(bandas):
+        banda = np.zeros(len(sig), dtype=np.uint64)
+        for c in range(k * filas, (k + 1) * filas):
+            banda = banda * _MEZCLA + sig[:, c]
+        clave = np.concatenate((banda, banda)) * _MEZCLA + ventanas
+        orden = np.argsort(clave, kind='stable')
+        cs = clave[orden]
+        orden = idx[orden]
+        cortes = np.flatnonzero(cs[1:] != cs[:-1]) + 1
+        inicios = np.concatenate(([0], cortes))
+        fines = np.concatenate((cortes, [len(cs)]))
+        for i0, i1 in zip(inicios[fines - inicios > 1].tolist(), fines[fines - inicios > 1].tolist()):
+            grupo = tuple(sorted(orden[i0:i1].tolist()))
+            if grupo not in vistos:
+                vistos.add(grupo)
+                yield grupo
+
+
+def _pares(orders, grupo):
+    """Pares de clientes distintos del grupo, en ventana MAX_DIAS y banda de importe."""
+    lst = sorted(grupo, key=lambda i: (orders[i].entrega, orders[i].pedido, orders[i].client))
+    pedidos = [orders[i] for i in lst]
+    if len({o.client for o in pedidos}) < 2:
+        return
+    for i, j in core._pares_candidatos(pedidos):
+        if pedidos[i].client != pedidos[j].client:
+            yield lst[i], lst[j]
+
+
+def _fila(a, b, s_imp, s_prd):
+    return {
+        'Client_1': a.client,
+        'Client_2': b.client,
+        'Razon social_1': a.razon,
+        'Razon social_2': b.razon,
+        'Sts_1': a.sts,
+        'Sts_2': b.sts,
+        'Pedido_1': a.pedido,
+        'Pedido_2': b.pedido,
+        'Entrega_1': a.entrega,
+        'Entrega_2': b.entrega,
+        'Importe_1': a.importe,
+        'Importe_2': b.importe,
+        'sim_importe': round(s_imp, 4),
+        'sim_productos': round(s_prd, 4),
+        'prioridad': core.prioridad(a.sts, b.sts),
+    }
+
+
+def similares_entre_clientes(orders_list, bandas: int = LSH_BANDAS, filas: int = LSH_FILAS,
+                             exhaustivo: bool = False, stats: dict | None = None):
+    """Pares similares con Client distinto, ordenados por (Entrega_1, Client_1, Pedido_1, ...).
+
+    stats: si se pasa un dict, se llena con buckets, candidatos y pares emitidos.
+    """
+    orders = [o for o in orders_list if o.entrega is not None and len(o.prd)]
+    if exhaustivo:
+        grupos = [tuple(range(len(orders)))]
+    else:
+        dias = np.fromiter((o.entrega.toordinal() for o in orders), dtype=np.int64, count=len(orders))
+        grupos = _buckets(_firmas(orders, bandas * filas), dias, bandas, filas) if orders else []
+
+    candidatos = set()
+    n_buckets = 0
+    for grupo in grupos:
+        n_buckets += 1
+        candidatos.update(_pares(orders, grupo))
+
+    rows = []
+    for i, j in candidatos:
+        a, b = orders[i], orders[j]
+        s_imp = core.sim_importe(a.importe or 0.0, b.importe or 0.0)
+        if s_imp < core.MIN_SIM_IMPORTE:
+            continue
+        s_prd = core._cosine_cached(a, b)
+        if s_prd >= core.MIN_SIM_PRODUCTOS:
+            rows.append(_fila(a, b, s_imp, s_prd))
+    rows.sort(key=lambda r: (r['Entrega_1'], r['Client_1'], r['Pedido_1'], r['Client_2'], r['Pedido_2']))
+    if stats is not None:
+        stats.update(pedidos=len(orders), buckets=n_buckets, candidatos=len(candidatos), pares=len(rows))
+    return rows
+
+
+def _detect_cruzado(rows_iter, out_path: Path, bandas, filas, exhaustivo):
+    orders = core._armar_pedidos(rows_iter, core.Catalogo())
+    core.write_csv(out_path, similares_entre_clientes(orders, bandas, filas, exhaustivo), CAMPOS_CRUZADOS)
+    return out_path
+
+
+def run_cruzado(in_path: str | Path, bandas: int = LSH_BANDAS, filas: int = LSH_FILAS, exhaustivo: bool = False):
+    in_path = Path(in_path)
+    out_path = in_path.with_name('duplicados_entre_clientes.csv')
+    return _detect_cruzado(core.iter_rows_from_path(in_path), out_path, bandas, filas, exhaustivo)
+
+
+def cruzado_from_filelike(fileobj, out_dir: str | Path, bandas: int = LSH_BANDAS, filas: int = LSH_FILAS,
+                          exhaustivo: bool = False):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_path = out_dir / 'duplicados_entre_clientes.csv'
+    return _detect_cruzado(core.iter_rows_from_filelike(fileobj), out_path, bandas, filas, exhaustivo)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Modo incremental: store SQLite de pedidos agregados entre corridas.
+
+Cada reporte se agrega a pedidos igual que en detector_core y se hace upsert en el
+store. Solo los pedidos NUEVOS o CAMBIADOS se comparan, contra los pedidos guardados
+del mismo cliente dentro de la ventana MAX_DIAS (incluye los de reportes anteriores,
+así se ven duplicados que cruzan dos reportes). Al final se desalojan los pedidos
+que ya quedaron fuera de la ventana, medida desde la primera Entrega del reporte (una
+fecha suelta muy adelantada en el store no borra todo lo demás). Los pedidos sin fecha
+no entran en ninguna ventana, pero sí en los exactos: se desalojan cuando el último reporte
+que los trajo (su primera Entrega) queda igual de atrás.
+
+Los CSV tienen el mismo formato que run_detector, pero solo con los grupos/pares
+donde participa algún pedido nuevo o cambiado.
+
+Expone:
+- run_incremental(in_path, db_path) -> (path_exact, path_sim)
+- detect_incremental_from_filelike(fileobj, db_path, out_dir) -> (path_exact, path_sim)
+"""
+
+import json
+import sqlite3
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+
+import detector_core as core
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pedidos (
+    client TEXT NOT NULL,
+    pedido TEXT NOT NULL,
+    razon TEXT NOT NULL,
+    sts TEXT NOT NULL,
+    entrega INTEGER,            -- date.toordinal(); NULL = sin fecha
+    importe REAL,
+    importe_r REAL NOT NULL,
+    firma TEXT NOT NULL,        -- repr(firma_productos), para exactos
+    productos TEXT NOT NULL,    -- JSON [[C.Prd, Cant], ...] ordenado por C.Prd
+    visto INTEGER,              -- primera Entrega (ordinal) del último reporte que lo trajo
+    PRIMARY KEY (client, pedido)
+);
+CREATE INDEX IF NOT EXISTS ix_pedidos_ventana ON pedidos (client, entrega);
+CREATE INDEX IF NOT EXISTS ix_pedidos_firma ON pedidos (client, entrega, importe_r, firma);
+"""
+
+_COLS = 'client, pedido, razon, sts, entrega, importe, importe_r, firma, productos'
+
+
+def _productos_json(pares):
+    # Ordenado por C.Prd: no depende de los ids del Catalogo ni del orden de las líneas
+    return json.dumps(sorted(pares))
+
+
+def _to_row(o: core.Pedido, catalogo: core.Catalogo):
+    codigos = catalogo.codigos
+    return (
+        o.client, o.pedido, o.razon or '', o.sts or '',
+        o.entrega.toordinal() if o.entrega is not None else None,
+        o.importe, o.importe_r, repr(o.firma(catalogo)),
+        _productos_json([[codigos[p], q] for p, q in zip(o.prd, o.qty)]),
+    )
+
+
+def _from_row(row, catalogo: core.Catalogo):
+    client, pedido, razon, sts, entrega, importe, _, _, productos = row
+    o = core.Pedido(client, pedido, razon, sts, date.fromordinal(entrega) if entrega is not None else None, importe)
+    return o.cerrar({catalogo.id(c): q for c, q in json.loads(productos)})
+
+
+class OrderStore:
+    """Pedidos agregados persistidos en SQLite, con clave (Client, Pedido).
+
+    catalogo: ids de C.Prd compartidos entre los pedidos del reporte y los del store.
+    """
+
+    def __init__(self, db_path: str | Path):
+        self.conn = sqlite3.connect(str(db_path))
+        self.conn.executescript(_SCHEMA)
+        if 'visto' not in {r[1] for r in self.conn.execute('PRAGMA table_info(pedidos)')}:
+            self.conn.execute('ALTER TABLE pedidos ADD COLUMN visto INTEGER')  # stores anteriores
+        self.catalogo = core.Catalogo()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def upsert(self, orders, visto: date | None = None):
+        """Guarda los pedidos y devuelve solo los nuevos o cambiados.
+
+        visto: primera Entrega del reporte; se anota en todos sus pedidos (también los que
+        no cambiaron) para desalojar después los que no tienen fecha.
+        """
+        visto = visto.toordinal() if visto is not None else None
+        cambiados = []
+        cur = self.conn.cursor()
+        for o in orders:
+            row = _to_row(o, self.catalogo)
+            prev = cur.execute(f'SELECT {_COLS} FROM pedidos WHERE client = ? AND pedido = ?', row[:2]).fetchone()
+            if prev == row:
+                if visto is not None:
+                    cur.execute('UPDATE pedidos SET visto = ? WHERE client = ? AND pedido = ?', (visto, *row[:2]))
+                continue
+            cambiados.append(o)
+            cur.execute(
+                f'INSERT INTO pedidos ({_COLS}, visto) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (client, pedido) DO UPDATE SET razon = excluded.razon, sts = excluded.sts, '
+                'entrega = excluded.entrega, importe = excluded.importe, importe_r = excluded.importe_r, '
+                'firma = excluded.firma, productos = excluded.productos, '
+                'visto = COALESCE(excluded.visto, pedidos.visto)',
+                (*row, visto),
+            )
+        self.conn.commit()
+        return cambiados
+
+    def ventana(self, client, desde: date, hasta: date):
+        """Pedidos del cliente con Entrega en [desde, hasta]."""
+        cur = self.conn.execute(
+            f'SELECT {_COLS} FROM pedidos WHERE client = ? AND entrega BETWEEN ? AND ? ORDER BY rowid',
+            (client, desde.toordinal(), hasta.toordinal()),
+        )
+        return [_from_row(r, self.catalogo) for r in cur]
+
+    def exactos(self, o):
+        """Pedidos RET con la misma clave de exactos que o (incluido o)."""
+        row = _to_row(o, self.catalogo)
+        cur = self.conn.execute(
+            f'SELECT {_COLS} FROM pedidos WHERE client = ? AND entrega IS ? AND importe_r = ? '
+            "AND firma = ? AND sts = 'RET' ORDER BY rowid",
+            (row[0], row[4], row[6], row[7]),
+        )
+        return [_from_row(r, self.catalogo) for r in cur]
+
+    def desalojar(self, desde: date | None, retencion_dias: int):
+        """Borra los pedidos con Entrega anterior a desde - MAX_DIAS - retencion_dias.
+
+        desde: primera Entrega del reporte; None (reporte sin fechas) no borra nada.
+        Los pedidos sin fecha se borran con el mismo límite según visto (los que todavía no
+        tienen visto, p. ej. de un store anterior, empiezan a contar desde este reporte).
+        """
+        if desde is None:
+            return
+        limite = desde.toordinal() - core.MAX_DIAS - retencion_dias
+        self.conn.execute('UPDATE pedidos SET visto = ? WHERE visto IS NULL', (desde.toordinal(),))
+        self.conn.execute('DELETE FROM pedidos WHERE entrega < ? OR (entrega IS NULL AND visto < ?)',
+                          (limite, limite))
+        self.conn.commit()
+
+
+def _detect_incremental(rows_iter, store: OrderStore, out_exact: Path, out_sim: Path,
+                        retencion_dias: int | None = None, firma_completa: bool = False):
+    pedidos = core._armar_pedidos(rows_iter, store.catalogo)
+    primera = min((o.entrega for o in pedidos if o.entrega is not None), default=None)
+    nuevos = store.upsert(pedidos, primera)
+
+    # Exactos (✅ SOLO RET): grupos donde participa algún pedido nuevo o cambiado
+    exact_rows = []
+    vistos = set()
+    for o in nuevos:
+        if o.sts != 'RET':
+            continue
+        k = o.clave_exacto()
+        if k in vistos:
+            continue
+        vistos.add(k)
+        grupo = store.exactos(o)
+        if len(grupo) > 1:
+            exact_rows.extend(core._fila_exacto(g, store.catalogo) for g in grupo)
+    core.write_csv(out_exact, exact_rows, core._campos_exactos(firma_completa))
+
+    # Similares (RET/PRC): nuevos contra el store, en la ventana MAX_DIAS de su cliente
+    by_client = defaultdict(list)
+    for o in nuevos:
+        if o.entrega is not None:
+            by_client[o.client].append(o)
+
+    similar_pairs = []
+    for client, lst in by_client.items():
+        desde = min(o.entrega for o in lst)
+        hasta = max(o.entrega for o in lst)
+        ventana = store.ventana(client, date.fromordinal(desde.toordinal() - core.MAX_DIAS),
+                                date.fromordinal(hasta.toordinal() + core.MAX_DIAS))
+        similar_pairs.extend(core._similares_cliente(client, ventana, solo={o.pedido for o in lst}))
+    core.write_csv(out_sim, similar_pairs, core.CAMPOS_SIMILARES)
+
+    store.desalojar(primera, core.MAX_DIAS if retencion_dias is None else retencion_dias)
+    return out_exact, out_sim
+
+
+def run_incremental(in_path: str | Path, db_path: str | Path, retencion_dias: int | None = None,
+                    firma_completa: bool = False):
+    """Como run_detector, pero comparando contra los pedidos guardados en db_path.
+
+    retencion_dias: días que se conservan detrás de la ventana para reportes que llegan
+    tarde o se solapan (default: MAX_DIAS).
+    """
+    in_path = Path(in_path)
+    out_exact = in_path.with_name('duplicados_exactos.csv')
+    out_sim = in_path.with_name('duplicados_similares.csv')
+    with OrderStore(db_path) as store:
+        return _detect_incremental(core.iter_rows_from_path(in_path), store, out_exact, out_sim, retencion_dias,
+                                   firma_completa)
+
+
+def detect_incremental_from_filelike(fileobj, db_path: str | Path, out_dir: str | Path,
+                                     retencion_dias: int | None = None, firma_completa: bool = False):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_exact = out_dir / 'duplicados_exactos.csv'
+    out_sim = out_dir / 'duplicados_similares.csv'
+    with OrderStore(db_path) as store:
+        return _detect_incremental(core.iter_rows_from_filelike(fileobj), store, out_exact, out_sim, retencion_dias,
+                                   firma_completa)
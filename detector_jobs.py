@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Detecciones en segundo plano, con progreso y cancelación.
+
+Un Trabajo corre una función de detección fn(stats) en un hilo del pool, con un
+DetectorStats que lleva un Progreso (etapa, líneas leídas, clientes procesados sobre
+el total, pares encontrados). Quien lo lanzó lo consulta cuando quiere, sin bloquearse.
+
+Los trabajos se identifican por clave (p. ej. content_key del archivo subido): pedir
+la misma clave mientras corre, o ya terminado y todavía no retirado, devuelve el mismo
+Trabajo en vez de empezar otro cálculo. Un trabajo cancelado o con error se reemplaza
+por uno nuevo al volver a pedirlo.
+
+Cada sesión que espera un trabajo se anota (lanzar(..., sesion=...)); soltar(trabajo, sesion)
+la borra y solo cancela la corrida si no queda otra sesión esperándola. Un trabajo que
+nadie consulta (lanzar u obtener) durante ttl segundos se descarta, y si seguía corriendo
+se cancela: sesiones cerradas o resultados que nadie retiró no quedan para siempre.
+
+Expone:
+- Trabajos(max_workers=2, ttl=TTL_SEGUNDOS): lanzar(clave, fn, sesion=None) -> Trabajo, obtener(clave),
+  soltar(trabajo, sesion) -> bool, olvidar(trabajo)
+- Trabajo: estado, progreso, stats, terminado, segundos, cancelar(), esperar(), resultado()
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from detector_core import DetectorCancelado, DetectorStats, Progreso
+
+ESPERANDO = 'esperando'
+CORRIENDO = 'corriendo'
+LISTO = 'listo'
+CANCELADO = 'cancelado'
+ERROR = 'error'
+
+TTL_SEGUNDOS = 10 * 60  # sin consultas por este tiempo, el trabajo se descarta (y se cancela)
+
+
+class Trabajo:
+    """Una detección en segundo plano (ver Trabajos.lanzar)."""
+
+    def __init__(self, clave):
+        self.clave = clave
+        self.stats = DetectorStats(progreso=Progreso())
+        self.estado = ESPERANDO
+        self.error = None
+        self.inicio = time.monotonic()
+        self.fin = None
+        self.sesiones = set()  # sesiones esperándolo (ver Trabajos.soltar)
+        self.consultado = self.inicio  # última vez que alguien lo pidió (ver Trabajos ttl)
+        self._resultado = None
+        self._terminado = threading.Event()
+
+    @property
+    def progreso(self) -> Progreso:
+        return self.stats.progreso
+
+    @property
+    def terminado(self) -> bool:
+        return self._terminado.is_set()
+
+    @property
+    def segundos(self) -> float:
+        return (self.fin or time.monotonic()) - self.inicio
+
+    def cancelar(self):
+        """Pide cortar la corrida: termina en el próximo punto de avance con estado CANCELADO."""
+        self.progreso.cancelar()
+
+    def esperar(self, timeout: float | None = None) -> bool:
+        return self._terminado.wait(timeout)
+
+    def resultado(self, timeout: float | None = None):
+        """Lo que devolvió fn; si terminó cancelado o con error, levanta esa excepción."""
+        if not self._terminado.wait(timeout):
+            raise TimeoutError(f'El trabajo {self.clave!r} sigue corriendo')
+        if self.estado != LISTO:
+            raise self.error
+        return self._resultado
+
+    def _correr(self, fn):
+        try:
+            self.progreso.chequear()
+            self.estado = CORRIENDO
+            self._resultado = fn(self.stats)
+            self.estado = LISTO
+        except DetectorCancelado as e:
+            self.error = e
+            self.estado = CANCELADO
+        except Exception as e:
+            self.error = e
+            self.estado = ERROR
+        finally:
+            self.fin = time.monotonic()
+            self._terminado.set()
+
+
+class Trabajos:
+    """Registro de trabajos por clave sobre un pool de hilos (compartido entre sesiones)."""
+
+    def __init__(self, max_workers: int = 2, ttl: float = TTL_SEGUNDOS):
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='detector')
+        self._trabajos = {}  # clave -> Trabajo (corriendo o terminado sin retirar)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._trabajos)
+
+    def lanzar(self, clave, fn, sesion=None) -> Trabajo:
+        """Corre fn(stats) en segundo plano, salvo que ya haya un trabajo vigente para la clave.
+
+        sesion (opcional): quien lo espera, para soltar(); se anota también en un trabajo ya vigente.
+        """
+        with self._lock:
+            self._purgar()
+            t = self._trabajos.get(clave)
+            nuevo = t is None or t.estado in (CANCELADO, ERROR)
+            if nuevo:
+                t = self._trabajos[clave] = Trabajo(clave)
+            t.consultado = time.monotonic()
+            if sesion is not None:
+                t.sesiones.add(sesion)
+        if nuevo:
+            self._pool.submit(t._correr, fn)
+        return t
+
+    def obtener(self, clave) -> Trabajo | None:
+        with self._lock:
+            self._purgar()
+            t = self._trabajos.get(clave)
+            if t is not None:
+                t.consultado = time.monotonic()
+            return t
+
+    def soltar(self, trabajo: Trabajo, sesion) -> bool:
+        """La sesión deja de esperar el trabajo; si no queda ninguna, se cancela. True si se canceló."""
+        with self._lock:
+            trabajo.sesiones.discard(sesion)
+            if trabajo.sesiones or trabajo.terminado:
+                return False
+            if self._trabajos.get(trabajo.clave) is trabajo:
+                del self._trabajos[trabajo.clave]
+        trabajo.cancelar()
+        return True
+
+    def olvidar(self, trabajo: Trabajo):
+        """Retira un trabajo terminado (su resultado ya se guardó en otro lado)."""
+        with self._lock:
+            if self._trabajos.get(trabajo.clave) is trabajo:
+                del self._trabajos[trabajo.clave]
+
+    def _purgar(self):
+        # Con self._lock tomado
+        limite = time.monotonic() - self.ttl
+        for clave in [k for k, t in self._trabajos.items() if t.consultado < limite]:
+            self._trabajos.pop(clave).cancelar()  # si ya terminó, no hace nada
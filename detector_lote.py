@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Modo lote (sin UI): muchos reportes en paralelo, p. ej. el chequeo nocturno de sucursales.
+
+Cada reporte se procesa en un proceso del pool (uno nuevo por reporte, así la memoria
+pico de uno no se mezcla con la de otro) y escribe en su propia carpeta:
+
+    SALIDA/<nombre del reporte>/duplicados_exactos.csv
+    SALIDA/<nombre del reporte>/duplicados_similares.csv
+    SALIDA/<nombre del reporte>/resumen.json
+
+resumen.json: exactos y similares (y cuántos son ALTA), clientes con duplicados, tiempos
+por etapa, memoria pico y los contadores de DetectorStats. Si un reporte falla, su resumen
+trae ok=false y el error; el resto sigue. Si se cae un proceso (p. ej. sin memoria) se rompe
+el pool: los reportes que estaban en él se reintentan de a uno, cada uno en un pool propio,
+y el que lo vuelve a tirar queda con ok=false. SALIDA/resumen_lote.json junta todos los
+resúmenes y los totales.
+
+Al expandir carpetas y globs se saltean las salidas del detector (duplicados_*.csv,
+vecinos_similares.*), por si SALIDA queda dentro de la carpeta de entrada.
+
+Los reportes más pesados se lanzan primero, para que uno grande no quede solo al final.
+
+Uso:
+    python detector_lote.py reportes/ --salida resultados/
+    python detector_lote.py "sucursales/**/*.csv" --jobs 8 --engine pandas
+
+Expone:
+- expandir_entradas(entradas, patron='*.csv') -> [Path]
+- procesar_reporte(path, out_dir, ...) -> resumen (dict)
+- run_lote(entradas, out_dir, jobs=None, ...) -> [resumen]
+"""
+
+import argparse
+import csv
+import fnmatch
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import CancelledError, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import detector_core as core
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+PATRON_DEFAULT = '*.csv'
+RESUMEN = 'resumen.json'
+RESUMEN_LOTE = 'resumen_lote.json'
+SALIDAS_DETECTOR = ('duplicados_*', 'vecinos_similares.*')  # no son reportes aunque cumplan el patrón
+
+
+def _es_salida(p: Path) -> bool:
+    return any(fnmatch.fnmatch(p.name, s) for s in SALIDAS_DETECTOR)
+
+
+def expandir_entradas(entradas, patron: str = PATRON_DEFAULT):
+    """Archivos de entrada: carpetas (los que cumplen patron), globs o archivos sueltos; sin repetir.
+
+    De carpetas y globs no se toman las salidas del detector (SALIDAS_DETECTOR).
+    """
+    paths = []
+    for entrada in entradas:
+        p = Path(entrada)
+        if p.is_dir():
+            encontrados = sorted(x for x in p.glob(patron) if x.is_file() and not _es_salida(x))
+        elif p.is_file():
+            encontrados = [p]
+        else:
+            encontrados = sorted(Path(x) for x in glob.glob(str(entrada), recursive=True)
+                                 if Path(x).is_file() and not _es_salida(Path(x)))
+            if not encontrados:
+                raise FileNotFoundError(f'No hay reportes en {entrada!r}')
+        paths.extend(encontrados)
+    vistos = set()
+    return [p for p in paths if not (p.resolve() in vistos or vistos.add(p.resolve()))]
+
+
+def _carpetas_salida(paths, out_dir: Path):
+    """Una carpeta por reporte con el nombre del archivo (sufijo _2, _3... si se repite)."""
+    usadas = {}
+    carpetas = []
+    for p in paths:
+        n = usadas[p.stem] = usadas.get(p.stem, 0) + 1
+        carpetas.append(out_dir / (p.stem if n == 1 else f'{p.stem}_{n}'))
+    return carpetas
+
+
+def _contar(path: Path):
+    """(filas, filas ALTA, clientes) de un CSV de salida."""
+    filas = altas = 0
+    clientes = set()
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            filas += 1
+            altas += row['prioridad'] == 'ALTA'
+            clientes.add(row['Client'])
+    return filas, altas, clientes
+
+
+def _pico_memoria_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / 2**20 if sys.platform == 'darwin' else rss / 1024, 1)  # macOS: bytes; Linux: KiB
+
+
+def procesar_reporte(path: str | Path, out_dir: str | Path, engine: str = 'python', workers: int | None = None,
+                     firma_completa: bool = False) -> dict:
+    """Corre run_detector sobre un reporte, escribe out_dir/resumen.json y devuelve el resumen."""
+    path, out_dir = Path(path), Path(out_dir)
+    stats = core.DetectorStats()
+    resumen = {'archivo': str(path), 'salida': str(out_dir), 'ok': True, 'error': None}
+    t0 = time.perf_counter()
+    try:
+        out_exact, out_sim = core.run_detector(path, engine, workers, stats, firma_completa, out_dir=out_dir)
+        exactos, alta_exactos, clientes_exactos = _contar(out_exact)
+        similares, alta_similares, clientes_similares = _contar(out_sim)
+        resumen.update(exactos=exactos, alta_exactos=alta_exactos, similares=similares,
+                       alta_similares=alta_similares, alta=alta_exactos + alta_similares,
+                       clientes=len(clientes_exactos | clientes_similares))
+    except Exception as e:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        resumen.update(ok=False, error=f'{type(e).__name__}: {e}')
+    resumen.update(segundos=round(time.perf_counter() - t0, 4), pico_memoria_mb=_pico_memoria_mb(),
+                   stats=stats.to_dict(top=5))
+    (out_dir / RESUMEN).write_text(json.dumps(resumen, indent=2, ensure_ascii=False), encoding='utf-8')
+    return resumen
+
+
+def _resumen_fallido(path: Path, out_dir: Path, error: BaseException) -> dict:
+    """Resumen de un reporte cuyo proceso no llegó a devolver nada (p. ej. lo mató el sistema)."""
+    resumen = {'archivo': str(path), 'salida': str(out_dir), 'ok': False,
+               'error': f'{type(error).__name__}: {error}', 'segundos': None, 'pico_memoria_mb': None, 'stats': None}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    (out_dir / RESUMEN).write_text(json.dumps(resumen, indent=2, ensure_ascii=False), encoding='utf-8')
+    return resumen
+
+
+def _tanda(ks, jobs, paths, carpetas, engine, workers, firma_completa):
+    """(k, resumen o excepción) de los reportes ks, a medida que terminan, en un pool nuevo de jobs procesos."""
+    with ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=1) as ex:
+        futuros = {ex.submit(procesar_reporte, paths[k], carpetas[k], engine, workers, firma_completa): k
+                   for k in ks}
+        for futuro in as_completed(futuros):
+            try:
+                yield futuros[futuro], futuro.result()
+            except (Exception, CancelledError) as e:
+                yield futuros[futuro], e
+
+
+def _totales(resumenes, segundos):
+    ok = [r for r in resumenes if r['ok']]
+    campos = ('exactos', 'alta_exactos', 'similares', 'alta_similares', 'alta')
+    return {
+        'reportes': len(resumenes),
+        'fallidos': len(resumenes) - len(ok),
+        **{c: sum(r[c] for r in ok) for c in campos},
+        'segundos': round(segundos, 4),
+        'pico_memoria_mb': max((r['pico_memoria_mb'] or 0 for r in resumenes), default=None),
+    }
+
+
+def run_lote(entradas, out_dir: str | Path, jobs: int | None = None, engine: str = 'python',
+             workers: int | None = None, firma_completa: bool = False, patron: str = PATRON_DEFAULT,
+             al_terminar=None):
+    """Procesa los reportes de entradas en jobs procesos; devuelve los resúmenes en el orden de entrada.
+
+    workers es el paralelismo de cada reporte (motor python); con muchos reportes conviene
+    dejarlo en None y repartir los procesos con jobs. al_terminar(resumen) se llama a medida
+    que termina cada reporte. Escribe out_dir/resumen_lote.json.
+    """
+    if engine not in core.ENGINES:
+        raise ValueError(f"Motor desconocido: {engine!r} (opciones: {', '.join(core.ENGINES)})")
+    out_dir = Path(out_dir)
+    paths = expandir_entradas(entradas, patron)
+    carpetas = _carpetas_salida(paths, out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths) or 1))
+
+    t0 = time.perf_counter()
+    resumenes = [None] * len(paths)
+    orden = sorted(range(len(paths)), key=lambda k: -paths[k].stat().st_size)
+    args = (paths, carpetas, engine, workers, firma_completa)
+
+    def terminar(k, r):
+        resumenes[k] = _resumen_fallido(paths[k], carpetas[k], r) if isinstance(r, BaseException) else r
+        if al_terminar is not None:
+            al_terminar(resumenes[k])
+
+    rotos = []
+    for k, r in _tanda(orden, jobs, *args):
+        if isinstance(r, BrokenProcessPool) and jobs > 1:
+            rotos.append(k)  # se cayó un proceso del pool: no se sabe cuál, se reintenta solo
+        else:
+            terminar(k, r)
+    for k in rotos:
+        for _, r in _tanda([k], 1, *args):
+            terminar(k, r)
+
+    lote = {'totales': _totales(resumenes, time.perf_counter() - t0), 'reportes': resumenes}
+    (out_dir / RESUMEN_LOTE).write_text(json.dumps(lote, indent=2, ensure_ascii=False), encoding='utf-8')
+    return resumenes
+
+
+def _print_resumen(r):
+    if r['ok']:
+        print(f"{r['archivo']}: exactos={r['exactos']} similares={r['similares']} ALTA={r['alta']}  "
+              f"{r['segundos']:.2f}s  rss={r['pico_memoria_mb']}MB", flush=True)
+    else:
+        print(f"{r['archivo']}: FALLA {r['error']}", flush=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Detecta duplicados en muchos reportes, en paralelo y sin UI.')
+    ap.add_argument('entradas', nargs='+', help='carpetas, globs (entre comillas) o archivos de reporte')
+    ap.add_argument('--salida', type=Path, default=Path('resultados'), help='carpeta de salida (default: resultados)')
+    ap.add_argument('--jobs', type=int, default=None, help='reportes a la vez (default: CPUs)')
+    ap.add_argument('--engine', default='python', choices=core.ENGINES)
+    ap.add_argument('--workers', type=int, default=None, help='workers por reporte (motor python)')
+    ap.add_argument('--patron', default=PATRON_DEFAULT, help=f'archivos a tomar de cada carpeta (default: {PATRON_DEFAULT})')
+    ap.add_argument('--firma-completa', action='store_true', help='agrega firma_productos a los exactos')
+    args = ap.parse_args(argv)
+
+    resumenes = run_lote(args.entradas, args.salida, args.jobs, args.engine, args.workers, args.firma_completa,
+                         args.patron, al_terminar=_print_resumen)
+    fallidos = sum(not r['ok'] for r in resumenes)
+    print(f'{len(resumenes)} reportes, {fallidos} con error -> {args.salida / RESUMEN_LOTE}')
+    return 1 if fallidos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
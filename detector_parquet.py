@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""Entrada y salida columnar (Parquet / Arrow) del detector.
+
+Entrada: archivos de líneas ya limpias (.parquet, o Arrow IPC / Feather) con las mismas
+columnas que el reporte (Client, Pedido, Entrega, Importe Total, C.Prd, Cant, Razon social,
+Sts). Se leen solo esas columnas, sin buscar la cabecera ni parsear texto:
+- Entrega como date / timestamp (o texto dd/mm/yy, como en el reporte)
+- Importe Total y Cant numéricos (o texto); nulo = sin valor
+- El resto como texto (si vienen como números se pasan a texto)
+Las detecciones corren con el motor columnar (detector_columnar), con las mismas reglas:
+mismo resultado que el reporte CSV del que salieron las líneas (ver reporte_a_parquet).
+run_detector / run_detector_frames de detector_core también aceptan estos archivos.
+
+Salida: los resultados como Parquet tipado y comprimido (COMPRESION) en vez de CSV, y la
+tabla de pedidos agregados (pedidos.parquet: una fila por pedido, con sus C.Prd y Cant
+como listas), para análisis posteriores sin volver a leer el reporte.
+
+Requiere pyarrow (opcional: el resto del detector no lo necesita).
+
+Expone:
+- run_detector_parquet(in_path, out_dir=None, formato='parquet', pedidos=False) -> paths
+- detect_frames_from_parquet(fuente) -> (df_exact, df_sim)
+- leer_columnas(fuente) -> columnas de líneas para detector_columnar
+- reporte_a_parquet(in_path, out_path=None) -> path (reporte CSV -> líneas tipadas)
+- write_frame_parquet(df, path)
+"""
+
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+import detector_columnar as col
+import detector_core as core
+
+COMPRESION = 'zstd'
+FORMATOS = ('csv', 'parquet')
+SUFIJOS_PARQUET = ('.parquet', '.pq')
+
+COLUMNAS_TEXTO = (core.COL_CLIENTE, core.COL_PEDIDO, core.COL_CPRD, core.COL_RAZON, core.COL_STS)
+COLUMNAS_NUMERO = (core.COL_IMPORTE, core.COL_CANT)
+CAMPOS_PEDIDOS = ['Client', 'Razon social', 'Sts', 'Pedido', 'Entrega', 'Importe', 'n_productos', 'C.Prd', 'Cant']
+
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError as e:
+        raise ImportError('La entrada/salida Parquet/Arrow requiere pyarrow (pip install pyarrow)') from e
+    return pa, pc
+
+
+def _leer_tabla(path: Path, columnas):
+    """Tabla Arrow con las columnas pedidas que existan en el archivo."""
+    _pyarrow()
+    if path.suffix.lower() in SUFIJOS_PARQUET:
+        import pyarrow.parquet as pq
+
+        presentes = set(pq.read_schema(path).names)
+        return pq.read_table(path, columns=[c for c in columnas if c in presentes])
+    import pyarrow.feather as feather
+
+    tabla = feather.read_table(path, memory_map=True)
+    return tabla.select([c for c in columnas if c in tabla.column_names])
+
+
+def _texto(columna):
+    """Columna Arrow -> ndarray de str con strip ('' para nulos)."""
+    pa, pc = _pyarrow()
+    if not (pa.types.is_string(columna.type) or pa.types.is_large_string(columna.type)):
+        columna = pc.cast(columna, pa.string())
+    # Un str de Python por valor distinto, no por línea (los reportes repiten mucho)
+    codificada = pc.dictionary_encode(pc.fill_null(columna, '').combine_chunks())
+    limpios = [v.strip() for v in codificada.dictionary.to_pylist()]
+    return np.array(limpios, dtype=object)[codificada.indices.to_numpy(zero_copy_only=False)]
+
+
+def _entrega(columna):
+    """Fechas Arrow -> ordinal por línea (-1 = sin fecha); el texto queda para parse_fecha_entrega."""
+    pa, pc = _pyarrow()
+    t = columna.type
+    if not (pa.types.is_date(t) or pa.types.is_timestamp(t)):
+        return _texto(columna)
+    dias = pc.cast(pc.cast(columna, pa.date32(), safe=False), pa.int32())
+    nulos = pc.is_null(dias).to_numpy(zero_copy_only=False)
+    out = pc.fill_null(dias, 0).to_numpy(zero_copy_only=False).astype(np.int64) + _EPOCH
+    out[nulos] = -1
+    return out
+
+
+def _numero(columna):
+    """Números Arrow -> float64 por línea (NaN = sin valor); el texto queda para parse_float."""
+    pa, pc = _pyarrow()
+    t = columna.type
+    if not (pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t)):
+        return _texto(columna)
+    return pc.cast(columna, pa.float64()).to_numpy(zero_copy_only=False).astype(np.float64)
+
+
+def _columnas_de_tabla(tabla):
+    n = tabla.num_rows
+    cols = {}
+    for nombre in COLUMNAS_TEXTO + COLUMNAS_NUMERO + (core.COL_ENTREGA,):
+        if nombre not in tabla.column_names:
+            cols[nombre] = np.full(n, '', dtype=object)
+        elif nombre == core.COL_ENTREGA:
+            cols[nombre] = _entrega(tabla.column(nombre))
+        elif nombre in COLUMNAS_NUMERO:
+            cols[nombre] = _numero(tabla.column(nombre))
+        else:
+            cols[nombre] = _texto(tabla.column(nombre))
+    return cols
+
+
+def leer_columnas(fuente):
+    """Columnas de líneas (como detector_columnar._read_columns) desde un archivo Parquet/Arrow
+    o una tabla pyarrow ya cargada."""
+    columnas = COLUMNAS_TEXTO + COLUMNAS_NUMERO + (core.COL_ENTREGA,)
+    tabla = fuente if hasattr(fuente, 'column_names') else _leer_tabla(Path(fuente), columnas)
+    return _columnas_de_tabla(tabla)
+
+
+def _es_arrow(path) -> bool:
+    return isinstance(path, (str, Path)) and Path(path).suffix.lower() in core.SUFIJOS_ARROW
+
+
+def _columnas(fuente, stats=None):
+    """Líneas de un Parquet/Arrow (o tabla pyarrow) o de un reporte CSV, ya en columnas."""
+    with core._etapa(stats, 'parse'):
+        if _es_arrow(fuente) or not isinstance(fuente, (str, Path)):
+            cols = leer_columnas(fuente)
+        else:
+            cols = col._read_columns(core._lineas_con_avance(core._iter_lines_from_path(Path(fuente)), stats))
+    core._avance(stats, lineas=len(cols[core.COL_PEDIDO]))
+    return cols
+
+
+def _detectar(cols, stats=None):
+    """(exact_rows, similar_pairs, pedidos agregados) con el motor columnar."""
+    if stats is not None:
+        stats.engine = 'pandas'
+    with core._etapa(stats, 'aggregate'):
+        o = col._aggregate(cols, stats)
+    cols.clear()
+    with core._etapa(stats, 'exact'):
+        exact_rows = col._exact_rows(o)
+    with core._etapa(stats, 'similar'):
+        similar_pairs = col._similar_rows(o, stats)
+    if stats is not None:
+        stats.exact_rows = len(exact_rows)
+    return exact_rows, similar_pairs, o
+
+
+def _tabla_arrow(df):
+    """DataFrame de resultados -> tabla Arrow, con las Entrega como date32."""
+    pa, pc = _pyarrow()
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    for k, nombre in enumerate(tabla.column_names):
+        if nombre.startswith('Entrega'):
+            tabla = tabla.set_column(k, nombre, pc.cast(tabla.column(nombre), pa.date32()))
+    return tabla
+
+
+def write_frame_parquet(df, path: str | Path):
+    """Escribe un resultado (df_exact, df_sim o filtrar_pares) como Parquet tipado y comprimido."""
+    import pyarrow.parquet as pq
+
+    path = Path(path)
+    pq.write_table(_tabla_arrow(df), path, compression=COMPRESION)
+    return path
+
+
+def _tabla_pedidos(o):
+    """Pedidos agregados del motor columnar -> tabla Arrow (CAMPOS_PEDIDOS)."""
+    pa, _ = _pyarrow()
+    entrega = o['entrega']
+    importe = o['importe']
+    indptr = o['indptr']
+    lista = pa.ListArray if indptr[-1] < 2**31 else pa.LargeListArray
+    offsets = pa.array(indptr, type=pa.int32() if lista is pa.ListArray else pa.int64())
+    return pa.table({
+        'Client': pa.array(o['client_names'][o['client_code']], type=pa.string()),
+        'Razon social': pa.array(o['razon'], type=pa.string()),
+        'Sts': pa.array(o['sts'], type=pa.string()),
+        'Pedido': pa.array(o['pedido'], type=pa.string()),
+        'Entrega': pa.array((entrega - _EPOCH).astype(np.int32), mask=entrega < 0).cast(pa.date32()),
+        'Importe': pa.array(importe, mask=np.isnan(importe)),
+        'n_productos': pa.array(np.diff(indptr)),
+        'C.Prd': lista.from_arrays(offsets, pa.array(o['prd_uni'][o['e_prd']], type=pa.string())),
+        'Cant': lista.from_arrays(offsets, pa.array(o['e_qty'])),
+    })
+
+
+def run_detector_parquet(in_path: str | Path, out_dir: str | Path | None = None, formato: str = 'parquet',
+                         pedidos: bool = False, stats: core.DetectorStats | None = None,
+                         firma_completa: bool = False):
+    """Detecta sobre un Parquet/Arrow de líneas o un reporte CSV y escribe en out_dir (default: junto a in_path).
+
+    formato='parquet': duplicados_exactos.parquet y duplicados_similares.parquet; 'csv': los
+    mismos CSV de run_detector. pedidos=True agrega pedidos.parquet. Devuelve los paths escritos.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato!r} (opciones: {', '.join(FORMATOS)})")
+    if formato == 'parquet' or pedidos:
+        _pyarrow()
+    in_path = Path(in_path)
+    out_dir = in_path.parent if out_dir is None else Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    exact_rows, similar_pairs, o = _detectar(_columnas(in_path, stats), stats)
+    if formato == 'csv':
+        paths = list(core._write_results(exact_rows, similar_pairs, out_dir / 'duplicados_exactos.csv',
+                                         out_dir / 'duplicados_similares.csv', stats, firma_completa))
+    else:
+        df_exact, df_sim = core._frames(exact_rows, similar_pairs, stats, firma_completa)
+        with core._etapa(stats, 'write'):
+            paths = [write_frame_parquet(df_exact, out_dir / 'duplicados_exactos.parquet'),
+                     write_frame_parquet(df_sim, out_dir / 'duplicados_similares.parquet')]
+    if pedidos:
+        import pyarrow.parquet as pq
+
+        with core._etapa(stats, 'write'):
+            paths.append(out_dir / 'pedidos.parquet')
+            pq.write_table(_tabla_pedidos(o), paths[-1], compression=COMPRESION)
+    return tuple(paths)
+
+
+def detect_frames_from_parquet(fuente, stats: core.DetectorStats | None = None, firma_completa: bool = False):
+    """(df_exact, df_sim) de un Parquet/Arrow de líneas (path o tabla pyarrow), como run_detector_frames."""
+    exact_rows, similar_pairs, _ = _detectar(_columnas(fuente, stats), stats)
+    return core._frames(exact_rows, similar_pairs, stats, firma_completa)
+
+
+def reporte_a_parquet(in_path: str | Path, out_path: str | Path | None = None):
+    """Pasa un reporte CSV a líneas tipadas en Parquet (la entrada de run_detector_parquet).
+
+    Mismas líneas y columnas del detector; Entrega como fecha, Importe Total y Cant como
+    float (nulo si el texto no se podía leer). Detectar sobre el Parquet da lo mismo que
+    sobre el CSV.
+    """
+    pa, _ = _pyarrow()
+    import pyarrow.parquet as pq
+
+    in_path = Path(in_path)
+    out_path = in_path.with_suffix('.parquet') if out_path is None else Path(out_path)
+    cols = col._read_columns(core._iter_lines_from_path(in_path))
+    entrega = col._entregas(cols[core.COL_ENTREGA])
+    tabla = {c: pa.array(cols[c], type=pa.string()) for c in COLUMNAS_TEXTO}
+    tabla[core.COL_ENTREGA] = pa.array((entrega - _EPOCH).astype(np.int32), mask=entrega < 0).cast(pa.date32())
+    for c in COLUMNAS_NUMERO:
+        v = col._numeros(cols[c], np.nan)
+        tabla[c] = pa.array(v, mask=np.isnan(v))
+    pq.write_table(pa.table(tabla), out_path, compression=COMPRESION)
+    return out_path
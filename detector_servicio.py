@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+"""Servicio HTTP local de detección, para otros sistemas (export del ERP, scheduler).
+
+Solo biblioteca estándar (http.server). Los reportes se reciben por partes (Content-Length
+o Transfer-Encoding: chunked) a un archivo temporal mientras se calcula su sha256; las
+detecciones corren en un pool de procesos acotado (workers) y esperan en una cola de a lo
+sumo `cola` pendientes. Con la cola llena se responde 503 + Retry-After (backpressure):
+el cliente reintenta más tarde en vez de acumular trabajo sin límite.
+
+Los resultados se guardan en un ResultCache por id (sha256 del contenido + engine) + config
+del detector (como la app): el mismo reporte enviado dos veces con el mismo engine, o
+mientras todavía se procesa, no se vuelve a calcular. Un resultado que no entra en la caché
+(más grande que --cache-mb) se informa como error en vez de quedar 'listo' sin tablas.
+
+La cola, la ruta, el engine y el Content-Length se revisan antes de leer el cuerpo: con la
+cola llena el 503 sale sin bajar el reporte (y sin mandarlo, si el cliente usa
+Expect: 100-continue). SIGTERM (como Ctrl+C) cierra el servidor y el pool ordenadamente.
+
+Rutas:
+    POST /detecciones[?engine=pandas&esperar=1]     cuerpo: el reporte tal cual
+        200 resumen (estado 'listo') si ya estaba calculado o, con esperar=1, al terminar
+        202 resumen (estado 'en_cola' o 'corriendo'): consultar GET /detecciones/<id>
+        503 cola llena (o pool caído); 413 reporte de más de max_bytes
+        400 cuerpo vacío, engine inválido o Content-Length / chunked mal formado
+    GET /detecciones/<id>                            resumen: estado, conteos, ALTA, tiempos
+    GET /detecciones/<id>/exactos.csv (.json)        duplicados_exactos
+    GET /detecciones/<id>/similares.csv (.json)      duplicados_similares
+    GET /salud                                       ok, workers, cola
+    GET /metricas                                    contadores, caché y latencias p50/p90/p99
+
+Uso:
+    python detector_servicio.py --puerto 8765 --workers 4
+    curl --data-binary @reporte.csv "http://127.0.0.1:8765/detecciones?esperar=1"
+    curl http://127.0.0.1:8765/detecciones/<id>/similares.csv
+
+Carga: bench_servicio.py.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+import detector_core as core
+from detector_cache import ResultCache, digest_key
+
+HOST = '127.0.0.1'
+PUERTO = 8765
+COLA_MAX = 8  # detecciones pendientes (en cola + corriendo) antes de responder 503
+REINTENTAR_SEGUNDOS = 2
+ESPERA_CIERRE = 2  # segundos descartando el cuerpo tras una respuesta temprana, antes de cerrar
+MAX_BYTES = 2 * 1024**3  # tamaño máximo de un reporte
+BLOQUE = 1 << 20  # lectura del cuerpo
+CACHE_MAX_ENTRADAS = 64
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+LATENCIAS_MUESTRAS = 2000  # por ruta: se guardan las últimas N
+ERRORES_MAX = 100  # detecciones fallidas que se recuerdan (para GET /detecciones/<id>)
+
+EN_COLA = 'en_cola'
+CORRIENDO = 'corriendo'
+LISTO = 'listo'
+ERROR = 'error'
+
+TABLAS = {'exactos': 'exact', 'similares': 'sim'}
+
+
+def percentiles(valores, ps=(50, 90, 99)) -> dict:
+    """Percentiles por rango más cercano, p. ej. {'p50': ..., 'p90': ..., 'p99': ...}."""
+    orden = sorted(valores)
+    if not orden:
+        return {f'p{p}': None for p in ps}
+    return {f'p{p}': orden[min(len(orden) - 1, max(0, -(-p * len(orden) // 100) - 1))] for p in ps}
+
+
+def _ruta(path) -> str:
+    """Ruta para las métricas de latencia (sin el id)."""
+    partes = [p for p in urlsplit(path).path.split('/') if p]
+    if partes in (['salud'], ['metricas'], ['detecciones']):
+        return '/' + partes[0]
+    if len(partes) == 2 and partes[0] == 'detecciones':
+        return '/detecciones/<id>'
+    if len(partes) == 3 and partes[0] == 'detecciones':
+        return '/detecciones/<id>/<tabla>'
+    return '(otras)'
+
+
+def _id(digest: str, engine: str) -> str:
+    """Id de una detección: el mismo reporte con otro engine es otra detección."""
+    return f'{digest}-{engine}'
+
+
+def _detectar(path, engine):
+    """En un proceso del pool: frames + stats de un reporte."""
+    stats = core.DetectorStats()
+    t0 = time.perf_counter()
+    df_exact, df_sim = core.run_detector_frames(path, engine, stats=stats)
+    return {'exact': df_exact, 'sim': df_sim, 'stats': stats.to_dict(top=5), 'segundos': time.perf_counter() - t0}
+
+
+def _resultado_nbytes(res: dict) -> int:
+    return sum(int(res[t].memory_usage(deep=True).sum()) for t in TABLAS.values())
+
+
+def _frame_json(df) -> bytes:
+    """Filas como lista de objetos; las fechas como en el CSV (AAAA-MM-DD)."""
+    df = df.copy()
+    for col in df.select_dtypes('datetime').columns:
+        df[col] = df[col].dt.strftime('%Y-%m-%d')
+    return df.to_json(orient='records', force_ascii=False).encode('utf-8')
+
+
+class _ColaLlena(Exception):
+    pass
+
+
+class _Demasiado(Exception):
+    pass
+
+
+class _PoolCaido(Exception):
+    pass
+
+
+class _CuerpoInvalido(Exception):
+    """Content-Length o tamaño de parte (chunked) que no es un entero >= 0."""
+
+
+class _Deteccion:
+    """Una detección pendiente (o fallida) del servicio."""
+
+    def __init__(self, id_, futuro):
+        self.id = id_
+        self.futuro = futuro
+        self.error = None
+        self.resultado = None  # para quien la esperaba, aunque ya haya salido de la caché
+        self.inicio = time.monotonic()
+        self.terminada = threading.Event()
+
+    @property
+    def estado(self):
+        if self.error is not None:
+            return ERROR
+        if self.terminada.is_set():
+            return LISTO
+        return CORRIENDO if self.futuro.running() else EN_COLA
+
+
+class ServicioDetector(ThreadingHTTPServer):
+    """Servidor HTTP + pool de detección + caché de resultados."""
+
+    daemon_threads = True
+
+    def __init__(self, direccion=(HOST, PUERTO), workers: int | None = None, cola: int = COLA_MAX,
+                 max_bytes: int = MAX_BYTES, cache_max_bytes: int = CACHE_MAX_BYTES, log: bool = False):
+        super().__init__(direccion, _Handler)
+        self.workers = workers or os.cpu_count() or 1
+        self.cola = cola
+        self.max_bytes = max_bytes
+        self.log = log
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.cache = ResultCache(CACHE_MAX_ENTRADAS, cache_max_bytes, sizeof=_resultado_nbytes)
+        self.tmp = tempfile.TemporaryDirectory(prefix='detector_servicio_')
+        self._detecciones = {}  # id -> _Deteccion pendiente o fallida
+        self._lock = threading.Lock()
+        self._contadores = dict.fromkeys(('pedidos', 'cache_hits', 'detecciones', 'rechazadas', 'errores'), 0)
+        self._latencias = {}  # ruta -> deque de segundos
+
+    def server_close(self):
+        """Deja de escuchar, cancela lo que está en cola y espera las detecciones que ya corren."""
+        super().server_close()
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.tmp.cleanup()
+
+    def contar(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] += n
+
+    def medir(self, ruta, segundos):
+        with self._lock:
+            self._latencias.setdefault(ruta, deque(maxlen=LATENCIAS_MUESTRAS)).append(segundos)
+
+    def pendientes(self):
+        with self._lock:
+            return sum(not d.terminada.is_set() for d in self._detecciones.values())
+
+    def resultado(self, id_):
+        return self.cache.get(digest_key(id_))
+
+    def deteccion(self, id_):
+        with self._lock:
+            return self._detecciones.get(id_)
+
+    def enviar(self, id_, path: Path, engine: str):
+        """Encola la detección de path (ya guardado) salvo que esté en caché o en curso.
+
+        Devuelve la _Deteccion en curso, o None si ya estaba calculada; levanta _ColaLlena
+        si hay `cola` pendientes. path queda a cargo del servicio (se borra al terminar).
+        """
+        with self._lock:
+            d = self._detecciones.get(id_)
+            en_curso = d is not None and d.error is None
+            if en_curso or self.cache.get(digest_key(id_)) is not None:
+                path.unlink(missing_ok=True)
+                self._contadores['cache_hits'] += 1
+                return d if en_curso else None
+            if sum(not x.terminada.is_set() for x in self._detecciones.values()) >= self.cola:
+                path.unlink(missing_ok=True)
+                self._contadores['rechazadas'] += 1
+                raise _ColaLlena()
+            try:
+                futuro = self.pool.submit(_detectar, str(path), engine)
+            except BrokenProcessPool:
+                # Un worker murió (p. ej. sin memoria): las pendientes ya fallaron; pool nuevo para las próximas
+                path.unlink(missing_ok=True)
+                self._contadores['errores'] += 1
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = ProcessPoolExecutor(max_workers=self.workers)
+                raise _PoolCaido()
+            d = self._detecciones[id_] = _Deteccion(id_, futuro)
+            self._contadores['detecciones'] += 1
+        d.futuro.add_done_callback(lambda futuro: self._terminar(d, path))
+        return d
+
+    def _terminar(self, d: _Deteccion, path: Path):
+        path.unlink(missing_ok=True)
+        try:
+            res = d.futuro.result()
+            if not self.cache.put(digest_key(d.id), res):
+                mb = _resultado_nbytes(res) / 2**20
+                raise MemoryError(f'El resultado ({mb:.0f} MB) no entra en la caché '
+                                  f'({self.cache.max_bytes / 2**20:.0f} MB, ver --cache-mb)')
+            d.resultado = res
+            with self._lock:
+                if self._detecciones.get(d.id) is d:
+                    del self._detecciones[d.id]
+        except (Exception, CancelledError) as e:
+            d.error = f'{type(e).__name__}: {e}'
+            with self._lock:
+                self._contadores['errores'] += 1
+                fallidas = [k for k, x in self._detecciones.items() if x.error is not None]
+                for k in fallidas[:-ERRORES_MAX]:
+                    del self._detecciones[k]
+        self.medir('deteccion', time.monotonic() - d.inicio)
+        d.terminada.set()
+
+    def resumen(self, id_, d: _Deteccion | None = None) -> dict:
+        """Estado de una detección; con el resultado listo, conteos y links a las tablas."""
+        res = d.resultado if d is not None and d.resultado is not None else self.resultado(id_)
+        r = {'id': id_, 'estado': LISTO if res is not None else (d.estado if d is not None else None)}
+        if res is not None:
+            exact, sim = res['exact'], res['sim']
+            r.update(exactos=len(exact), similares=len(sim),
+                     alta_exactos=int((exact['prioridad'] == 'ALTA').sum()),
+                     alta_similares=int((sim['prioridad'] == 'ALTA').sum()),
+                     segundos=round(res['segundos'], 4), stats=res['stats'],
+                     tablas={f'{t}.{fmt}': f'/detecciones/{id_}/{t}.{fmt}' for t in TABLAS for fmt in ('csv', 'json')})
+        elif d is not None and d.error is not None:
+            r['error'] = d.error
+        return r
+
+    def metricas(self) -> dict:
+        with self._lock:
+            contadores = dict(self._contadores)
+            latencias = {ruta: {'n': len(v), **{k: round(s, 4) if s is not None else None
+                                                for k, s in percentiles(v).items()}}
+                         for ruta, v in self._latencias.items()}
+        return {**contadores, 'cola': self.pendientes(), 'cola_max': self.cola, 'workers': self.workers,
+                'cache_entradas': len(self.cache), 'cache_mb': round(self.cache.nbytes / 2**20, 1),
+                'latencias': latencias}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: ServicioDetector
+    protocol_version = 'HTTP/1.1'  # para Expect: 100-continue (todas las respuestas llevan Content-Length)
+
+    def log_message(self, format, *args):
+        if self.server.log:
+            super().log_message(format, *args)
+
+    def _responder(self, codigo, cuerpo: bytes, tipo='application/json', **headers):
+        self.send_response(codigo)
+        self.send_header('Content-Type', tipo)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for k, v in headers.items():
+            self.send_header(k.replace('_', '-'), str(v))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _json(self, codigo, obj, **headers):
+        self._responder(codigo, json.dumps(obj, ensure_ascii=False).encode('utf-8'),
+                        'application/json; charset=utf-8', **headers)
+
+    def _rechazar(self, codigo, obj, **headers):
+        """Responde sin haber leído (todo) el cuerpo y cierra la conexión.
+
+        Cerrar con datos sin leer hace que el sistema mande un RST y el cliente puede perder
+        la respuesta: primero se cierra la escritura y se descarta lo que llegue por un rato.
+        """
+        self.close_connection = True
+        self._json(codigo, obj, Connection='close', **headers)
+        try:
+            self.connection.shutdown(socket.SHUT_WR)
+            self.connection.settimeout(ESPERA_CIERRE)
+            fin = time.monotonic() + ESPERA_CIERRE
+            while time.monotonic() < fin and self.connection.recv(BLOQUE):
+                pass
+        except OSError:
+            pass
+
+    def _rechazo(self):
+        """(código, cuerpo, headers) si el POST se rechaza antes de leer el cuerpo; si no, None."""
+        url = urlsplit(self.path)
+        if url.path.rstrip('/') != '/detecciones':
+            return 404, {'error': f'Ruta desconocida: {url.path}'}, {}
+        engine = parse_qs(url.query).get('engine', ['python'])[0]
+        if engine not in core.ENGINES:
+            return 400, {'error': f"Motor desconocido: {engine!r} (opciones: {', '.join(core.ENGINES)})"}, {}
+        try:
+            largo = self._largo()
+        except _CuerpoInvalido as e:
+            return 400, {'error': str(e)}, {}
+        if largo > self.server.max_bytes:
+            return 413, {'error': f'El reporte supera {self.server.max_bytes} bytes'}, {}
+        if self.server.pendientes() >= self.server.cola:
+            self.server.contar('rechazadas')
+            return 503, {'error': 'Cola llena, reintentar más tarde', 'cola': self.server.cola}, \
+                {'Retry_After': REINTENTAR_SEGUNDOS}
+        return None
+
+    def handle_expect_100(self):
+        # El cliente espera el 100 Continue para mandar el cuerpo: si se rechaza, no lo manda
+        rechazo = self._rechazo() if self.command == 'POST' else None
+        if rechazo is not None:
+            codigo, obj, headers = rechazo
+            self._rechazar(codigo, obj, **headers)
+            return False
+        return super().handle_expect_100()
+
+    def _leer(self, n):
+        while n > 0:
+            b = self.rfile.read(min(n, BLOQUE))
+            if not b:
+                raise ConnectionError('Cuerpo incompleto')
+            n -= len(b)
+            yield b
+
+    def _largo(self) -> int:
+        """Content-Length (0 si no viene); _CuerpoInvalido si no es un entero >= 0."""
+        valor = self.headers.get('Content-Length') or '0'
+        if not valor.strip().isdecimal():
+            raise _CuerpoInvalido(f'Content-Length inválido: {valor!r}')
+        return int(valor)
+
+    def _cuerpo(self):
+        """Partes del cuerpo: Content-Length o Transfer-Encoding: chunked."""
+        if 'chunked' in self.headers.get('Transfer-Encoding', '').lower():
+            while True:
+                linea = self.rfile.readline()
+                try:
+                    n = int(linea.split(b';')[0], 16)
+                except ValueError:
+                    n = -1
+                if n < 0:
+                    raise _CuerpoInvalido(f"Tamaño de parte inválido (chunked): {linea[:40].decode('latin1').strip()!r}")
+                if n == 0:
+                    while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    return
+                yield from self._leer(n)
+                self.rfile.readline()
+        else:
+            yield from self._leer(self._largo())
+
+    def _guardar_cuerpo(self):
+        """Baja el cuerpo a un temporal mientras calcula su sha256 -> (id, path, bytes)."""
+        h = hashlib.sha256()
+        total = 0
+        with tempfile.NamedTemporaryFile(dir=self.server.tmp.name, suffix='.csv', delete=False) as f:
+            path = Path(f.name)
+            try:
+                for parte in self._cuerpo():
+                    total += len(parte)
+                    if total > self.server.max_bytes:
+                        raise _Demasiado()
+                    h.update(parte)
+                    f.write(parte)
+            except BaseException:
+                f.close()
+                path.unlink(missing_ok=True)
+                raise
+        return h.hexdigest(), path, total
+
+    def _medido(self, fn, ruta):
+        t0 = time.perf_counter()
+        self.server.contar('pedidos')
+        try:
+            fn()
+        finally:
+            self.server.medir(ruta, time.perf_counter() - t0)
+
+    def do_POST(self):
+        self._medido(self._post, 'POST ' + _ruta(self.path))
+
+    def do_GET(self):
+        self._medido(self._get, 'GET ' + _ruta(self.path))
+
+    def _post(self):
+        rechazo = self._rechazo()
+        if rechazo is not None:
+            codigo, obj, headers = rechazo
+            return self._rechazar(codigo, obj, **headers)
+        q = parse_qs(urlsplit(self.path).query)
+        engine = q.get('engine', ['python'])[0]
+        try:
+            digest, path, n = self._guardar_cuerpo()
+        except _Demasiado:
+            return self._rechazar(413, {'error': f'El reporte supera {self.server.max_bytes} bytes'})
+        except _CuerpoInvalido as e:
+            return self._rechazar(400, {'error': str(e)})
+        if n == 0:
+            path.unlink(missing_ok=True)
+            return self._json(400, {'error': 'Cuerpo vacío: enviar el reporte como cuerpo del POST'})
+        id_ = _id(digest, engine)
+        try:
+            d = self.server.enviar(id_, path, engine)
+        except _ColaLlena:
+            return self._json(503, {'error': 'Cola llena, reintentar más tarde', 'cola': self.server.cola},
+                              Retry_After=REINTENTAR_SEGUNDOS)
+        except _PoolCaido:
+            return self._json(503, {'error': 'El pool de detección se cayó y se reinició, reintentar'},
+                              Retry_After=REINTENTAR_SEGUNDOS)
+        if d is not None and q.get('esperar', ['0'])[0] not in ('0', ''):
+            d.terminada.wait()
+        r = self.server.resumen(id_, d)
+        codigo = {LISTO: 200, ERROR: 500}.get(r['estado'], 202)
+        self._json(codigo, r, Location=f'/detecciones/{id_}')
+
+    def _get(self):
+        partes = [p for p in urlsplit(self.path).path.split('/') if p]
+        if partes == ['salud']:
+            return self._json(200, {'ok': True, 'workers': self.server.workers, 'cola': self.server.pendientes(),
+                                    'cola_max': self.server.cola})
+        if partes == ['metricas']:
+            return self._json(200, self.server.metricas())
+        if len(partes) in (2, 3) and partes[0] == 'detecciones':
+            id_ = partes[1]
+            d = self.server.deteccion(id_)
+            if len(partes) == 2:
+                r = self.server.resumen(id_, d)
+                if r['estado'] is None:
+                    return self._json(404, {'error': f'Detección desconocida (o ya fuera de caché): {id_}'})
+                return self._json({LISTO: 200, ERROR: 500}.get(r['estado'], 202), r)
+            tabla, _, fmt = partes[2].partition('.')
+            if tabla not in TABLAS or fmt not in ('csv', 'json'):
+                return self._json(404, {'error': f'Tabla desconocida: {partes[2]}'})
+            res = self.server.resultado(id_)
+            if res is None:
+                r = self.server.resumen(id_, d)
+                if r['estado'] is None:
+                    return self._json(404, {'error': f'Detección desconocida (o ya fuera de caché): {id_}'})
+                return self._json(409, r)
+            df = res[TABLAS[tabla]]
+            if fmt == 'csv':
+                return self._responder(200, core.frame_to_csv(df), 'text/csv; charset=utf-8')
+            return self._responder(200, _frame_json(df), 'application/json; charset=utf-8')
+        self._json(404, {'error': f'Ruta desconocida: {self.path}'})
+
+
+def _interrumpir(signum, frame):
+    # SIGTERM (kill, systemd, bench_servicio) sale por el mismo camino que Ctrl+C
+    raise KeyboardInterrupt()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Servicio HTTP local de detección de duplicados.')
+    ap.add_argument('--host', default=HOST)
+    ap.add_argument('--puerto', type=int, default=PUERTO)
+    ap.add_argument('--workers', type=int, default=None, help='detecciones a la vez (default: CPUs)')
+    ap.add_argument('--cola', type=int, default=COLA_MAX, help=f'pendientes antes de responder 503 (default: {COLA_MAX})')
+    ap.add_argument('--cache-mb', type=int, default=CACHE_MAX_BYTES // 2**20)
+    ap.add_argument('--log', action='store_true', help='una línea por pedido HTTP')
+    args = ap.parse_args(argv)
+
+    servidor = ServicioDetector((args.host, args.puerto), args.workers, args.cola,
+                                cache_max_bytes=args.cache_mb * 2**20, log=args.log)
+    signal.signal(signal.SIGTERM, _interrumpir)
+    print(f'Escuchando en http://{args.host}:{servidor.server_address[1]} '
+          f'(workers={servidor.workers}, cola={servidor.cola})', flush=True)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
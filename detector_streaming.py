@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Modo streaming para reportes ordenados por Entrega (auditorías de varios años).
+
+Lee las líneas en orden y mantiene en memoria solo los pedidos de la ventana activa
+(MAX_DIAS) de cada cliente. Cuando aparece una Entrega posterior se cierra el día en
+curso: se escriben sus grupos de exactos y los pares similares donde participa alguno
+de sus pedidos (contra los de los MAX_DIAS días anteriores), y se desalojan los
+pedidos que ya no pueden formar pares con lo que falta leer. La memoria queda acotada
+a una ventana de pedidos, no al reporte entero: de los desalojados solo se recuerdan las
+claves (Client, Pedido) de los últimos RECORDAR_DESALOJADOS, para detectar líneas que
+llegan tarde.
+
+Supuestos:
+- Las líneas vienen ordenadas por Entrega ascendente (las líneas sin fecha pueden
+  aparecer en cualquier lado)
+- Todas las líneas de un pedido tienen la misma Entrega (o vacía)
+Se corta con ValueError si una fecha retrocede o si un pedido recibe líneas (con o sin
+fecha) después de cerrado su día; en ese caso usar run_detector. Una línea sin fecha de
+un pedido desalojado hace más de RECORDAR_DESALOJADOS pedidos ya no se reconoce: se toma
+como un pedido nuevo (las líneas de cada pedido tienen que venir juntas, como en el export).
+
+Los CSV tienen las mismas filas que run_detector. Los exactos salen en el mismo orden
+(los de pedidos sin Entrega, al final); los similares, en orden de Entrega.
+
+Expone:
+- run_streaming(in_path) -> (path_exact, path_sim)
+- detect_streaming_from_filelike(fileobj, out_dir) -> (path_exact, path_sim)
+"""
+
+import csv
+from collections import defaultdict, deque
+from pathlib import Path
+
+import detector_core as core
+
+RECORDAR_DESALOJADOS = 100_000  # claves de pedidos desalojados que se recuerdan (las más recientes)
+
+
+class _Ventana:
+    """Estado de la pasada: pedidos vivos por cliente y días todavía en la ventana."""
+
+    def __init__(self, w_exact, w_sim):
+        self.ag = core._Agregador(core.Catalogo())
+        self.w_exact = w_exact
+        self.w_sim = w_sim
+        self.por_cliente = defaultdict(list)    # Client -> pedidos con Entrega en la ventana
+        self.dias = deque()                     # (Entrega, pedidos del día)
+        self.sin_fecha = []                     # pedidos sin Entrega (todavía)
+        self.desalojados = set()                # (Client, Pedido) desalojados hace poco
+        self.orden_desalojo = deque()           # las mismas claves, en orden de desalojo
+        self.dia = None                         # Entrega en curso
+
+    def linea(self, row):
+        entrega = self.ag.fecha(row.get(core.COL_ENTREGA))
+        if entrega is not None and entrega != self.dia:
+            if self.dia is not None:
+                if entrega < self.dia:
+                    raise ValueError(f'El reporte no está ordenado por Entrega: {entrega.isoformat()} '
+                                     f'después de {self.dia.isoformat()} (usar run_detector)')
+                self.cerrar_dia(entrega)
+            self.dia = entrega
+        n = len(self.ag.nuevos)
+        o = self.ag.agregar(row)
+        if o is None:
+            return
+        if o.entrega is not None and o.entrega < self.dia:
+            raise ValueError(f'El pedido {o.pedido} (Client {o.client}) tiene líneas después de su '
+                             f'Entrega {o.entrega.isoformat()} (usar run_detector)')
+        if len(self.ag.nuevos) > n and (o.client, o.pedido) in self.desalojados:
+            # Pedido "nuevo" que ya se había cerrado y desalojado (p. ej. una línea sin fecha)
+            raise ValueError(f'El pedido {o.pedido} (Client {o.client}) tiene líneas después de '
+                             f'cerrado su día (usar run_detector)')
+
+    def _exactos(self, pedidos):
+        for r in core._exactos(pedidos, self.ag.catalogo):
+            self.w_exact.writerow(core._fila_csv(r))
+
+    def cerrar_dia(self, hasta=None):
+        """Cierra el día en curso; hasta: próxima Entrega (None = fin del reporte)."""
+        ag = self.ag
+        ag.cerrar()
+        pendientes = self.sin_fecha + ag.nuevos
+        ag.nuevos = []
+        del_dia = [o for o in pendientes if o.entrega is not None]
+        self.sin_fecha = [o for o in pendientes if o.entrega is None]
+
+        self._exactos(del_dia)
+
+        nuevos_cliente = defaultdict(set)
+        for o in del_dia:
+            self.por_cliente[o.client].append(o)
+            nuevos_cliente[o.client].add(o.pedido)
+        for client, solo in nuevos_cliente.items():
+            for r in core._similares_cliente(client, self.por_cliente[client], solo=solo):
+                self.w_sim.writerow(core._fila_csv(r))
+        if del_dia:
+            self.dias.append((self.dia, del_dia))
+
+        # Desalojo: días que ya no pueden formar pares con la próxima Entrega
+        while self.dias and (hasta is None or (hasta - self.dias[0][0]).days > core.MAX_DIAS):
+            d0, viejos = self.dias.popleft()
+            for o in viejos:
+                key = (o.client, o.pedido)
+                del ag.orders[key]
+                self.desalojados.add(key)
+                self.orden_desalojo.append(key)
+            while len(self.orden_desalojo) > RECORDAR_DESALOJADOS:
+                self.desalojados.discard(self.orden_desalojo.popleft())
+            for client in {o.client for o in viejos}:
+                vivos = [o for o in self.por_cliente[client] if o.entrega > d0]
+                if vivos:
+                    self.por_cliente[client] = vivos
+                else:
+                    del self.por_cliente[client]
+
+    def terminar(self):
+        self.cerrar_dia()
+        self._exactos(self.sin_fecha)
+        self.sin_fecha = []
+
+
+def _detect_streaming(rows_iter, out_exact: Path, out_sim: Path, firma_completa: bool = False):
+    with out_exact.open('w', encoding='utf-8', newline='') as fe, out_sim.open('w', encoding='utf-8', newline='') as fs:
+        w_exact = csv.DictWriter(fe, fieldnames=core._campos_exactos(firma_completa), extrasaction='ignore')
+        w_sim = csv.DictWriter(fs, fieldnames=core.CAMPOS_SIMILARES)
+        w_exact.writeheader()
+        w_sim.writeheader()
+        ventana = _Ventana(w_exact, w_sim)
+        for row in rows_iter:
+            ventana.linea(row)
+        ventana.terminar()
+    return out_exact, out_sim
+
+
+def run_streaming(in_path: str | Path, firma_completa: bool = False):
+    """Como run_detector, para reportes ordenados por Entrega, con memoria acotada."""
+    in_path = Path(in_path)
+    out_exact = in_path.with_name('duplicados_exactos.csv')
+    out_sim = in_path.with_name('duplicados_similares.csv')
+    return _detect_streaming(core.iter_rows_from_path(in_path), out_exact, out_sim, firma_completa)
+
+
+def detect_streaming_from_filelike(fileobj, out_dir: str | Path, firma_completa: bool = False):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_exact = out_dir / 'duplicados_exactos.csv'
+    out_sim = out_dir / 'duplicados_similares.csv'
+    return _detect_streaming(core.iter_rows_from_filelike(fileobj), out_exact, out_sim, firma_completa)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Vecinos más cercanos: los k pedidos más parecidos de cada pedido (para triage).
+
+Los similares de detector_core son un corte sí/no (sim_importe >= MIN_SIM_IMPORTE y
+coseno >= MIN_SIM_PRODUCTOS). Acá, para cada pedido, se listan sus k pedidos más
+parecidos del mismo Client dentro de la ventana MAX_DIAS (antes o después), ordenados
+por sim_productos (coseno de productos), con sim_importe al lado, aunque no pasen los umbrales.
+
+Cómo: los pedidos se ordenan por (Client, Entrega, Pedido) y sus productos (Cant,
+normalizados) forman una matriz dispersa pedidos x productos. Por bloques de BLOQUE_FILAS
+pedidos se calcula X[bloque] @ X[ventana].T, donde la ventana es el rango de pedidos que
+puede caer a <= MAX_DIAS del bloque: todos los cosenos del bloque en un solo producto
+disperso, en vez de un par a la vez. De cada fila se toman los k mejores.
+
+Solo entran vecinos con algún producto en común (coseno > 0) y pedidos con Entrega.
+metodo='pares' calcula lo mismo par por par (detector_columnar._cosine sobre la ventana):
+es la referencia y no necesita scipy.
+
+Salida: vecinos_similares.csv (o .parquet), una fila por (pedido, vecino) con su rango
+1..k, en orden de (Client, Entrega, Pedido).
+
+Requiere scipy (opcional: el resto del detector no lo necesita).
+
+Expone:
+- run_vecinos(in_path, k=TOP_K, out_dir=None, formato='csv') -> path
+- vecinos_frame(fuente, k=TOP_K, max_dias=None, metodo='matriz') -> DataFrame (CAMPOS_VECINOS)
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import detector_columnar as col
+import detector_core as core
+
+TOP_K = 5
+BLOQUE_FILAS = 1024  # pedidos por producto disperso (acota la matriz de similitudes del bloque)
+CELDAS_DENSAS = 1 << 23  # poda del top-k: celdas (filas x ventana) por tramo denso
+METODOS = ('matriz', 'pares')
+
+CAMPOS_VECINOS = ['Client', 'Razon social', 'Pedido', 'Sts', 'Entrega', 'Importe', 'rango',
+                  'Pedido_vecino', 'Sts_vecino', 'Entrega_vecino', 'Importe_vecino', 'dias',
+                  'sim_productos', 'sim_importe', 'prioridad']
+
+
+def _sparse():
+    try:
+        import scipy.sparse as sp
+    except ImportError as e:
+        raise ImportError("Los vecinos con metodo='matriz' requieren scipy (pip install scipy)") from e
+    return sp
+
+
+def _matriz(o, idx):
+    """Filas de productos normalizadas (norma 1, o 0 si el pedido no tiene), en el orden idx."""
+    sp = _sparse()
+    nnz = np.diff(o['indptr'])
+    norm = o['norm']
+    inv = np.divide(1.0, norm, out=np.zeros_like(norm), where=norm > 0)
+    X = sp.csr_matrix((o['e_qty'] * np.repeat(inv, nnz), o['e_prd'], o['indptr']),
+                      shape=(o['n'], max(len(o['prd_uni']), 1)))
+    return X[idx]
+
+
+def _candidatos_matriz(o, idx, comp, max_dias, k, stats=None):
+    """Bloques (filas, columnas, coseno) en posiciones de idx, con un producto disperso por bloque.
+
+    En bloques densos ya descarta lo que no puede entrar en el top-k de su fila (ver _poda).
+    """
+    X = _matriz(o, idx)
+    for r0 in range(0, len(idx), BLOQUE_FILAS):
+        r1 = min(r0 + BLOQUE_FILAS, len(idx))
+        lo = int(np.searchsorted(comp, comp[r0] - max_dias, side='left'))
+        hi = int(np.searchsorted(comp, comp[r1 - 1] + max_dias, side='right'))
+        S = (X[r0:r1] @ X[lo:hi].T).tocoo()
+        filas = S.row.astype(np.int64) + r0
+        cols = S.col.astype(np.int64) + lo
+        # La ventana del bloque también trae pedidos de otros clientes o fuera de MAX_DIAS
+        ok = (filas != cols) & (np.abs(comp[filas] - comp[cols]) <= max_dias) & (S.data > 0)
+        filas, cols, s_prd = filas[ok], cols[ok], S.data[ok]
+        if len(filas) > 4 * k * (r1 - r0):
+            keep = _poda(filas - r0, cols - lo, np.round(s_prd, 4), k, hi - lo)
+            filas, cols, s_prd = filas[keep], cols[keep], s_prd[keep]
+        core._avance(stats)
+        yield filas, cols, s_prd
+
+
+def _poda(filas, cols, s_prd, k, n_cols):
+    """Máscara de los candidatos con s_prd >= el k-ésimo mejor de su fila (incluye empates).
+
+    filas ordenadas (como salen de tocoo de una CSR); por tramos densos de a lo sumo
+    CELDAS_DENSAS celdas, np.partition por fila en vez de ordenar todos los pares.
+    """
+    keep = np.zeros(len(filas), dtype=bool)
+    paso = max(1, CELDAS_DENSAS // max(n_cols, 1))
+    for f0 in range(0, int(filas[-1]) + 1, paso):
+        a, b = np.searchsorted(filas, [f0, f0 + paso])
+        if a == b:
+            continue
+        D = np.full((paso, n_cols), -1.0, dtype=np.float32)
+        D[filas[a:b] - f0, cols[a:b]] = s_prd[a:b]
+        kk = min(k, n_cols) - 1
+        umbral = -np.partition(-D, kk, axis=1)[:, kk]
+        keep[a:b] = s_prd[a:b].astype(np.float32) >= umbral[filas[a:b] - f0]
+    return keep
+
+
+def _candidatos_pares(o, idx, comp, max_dias, k, stats=None):
+    """Lo mismo que _candidatos_matriz, par por par (referencia)."""
+    pos = np.empty(o['n'], dtype=np.int64)
+    pos[idx] = np.arange(len(idx))
+    for A, B in col._pair_blocks(o, max_dias, stats):
+        s = col._cosine(o, A, B)
+        ok = s > 0
+        a, b, s = pos[A[ok]], pos[B[ok]], s[ok]
+        yield np.concatenate([a, b]), np.concatenate([b, a]), np.concatenate([s, s])
+
+
+def _top_k(filas, cols, s_prd, s_imp, k):
+    """Índices de los k mejores por fila: sim_productos, después sim_importe, después orden de vecino.
+
+    Se ordena por los valores redondeados que van a la salida: los empates (p. ej. pedidos
+    repetidos) se desempatan igual sin importar cómo se sumó cada coseno.
+    """
+    orden = np.lexsort((cols, -np.round(s_imp, 4), -np.round(s_prd, 4), filas))
+    filas = filas[orden]
+    inicio = np.flatnonzero(np.r_[True, filas[1:] != filas[:-1]])
+    rango = np.arange(len(filas)) - np.repeat(inicio, np.diff(np.r_[inicio, len(filas)]))
+    keep = rango < k
+    return orden[keep], rango[keep] + 1
+
+
+def _vecinos(o, k, max_dias, metodo='matriz', stats=None):
+    """(filas, columnas, sim_productos, sim_importe, rango, idx) de los k vecinos de cada pedido."""
+    if metodo not in METODOS:
+        raise ValueError(f"Método desconocido: {metodo!r} (opciones: {', '.join(METODOS)})")
+    idx, comp, _ = col._orden_ventana(o, max_dias)
+    candidatos = _candidatos_matriz if metodo == 'matriz' else _candidatos_pares
+    imp0 = np.nan_to_num(o['importe'], nan=0.0)
+    partes = []
+    for filas, cols, s_prd in (candidatos(o, idx, comp, max_dias, k, stats) if len(idx) else ()):
+        s_imp = col._sim_importe(imp0[idx[filas]], imp0[idx[cols]])
+        if metodo == 'matriz':
+            # Cada fila está entera en su bloque: el top-k se hace ahí y no se guardan los demás
+            sel, rango = _top_k(filas, cols, s_prd, s_imp, k)
+            partes.append((filas[sel], cols[sel], s_prd[sel], s_imp[sel], rango))
+        else:
+            partes.append((filas, cols, s_prd, s_imp))
+    if not partes:
+        vacio = np.zeros(0, dtype=np.int64)
+        return vacio, vacio, np.zeros(0), np.zeros(0), vacio, idx
+    juntas = [np.concatenate([p[j] for p in partes]) for j in range(len(partes[0]))]
+    if metodo == 'pares':
+        filas, cols, s_prd, s_imp = juntas
+        sel, rango = _top_k(filas, cols, s_prd, s_imp, k)
+        juntas = [filas[sel], cols[sel], s_prd[sel], s_imp[sel], rango]
+    return (*juntas, idx)
+
+
+def _frame(o, filas, cols, s_prd, s_imp, rango, idx):
+    a, b = idx[filas], idx[cols]
+    sts_a, sts_b = o['sts'][a], o['sts'][b]
+    alta = ((sts_a == 'PRC') & (sts_b == 'RET')) | ((sts_a == 'RET') & (sts_b == 'PRC'))
+    return pd.DataFrame({
+        'Client': o['client_names'][o['client_code'][a]],
+        'Razon social': o['razon'][a],
+        'Pedido': o['pedido'][a],
+        'Sts': sts_a,
+        'Entrega': col._entrega_datetime(o['entrega'][a]),
+        'Importe': o['importe'][a],
+        'rango': rango.astype(np.int64),
+        'Pedido_vecino': o['pedido'][b],
+        'Sts_vecino': sts_b,
+        'Entrega_vecino': col._entrega_datetime(o['entrega'][b]),
+        'Importe_vecino': o['importe'][b],
+        'dias': (o['entrega'][b] - o['entrega'][a]).astype(np.int64),
+        'sim_productos': np.round(s_prd, 4),
+        'sim_importe': np.round(s_imp, 4),
+        'prioridad': np.where(alta, 'ALTA', 'MEDIA').astype(object),
+    }, columns=CAMPOS_VECINOS)
+
+
+def vecinos_frame(fuente, k: int = TOP_K, max_dias: int | None = None, metodo: str = 'matriz',
+                  stats: core.DetectorStats | None = None):
+    """Los k vecinos más parecidos de cada pedido de fuente (reporte CSV o Parquet/Arrow de líneas).
+
+    max_dias: ventana de Entrega (default MAX_DIAS). Filas en orden de (Client, Entrega,
+    Pedido, rango); sim_productos y sim_importe redondeados a 4 decimales.
+    """
+    from detector_parquet import _columnas
+
+    if k < 1:
+        raise ValueError(f'k tiene que ser >= 1 (vino {k})')
+    max_dias = core.MAX_DIAS if max_dias is None else max_dias
+    cols = _columnas(fuente, stats)
+    with core._etapa(stats, 'aggregate'):
+        o = col._aggregate(cols, stats)
+    cols.clear()
+    with core._etapa(stats, 'vecinos'):
+        partes = _vecinos(o, k, max_dias, metodo, stats)
+    return _frame(o, *partes)
+
+
+def run_vecinos(in_path: str | Path, k: int = TOP_K, out_dir: str | Path | None = None, formato: str = 'csv',
+                max_dias: int | None = None, metodo: str = 'matriz', stats: core.DetectorStats | None = None):
+    """Escribe vecinos_similares.csv (o .parquet con formato='parquet') en out_dir (default: junto a in_path)."""
+    from detector_parquet import FORMATOS, write_frame_parquet
+
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato desconocido: {formato!r} (opciones: {', '.join(FORMATOS)})")
+    in_path = Path(in_path)
+    out_dir = in_path.parent if out_dir is None else Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    df = vecinos_frame(in_path, k, max_dias, metodo, stats)
+    out = out_dir / f'vecinos_similares.{formato}'
+    with core._etapa(stats, 'write'):
+        if formato == 'csv':
+            out.write_bytes(core.frame_to_csv(df))
+        else:
+            write_frame_parquet(df, out)
+    return out
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""Generador de reportes ERP sintéticos (para bench_detector.py y pruebas de carga).
+
+Imita el export real:
+- Líneas basura antes de la cabecera 'F.Pedido'
+- Separador ';', ',' o tab; texto latin1 (Ñ, tildes) y CRLF
+- Sts RET / PRC / vacío y otros estados que el detector descarta (ANU, FAC)
+- Clientes con tamaños sesgados (Zipf): pocos distribuidores con muchos pedidos
+
+Inyecta duplicados conocidos y devuelve la verdad de referencia:
+- exact_pairs: copia RET idéntica de un pedido RET (mismo Client, Entrega, importe, productos)
+- near_pairs: copia casi igual (Entrega +0..MAX_DIAS, una cantidad cambiada) que pasa los umbrales
+- negatives: copias con Sts descartado: no deben aparecer en ninguna salida
+- cross_pairs: copia casi igual cargada con OTRO código de cliente (share_cross, default 0):
+  solo la encuentra detector_cruzado
+
+generate_redondeos escribe en cambio un reporte chico de casos límite de redondeo
+(cantidades e importes justo a mitad de camino, p. ej. 1.4005 o 2.675, sueltos o partidos
+en varias líneas, contra copias redondeadas para un lado y para el otro): todos los motores
+tienen que dar exactamente la misma salida (bench_detector.py --equivalencia).
+
+ordenar_por_entrega reordena un reporte generado por Entrega (para detector_streaming).
+
+Uso:
+    python synth_report.py 100000 reporte.csv --delim tab --seed 7
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import random
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from pathlib import Path
+
+import detector_core as core
+
+CABECERA = ['F.Pedido', 'Pedido', 'Client', 'Razon social', 'Entrega', 'Sts', 'C.Prd', 'Descripcion', 'Cant', 'Importe Total']
+PREAMBULO = [
+    ['REPORTE DE PEDIDOS POR CLIENTE'],
+    ['Empresa: Distribuidora Ñandutí S.A.'],
+    [],
+    ['Emitido por: ERP', 'Página 1'],
+]
+DELIMS = {';': ';', ',': ',', 'tab': '\t', '\t': '\t'}
+ESTADOS = ['RET', 'PRC', '']
+ESTADOS_PESOS = [60, 30, 5]
+ESTADOS_DESCARTADOS = ['ANU', 'FAC']
+PALABRAS = ['Azúcar', 'Café', 'Ñoquis', 'Jabón', 'Limón', 'Maíz', 'Algodón', 'Pimentón', 'Té', 'Yerba']
+RAZONES = ['Almacén', 'Despensa', 'Comercial', 'Autoservicio', 'Distribuidora', 'Panadería']
+
+
+def _similar_ok(a, b):
+    """El par inyectado tiene que pasar los umbrales con margen (si no, no se inyecta)."""
+    s_imp = core.sim_importe(a['importe'], b['importe'])
+    s_prd = core.cosine_sim(dict(a['items']), dict(b['items']))
+    return s_imp >= core.MIN_SIM_IMPORTE + 0.005 and s_prd >= core.MIN_SIM_PRODUCTOS + 0.02
+
+
+def generate_report(path: str | Path, n_lines: int, delim: str = ';', seed: int = 0, dias: int = 60,
+                    share_exact: float = 0.02, share_near: float = 0.03, share_negative: float = 0.005,
+                    n_productos: int = 5000, n_clientes: int | None = None, share_cross: float = 0.0) -> dict:
+    """Escribe un reporte de ~n_lines líneas en path y devuelve la verdad de referencia."""
+    rnd = random.Random(seed)
+    delim = DELIMS[delim]
+    n_clientes = n_clientes or max(10, n_lines // 60)
+    clientes = [str(100000 + i) for i in range(n_clientes)]
+    razones = {c: f'{rnd.choice(RAZONES)} {rnd.choice(PALABRAS)} {c[-3:]}, S.A.' for c in clientes}
+    cum = list(accumulate(1.0 / (k + 1) ** 1.1 for k in range(n_clientes)))
+    precios = [round(rnd.uniform(500, 90000), 2) for _ in range(n_productos)]
+    descripciones = [f'{rnd.choice(PALABRAS)} x{rnd.randint(1, 50)}' for _ in range(n_productos)]
+    base = date(2025, 1, 1)
+
+    truth = {'lines': 0, 'orders': 0, 'exact_pairs': [], 'near_pairs': [], 'negatives': [], 'cross_pairs': []}
+    pedido_seq = [1000000]
+
+    def nuevo_pedido():
+        pedido_seq[0] += 1
+        return str(pedido_seq[0])
+
+    path = Path(path)
+    with path.open('w', encoding='latin1', newline='') as f:
+        w = csv.writer(f, delimiter=delim, lineterminator='\r\n')
+        for row in PREAMBULO:
+            w.writerow(row)
+        w.writerow(CABECERA)
+
+        def escribir(o):
+            f_pedido = (o['entrega'] - timedelta(days=rnd.randint(0, 3))).strftime('%d/%m/%y')
+            entrega = o['entrega'].strftime('%d/%m/%y')
+            importe = f"{o['importe']:.2f}"
+            for prd, cant in o['items']:
+                w.writerow([f_pedido, o['pedido'], o['client'], razones[o['client']], entrega, o['sts'],
+                            f'P{prd:05d}', descripciones[prd], f'{cant:g}', importe])
+            truth['lines'] += len(o['items'])
+            truth['orders'] += 1
+
+        while truth['lines'] < n_lines:
+            client = clientes[bisect.bisect_left(cum, rnd.random() * cum[-1])]
+            prds = rnd.sample(range(n_productos), rnd.randint(1, 12))
+            items = [(p, rnd.randint(1, 60) if rnd.random() < 0.9 else rnd.randint(1, 40) / 4) for p in prds]
+            o = {
+                'pedido': nuevo_pedido(),
+                'client': client,
+                'entrega': base + timedelta(days=rnd.randint(0, dias)),
+                'sts': rnd.choices(ESTADOS, ESTADOS_PESOS)[0] if rnd.random() > 0.03 else rnd.choice(ESTADOS_DESCARTADOS),
+                'items': items,
+                'importe': round(sum(q * precios[p] for p, q in items), 2),
+            }
+            r = rnd.random()
+            if r < share_exact:
+                o['sts'] = 'RET'
+                escribir(o)
+                copia = dict(o, pedido=nuevo_pedido())
+                escribir(copia)
+                truth['exact_pairs'].append((client, o['pedido'], copia['pedido']))
+            elif r < share_exact + share_near and o['sts'] in core.ESTADOS_VALIDOS:
+                escribir(o)
+                items2 = list(items)
+                k = rnd.randrange(len(items2))
+                items2[k] = (items2[k][0], items2[k][1] + 1)
+                copia = dict(o, pedido=nuevo_pedido(), items=items2,
+                             entrega=o['entrega'] + timedelta(days=rnd.randint(0, core.MAX_DIAS)),
+                             sts=rnd.choice(['RET', 'PRC']),
+                             importe=round(sum(q * precios[p] for p, q in items2), 2))
+                if _similar_ok(o, copia):
+                    escribir(copia)
+                    truth['near_pairs'].append((client, o['pedido'], copia['pedido']))
+            elif r < share_exact + share_near + share_negative:
+                escribir(o)
+                copia = dict(o, pedido=nuevo_pedido(), sts=rnd.choice(ESTADOS_DESCARTADOS))
+                escribir(copia)
+                truth['negatives'].append((client, copia['pedido']))
+            elif r < share_exact + share_near + share_negative + share_cross and o['sts'] in core.ESTADOS_VALIDOS:
+                escribir(o)
+                otro = clientes[rnd.randrange(n_clientes)]
+                if otro == client:
+                    continue
+                items2 = list(items)
+                k = rnd.randrange(len(items2))
+                items2[k] = (items2[k][0], items2[k][1] + 1)
+                copia = dict(o, pedido=nuevo_pedido(), client=otro, items=items2,
+                             entrega=o['entrega'] + timedelta(days=rnd.randint(0, core.MAX_DIAS)),
+                             importe=round(sum(q * precios[p] for p, q in items2), 2))
+                if _similar_ok(o, copia):
+                    escribir(copia)
+                    truth['cross_pairs'].append((client, o['pedido'], otro, copia['pedido']))
+            else:
+                escribir(o)
+    return truth
+
+
+def generate_redondeos(path: str | Path, n_pedidos: int = 2000, delim: str = ';', seed: int = 0) -> dict:
+    """Reporte de casos límite de redondeo (ver arriba); devuelve {'lines', 'orders'}."""
+    rnd = random.Random(seed)
+    delim = DELIMS[delim]
+    base = date(2025, 1, 1)
+    truth = {'lines': 0, 'orders': 0}
+    pedido_seq = [2000000]
+
+    def medio(decimales, hasta):
+        # Justo a mitad de camino entre dos valores redondeados (p. ej. 1.4005 con 3 decimales)
+        return round((rnd.randint(1, hasta) + 0.5) / 10 ** decimales, decimales + 1)
+
+    def variante(v, decimales):
+        # La copia: el mismo valor, o redondeado hacia abajo / arriba
+        return round(v + rnd.choice((0.0, -0.5, 0.5)) / 10 ** decimales, decimales + 1)
+
+    path = Path(path)
+    with path.open('w', encoding='latin1', newline='') as f:
+        w = csv.writer(f, delimiter=delim, lineterminator='\r\n')
+        w.writerow(CABECERA)
+
+        def escribir(client, entrega, sts, items, importe):
+            pedido_seq[0] += 1
+            for prd, cant in items:
+                # A veces la cantidad llega partida en dos líneas del mismo producto
+                partes = [cant] if cant <= 1 or rnd.random() < 0.6 else [1.0, round(cant - 1.0, 6)]
+                for q in partes:
+                    w.writerow(['01/01/25', pedido_seq[0], client, f'Razón {client}', entrega.strftime('%d/%m/%y'),
+                                sts, f'P{prd:03d}', 'Producto', repr(q), repr(importe)])
+                    truth['lines'] += 1
+            truth['orders'] += 1
+
+        while truth['orders'] < n_pedidos:
+            client = str(rnd.randint(1, max(1, n_pedidos // 50)))
+            entrega = base + timedelta(days=rnd.randint(0, 20))
+            items = [(p, medio(core.REDONDEO_CANT, 5000)) for p in rnd.sample(range(40), rnd.randint(1, 4))]
+            importe = medio(core.REDONDEO_IMPORTE, 50000)
+            for _ in range(rnd.randint(2, 3)):
+                escribir(client, entrega, rnd.choice(['RET', 'RET', 'PRC']),
+                         [(p, variante(q, core.REDONDEO_CANT)) for p, q in items],
+                         variante(importe, core.REDONDEO_IMPORTE))
+    return truth
+
+
+def ordenar_por_entrega(path: str | Path, delim: str = ';'):
+    """Reordena (en el lugar) las líneas de un reporte generado por Entrega ascendente.
+
+    Orden estable: las líneas de cada pedido siguen juntas y en el mismo orden.
+    """
+    path = Path(path)
+    delim = DELIMS[delim]
+    with path.open(encoding='latin1', newline='') as f:
+        filas = list(csv.reader(f, delimiter=delim))
+    h = filas.index(CABECERA)
+    i = CABECERA.index('Entrega')
+    filas[h + 1:] = sorted(filas[h + 1:], key=lambda r: datetime.strptime(r[i], '%d/%m/%y'))
+    with path.open('w', encoding='latin1', newline='') as f:
+        csv.writer(f, delimiter=delim, lineterminator='\r\n').writerows(filas)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Genera un reporte ERP sintético con duplicados conocidos.')
+    ap.add_argument('lines', type=int)
+    ap.add_argument('out', type=Path)
+    ap.add_argument('--delim', default=';', choices=sorted(DELIMS))
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--cross', type=float, default=0.0, help='proporción de copias con otro Client')
+    ap.add_argument('--truth', type=Path, help='JSON con la verdad de referencia (default: <out>.truth.json)')
+    args = ap.parse_args(argv)
+    truth = generate_report(args.out, args.lines, args.delim, args.seed, share_cross=args.cross)
+    truth_path = args.truth or args.out.with_suffix('.truth.json')
+    truth_path.write_text(json.dumps(truth), encoding='utf-8')
+    print(f"{truth['lines']} líneas, {truth['orders']} pedidos -> {args.out} (verdad: {truth_path})")
+
+
+if __name__ == '__main__':
+    main()